@@ -0,0 +1,247 @@
+# app/asgi.py
+
+import io
+import sys
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from flask import request, jsonify, Response
+from app.config import Config
+from app.services.session_service import SessionService, session_history
+from app.services.chart_renderer_service import chart_renderer
+from app.utils.llm_utils import close_async_http_client
+from app.utils.metrics_utils import start_request_metrics, REQUEST_DURATION
+from app.utils.stream_utils import DeltaStream
+from app.utils.trace_utils import start_trace
+from app.routes import (get_analysis_graph, prepare_analysis, complete_analysis, metered_response, read_stream_query,
+                        SSE_HEADERS)
+
+logger = logging.getLogger(__name__)
+
+# POST endpoints served natively on the event loop with graph.ainvoke
+ASYNC_ENDPOINTS = {"/analyze": "analyze", "/chat": "chat"}
+
+class AsgiApp:
+    """
+    ASGI entry point for the Flask app. /analyze and /chat run the analysis graph with
+    ainvoke and /stream with astream, writing each SSE frame to the client as it is built,
+    so a request waiting on an LLM holds no thread; database and CPU-bound work runs in
+    the worker thread pool. Every other route, /batch included (its questions already run
+    on a thread pool of their own), is served by the regular WSGI app in a worker thread,
+    with streamed bodies forwarded chunk by chunk.
+    """
+
+    def __init__(self, flask_app, worker_threads=None):
+        self.flask_app = flask_app
+        self.worker_threads = worker_threads or Config.ASGI_WORKER_THREADS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = await _read_body(receive)
+        environ = _wsgi_environ(scope, body)
+        endpoint = ASYNC_ENDPOINTS.get(scope["path"]) if scope["method"] == "POST" else None
+        if endpoint is not None:
+            await self._run_analysis(environ, endpoint, send)
+        elif scope["path"] == "/stream" and scope["method"] in ("GET", "POST"):
+            await self._run_stream(environ, send)
+        else:
+            await self._run_wsgi(environ, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                asyncio.get_running_loop().set_default_executor(
+                    ThreadPoolExecutor(max_workers=self.worker_threads, thread_name_prefix="asgi-worker"))
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                memory_service = getattr(self.flask_app, "memory_service", None)
+                if memory_service is not None:
+                    await asyncio.to_thread(memory_service.close)
+                await asyncio.to_thread(session_history.close)
+                await asyncio.to_thread(chart_renderer.shutdown)
+                await close_async_http_client()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _run_analysis(self, environ, endpoint, send):
+        # Flask contexts live in context variables, which asyncio.to_thread copies to the worker
+        with self.flask_app.request_context(environ):
+            response = self.flask_app.make_response(await analyze(endpoint))
+            response = self.flask_app.process_response(response)
+            await _send_response(send, response.status_code, response.headers.items(), [response.get_data()])
+
+    async def _run_stream(self, environ, send):
+        with self.flask_app.request_context(environ):
+            user_query = read_stream_query()
+            if not user_query:
+                response = self.flask_app.make_response((jsonify({"error": "No query provided"}), 400))
+                await _send_response(send, response.status_code, response.headers.items(), [response.get_data()])
+                return
+
+            # Session setup before streaming starts, so the session cookie goes out with the headers
+            session_id = SessionService.get_or_create_session()
+            run_id = SessionService.create_run()
+            response = Response(content_type='text/event-stream', headers=SSE_HEADERS)
+            response = self.flask_app.process_response(response)
+            await send({"type": "http.response.start", "status": response.status_code,
+                        "headers": _encode_headers(response.headers.items())})
+            async for frame in stream_events(user_query, session_id, run_id):
+                await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _run_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def put(kind, value=None):
+            loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+
+        def start_response(status, headers, exc_info=None):
+            put("start", (int(status.split(" ", 1)[0]), headers))
+
+        def run():
+            try:
+                app_iter = self.flask_app(environ, start_response)
+                try:
+                    for chunk in app_iter:
+                        if chunk:
+                            put("body", chunk)
+                finally:
+                    if hasattr(app_iter, "close"):
+                        app_iter.close()
+                put("end")
+            except Exception as e:
+                put("error", e)
+
+        worker = loop.run_in_executor(None, run)
+        started = False
+        while True:
+            kind, value = await queue.get()
+            if kind == "start":
+                status, headers = value
+                await send({"type": "http.response.start", "status": status, "headers": _encode_headers(headers)})
+                started = True
+            elif kind == "body":
+                await send({"type": "http.response.body", "body": value, "more_body": True})
+            else:
+                if kind == "error":
+                    logger.error(f"Error serving {environ['PATH_INFO']}: {str(value)}", exc_info=value)
+                    if not started:
+                        await _send_response(send, 500, [("Content-Type", "text/plain")], [b"Internal Server Error"])
+                        break
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                break
+        await worker
+
+async def analyze(endpoint):
+    """Async counterpart of the /analyze and /chat views."""
+    data = request.get_json(silent=True) or {}
+    user_query = data.get('query')
+
+    if not user_query:
+        return jsonify({"error": "No query provided"}), 400
+
+    with start_request_metrics() as request_metrics:
+        try:
+            # Session setup
+            session_id = SessionService.get_or_create_session()
+            run_id = SessionService.create_run()
+            with start_trace(run_id, endpoint=endpoint, query=user_query):
+                cached_response, initial_state = await asyncio.to_thread(prepare_analysis, user_query, session_id, run_id)
+                if cached_response is not None:
+                    return metered_response(cached_response, request_metrics, endpoint)
+
+                final_state = await get_analysis_graph().ainvoke(initial_state)
+                if not final_state:
+                    return jsonify({"error": "No result generated"}), 500
+
+                response = await asyncio.to_thread(complete_analysis, user_query, session_id, run_id, final_state)
+                return metered_response(response, request_metrics, endpoint)
+
+        except Exception as e:
+            logger.error(f"Error in async {endpoint}: {str(e)}", exc_info=True)
+            return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+async def stream_events(user_query, session_id, run_id):
+    """Async counterpart of the /stream view's event generator, driven by graph.astream."""
+    events = DeltaStream()
+    with start_request_metrics() as request_metrics:
+        try:
+            with start_trace(run_id, endpoint='stream', query=user_query):
+                cached_response, initial_state = await asyncio.to_thread(prepare_analysis, user_query, session_id, run_id)
+                events.state.update(initial_state or {})
+                yield events.event("run_started", {"run_id": run_id, "cached": cached_response is not None})
+                if cached_response is not None:
+                    for frame in events.final(cached_response):
+                        yield frame
+                    return
+
+                async for debug_event in get_analysis_graph().astream(initial_state, stream_mode="debug"):
+                    for frame in events.graph_event(debug_event):
+                        yield frame
+
+                response = await asyncio.to_thread(complete_analysis, user_query, session_id, run_id, events.state)
+
+            REQUEST_DURATION.observe(time.time() - request_metrics.started_at, endpoint='stream')
+            for frame in events.final(response, metrics=request_metrics.summary()):
+                yield frame
+
+        except Exception as e:
+            logger.error(f"Error in async stream: {str(e)}", exc_info=True)
+            yield events.event("error", {"message": str(e)})
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+def _wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def _encode_headers(headers):
+    return [(name.lower().encode("latin-1"), str(value).encode("latin-1")) for name, value in headers]
+
+async def _send_response(send, status, headers, chunks):
+    await send({"type": "http.response.start", "status": status, "headers": _encode_headers(headers)})
+    await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": False})
+
+def create_asgi_app(flask_app):
+    return AsgiApp(flask_app)
@@ -1,68 +1,190 @@
-# app/config.py
-import os
-from dotenv import load_dotenv
-from cachelib import FileSystemCache
-
-load_dotenv()
-
-class Config:
-    # API Keys
-    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-    GROQ_API_KEY = os.getenv('GROQ_API_KEY')
-    ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-
-    # Vector store selection
-    USE_CHROMADB = os.getenv('USE_CHROMADB', 'True').lower() == 'true'
-    USE_MILVUS = os.getenv('USE_MILVUS', 'False').lower() == 'true'
-
-    # Embedding selection
-    USE_OLLAMA = os.getenv('USE_OLLAMA', 'True').lower() == 'true'
-    USE_OPENAI = os.getenv('USE_OPENAI', 'False').lower() == 'true'
-
-    # ChromaDB configurations
-    CHROMA_COLLECTION_NAME = os.getenv('CHROMA_COLLECTION_NAME', 'sql_agent_memory')
-    CHROMA_PERSIST_DIRECTORY = os.getenv('CHROMA_PERSIST_DIRECTORY', './chroma_db')
-
-
-    # Database
-    BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'sql_agent_sessions.db')}")
-
-    # Ollama configurations
-    OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
-    OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama2')
-
-    # Milvus configurations
-
-    MILVUS_HOST = os.getenv('MILVUS_HOST', 'localhost')
-    MILVUS_PORT = os.getenv('MILVUS_PORT', '19530')
-    MILVUS_COLLECTION = os.getenv('MILVUS_COLLECTION', 'sql_agent_memory')
-
-    # Session configurations
-    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
-    SESSION_TYPE = 'filesystem'
-    SESSION_FILE_DIR = os.getenv('SESSION_FILE_DIR', os.path.join(BASE_DIR, 'flask_session'))
-    SESSION_PERMANENT = False
-    SESSION_USE_SIGNER = True
-    SESSION_CACHELIB = FileSystemCache(SESSION_FILE_DIR)
-
-    # Database
-    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///ecommerce.db')
-
-
-    # LLM Settings
-    # OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama2')  # Default Ollama model
-    LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4o-mini')  # This can serve as a fallback model if needed
-    LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', '0.1'))
-
-    # Application Settings
-    MAX_TABLES_TO_SELECT = int(os.getenv('MAX_TABLES_TO_SELECT', '5'))
-    MAX_SQL_REFINEMENT_ATTEMPTS = int(os.getenv('MAX_SQL_REFINEMENT_ATTEMPTS', '3'))
-
-    # LangChain and LangSmith Settings
-    LANGCHAIN_TRACING_V2 = os.getenv('LANGCHAIN_TRACING_V2', 'false').lower() == 'true'
-    LANGSMITH_API_KEY = os.getenv('LANGSMITH_API_KEY')
-
-    # Graph Settings
-    GRAPH_RECURSION_LIMIT = int(os.getenv('GRAPH_RECURSION_LIMIT', '20'))
-
+# app/config.py
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class Config:
+    # API Keys
+    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+    ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+
+    # Vector store selection
+    USE_CHROMADB = os.getenv('USE_CHROMADB', 'True').lower() == 'true'
+    USE_MILVUS = os.getenv('USE_MILVUS', 'False').lower() == 'true'
+
+    # Embedding selection
+    USE_OLLAMA = os.getenv('USE_OLLAMA', 'True').lower() == 'true'
+    USE_OPENAI = os.getenv('USE_OPENAI', 'False').lower() == 'true'
+
+    # ChromaDB configurations
+    CHROMA_COLLECTION_NAME = os.getenv('CHROMA_COLLECTION_NAME', 'sql_agent_memory')
+    CHROMA_PERSIST_DIRECTORY = os.getenv('CHROMA_PERSIST_DIRECTORY', './chroma_db')
+
+
+    # Database
+    BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'sql_agent_sessions.db')}")
+
+    # Ollama configurations
+    OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+    OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama2')
+
+    # Milvus configurations
+
+    MILVUS_HOST = os.getenv('MILVUS_HOST', 'localhost')
+    MILVUS_PORT = os.getenv('MILVUS_PORT', '19530')
+    MILVUS_COLLECTION = os.getenv('MILVUS_COLLECTION', 'sql_agent_memory')
+
+    # Session configurations
+    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
+    SESSION_TYPE = os.getenv('SESSION_TYPE', 'sqlite')  # 'sqlite', 'filesystem' or 'cookie'
+    SESSION_FILE_DIR = os.getenv('SESSION_FILE_DIR', os.path.join(BASE_DIR, 'flask_session'))
+    SESSION_SQLITE_PATH = os.getenv('SESSION_SQLITE_PATH', os.path.join(BASE_DIR, 'flask_session.db'))
+    SESSION_SWEEP_INTERVAL = int(os.getenv('SESSION_SWEEP_INTERVAL', '300'))
+    SESSION_PERMANENT = False
+    SESSION_USE_SIGNER = True
+
+    # Admin operations require this token in an X-Admin-Token header; without one they are
+    # only served when the app runs in debug mode
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+    # Database
+    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///ecommerce.db')
+
+    # Connection pool for the analysed database (shared by schema introspection and SQL execution)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_READ_ONLY = os.getenv('DB_READ_ONLY', 'True').lower() == 'true'
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))  # negative = KiB, i.e. 64 MiB
+    # WAL is persistent: it converts the database file and leaves -wal/-shm files next to it
+    SQLITE_WAL = os.getenv('SQLITE_WAL', 'False').lower() == 'true'
+
+    # Schema cache (SQLite uses PRAGMA schema_version; other dialects expire after the TTL)
+    SCHEMA_CACHE_TTL = int(os.getenv('SCHEMA_CACHE_TTL', '300'))
+    # Lifetime of the data-version token for databases without a cheap change marker
+    DATA_VERSION_TTL = int(os.getenv('DATA_VERSION_TTL', '300'))
+
+    # Embedding cache: in-process LRU in front of an on-disk SQLite store (empty path: memory only)
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', './embedding_cache/embeddings.db')
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '4096'))
+
+    # Chart output: png, jpeg or svg rendered on the server, or a vega-lite spec rendered by the browser
+    CHART_FORMAT = os.getenv('CHART_FORMAT', 'png')
+    CHART_DPI = int(os.getenv('CHART_DPI', '100'))
+    # Raster charts render in a pool of worker processes (per-render timeout and memory headroom)
+    CHART_RENDER_POOL_ENABLED = os.getenv('CHART_RENDER_POOL_ENABLED', 'True').lower() == 'true'
+    CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '2'))
+    CHART_RENDER_TIMEOUT = float(os.getenv('CHART_RENDER_TIMEOUT', '15'))
+    CHART_RENDER_MEMORY_MB = int(os.getenv('CHART_RENDER_MEMORY_MB', '512'))
+    CHART_CACHE_ENABLED = os.getenv('CHART_CACHE_ENABLED', 'True').lower() == 'true'
+    CHART_CACHE_MAX_BYTES = int(os.getenv('CHART_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+    # Results larger than this are reduced before plotting (see app/utils/downsample_utils.py)
+    CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', '2000'))
+    CHART_LINE_DOWNSAMPLING = os.getenv('CHART_LINE_DOWNSAMPLING', 'lttb')  # 'lttb' or 'minmax'
+    CHART_SCATTER_BINS = int(os.getenv('CHART_SCATTER_BINS', '100'))
+    CHART_HEATMAP_BINS = int(os.getenv('CHART_HEATMAP_BINS', '50'))
+    CHART_HISTOGRAM_BINS = int(os.getenv('CHART_HISTOGRAM_BINS', '50'))
+    CHART_MAX_CATEGORIES = int(os.getenv('CHART_MAX_CATEGORIES', '20'))
+
+    # Long-term memory writes are queued and persisted in batches by a background thread
+    MEMORY_WRITE_BEHIND = os.getenv('MEMORY_WRITE_BEHIND', 'True').lower() == 'true'
+    MEMORY_BATCH_SIZE = int(os.getenv('MEMORY_BATCH_SIZE', '10'))
+    MEMORY_FLUSH_INTERVAL = float(os.getenv('MEMORY_FLUSH_INTERVAL', '5'))
+    MEMORY_MAX_PENDING = int(os.getenv('MEMORY_MAX_PENDING', '1000'))
+    # Failed batches are requeued and retried up to this many times before they are dropped
+    MEMORY_MAX_RETRIES = int(os.getenv('MEMORY_MAX_RETRIES', '3'))
+
+    # Session history inserts are committed in batches; recent turns are cached per session
+    SESSION_HISTORY_WRITE_BEHIND = os.getenv('SESSION_HISTORY_WRITE_BEHIND', 'True').lower() == 'true'
+    SESSION_HISTORY_BATCH_SIZE = int(os.getenv('SESSION_HISTORY_BATCH_SIZE', '50'))
+    SESSION_HISTORY_FLUSH_INTERVAL = float(os.getenv('SESSION_HISTORY_FLUSH_INTERVAL', '1'))
+    SESSION_HISTORY_MAX_PENDING = int(os.getenv('SESSION_HISTORY_MAX_PENDING', '5000'))
+    SESSION_HISTORY_CACHE_SESSIONS = int(os.getenv('SESSION_HISTORY_CACHE_SESSIONS', '1024'))
+    SESSION_HISTORY_CACHE_TURNS = int(os.getenv('SESSION_HISTORY_CACHE_TURNS', '10'))
+
+    # Answer cache in front of the analysis graph
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True').lower() == 'true'
+    ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', '3600'))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '1000'))
+    # The similarity tier replays answers to reworded questions; off unless explicitly enabled
+    ANSWER_CACHE_SIMILARITY_ENABLED = os.getenv('ANSWER_CACHE_SIMILARITY_ENABLED', 'False').lower() == 'true'
+    ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('ANSWER_CACHE_SIMILARITY_THRESHOLD', '0.95'))
+
+    # Query result cache (keyed by normalized SQL + data version, bounded by bytes)
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+    # SQL execution limits (results are streamed and reading stops at the first cap reached)
+    SQL_FETCH_SIZE = int(os.getenv('SQL_FETCH_SIZE', '1000'))
+    SQL_MAX_ROWS = int(os.getenv('SQL_MAX_ROWS', '10000'))
+    SQL_MAX_RESULT_BYTES = int(os.getenv('SQL_MAX_RESULT_BYTES', str(32 * 1024 * 1024)))
+    # Counting the rows of a truncated result re-runs the whole query, so it is opt-in and time-bounded
+    SQL_COUNT_TRUNCATED_ROWS = os.getenv('SQL_COUNT_TRUNCATED_ROWS', 'False').lower() == 'true'
+    SQL_COUNT_TIMEOUT = float(os.getenv('SQL_COUNT_TIMEOUT', '2'))
+
+    # Result profile shared by the evaluator, visualizer and summarizer (larger results are sampled)
+    RESULT_PROFILE_SAMPLE_ROWS = int(os.getenv('RESULT_PROFILE_SAMPLE_ROWS', '10000'))
+    RESULT_PROFILE_HEAD_ROWS = int(os.getenv('RESULT_PROFILE_HEAD_ROWS', '5'))
+
+    # Result digest handed to the summarizer instead of the raw rows
+    SUMMARY_RESULT_TOKEN_BUDGET = int(os.getenv('SUMMARY_RESULT_TOKEN_BUDGET', '1500'))
+    SUMMARY_SAMPLE_ROWS = int(os.getenv('SUMMARY_SAMPLE_ROWS', '5'))  # rows each for head, tail and top-k
+
+
+    # LLM Settings
+    # OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama2')  # Default Ollama model
+    LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4o-mini')  # This can serve as a fallback model if needed
+    LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', '0.1'))
+    # Shared keep-alive connection pool for the HTTP-based LLM clients
+    LLM_HTTP_MAX_CONNECTIONS = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '100'))
+    LLM_HTTP_MAX_KEEPALIVE = int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', '20'))
+    LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', '30'))
+    # Maximum LLM calls in flight in the process, shared by the ASGI serving loop and the
+    # background loop that runs the synchronous requests
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '64'))
+    # Worker threads of the ASGI server for database, CPU-bound node work and non-async routes
+    ASGI_WORKER_THREADS = int(os.getenv('ASGI_WORKER_THREADS', '32'))
+    # /batch: questions run concurrently per batch (callers may ask for up to the maximum)
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+    BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '16'))
+    BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', '1000'))
+    # /stream events: larger values are sent once and then referenced; result rows are previewed
+    STREAM_INLINE_MAX_BYTES = int(os.getenv('STREAM_INLINE_MAX_BYTES', '16384'))
+    STREAM_PREVIEW_ROWS = int(os.getenv('STREAM_PREVIEW_ROWS', '20'))
+
+    # Schema index used to shortlist candidate tables for the analyzer on large schemas
+    SCHEMA_INDEX_ENABLED = os.getenv('SCHEMA_INDEX_ENABLED', 'True').lower() == 'true'
+    SCHEMA_INDEX_MIN_TABLES = int(os.getenv('SCHEMA_INDEX_MIN_TABLES', '30'))  # smaller schemas are sent whole
+    SCHEMA_INDEX_TOP_N = int(os.getenv('SCHEMA_INDEX_TOP_N', '15'))
+    SCHEMA_INDEX_USE_EMBEDDINGS = os.getenv('SCHEMA_INDEX_USE_EMBEDDINGS', 'True').lower() == 'true'
+    SCHEMA_INDEX_EMBEDDING_WEIGHT = float(os.getenv('SCHEMA_INDEX_EMBEDDING_WEIGHT', '0.5'))
+
+    # Application Settings
+    MAX_TABLES_TO_SELECT = int(os.getenv('MAX_TABLES_TO_SELECT', '5'))
+    MAX_SQL_REFINEMENT_ATTEMPTS = int(os.getenv('MAX_SQL_REFINEMENT_ATTEMPTS', '3'))
+
+    # SQL validation: local checks always run; the LLM review only runs when enabled and local checks pass
+    SQL_EXPLAIN_CHECK = os.getenv('SQL_EXPLAIN_CHECK', 'True').lower() == 'true'
+    SQL_SEMANTIC_REVIEW = os.getenv('SQL_SEMANTIC_REVIEW', 'False').lower() == 'true'
+
+    # LangChain and LangSmith Settings
+    LANGCHAIN_TRACING_V2 = os.getenv('LANGCHAIN_TRACING_V2', 'false').lower() == 'true'
+    LANGSMITH_API_KEY = os.getenv('LANGSMITH_API_KEY')
+
+    # Per-run span traces (ring buffer of recent runs, optional JSONL file, sampled per run);
+    # /debug/runs serves them behind ADMIN_TOKEN like the admin endpoints
+    TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'True').lower() == 'true'
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+    TRACE_BUFFER_RUNS = int(os.getenv('TRACE_BUFFER_RUNS', '200'))
+    TRACE_MAX_SPANS_PER_RUN = int(os.getenv('TRACE_MAX_SPANS_PER_RUN', '500'))
+    TRACE_JSONL_PATH = os.getenv('TRACE_JSONL_PATH', '')
+
+    # Graph Settings
+    GRAPH_RECURSION_LIMIT = int(os.getenv('GRAPH_RECURSION_LIMIT', '20'))
+
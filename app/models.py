@@ -1,96 +1,228 @@
-# app/models.py
-from typing import TypedDict
-from langchain_core.pydantic_v1 import BaseModel, Field
-from typing import Dict, List, Any, Optional
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-
-db = SQLAlchemy()
-
-class SessionHistory(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    session_id = db.Column(db.String(50), nullable=False)
-    run_id = db.Column(db.String(50), nullable=False)
-    query = db.Column(db.Text, nullable=False)
-    response = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-
-    def __repr__(self):
-        return f'<SessionHistory {self.id}>'
-
-class TableSchema(BaseModel):
-    name: str
-    columns: Dict[str, str]
-
-class TableSample(BaseModel):
-    name: str
-    data: List[Dict[str, Any]]
-
-class TableInfo(BaseModel):
-    table_schema: TableSchema
-    sample: TableSample
-
-class AnalyzedQuery(BaseModel):
-    original_query: str
-    analyzed_query: str
-    selected_tables: List[str]
-    explanation: str
-    is_query_relevant: bool
-
-class GeneratedSQL(BaseModel):
-    sql_query: str
-    explanation: str
-
-class ReflectedGeneratedSQL(BaseModel):
-    reflected_sql_query: str
-    reflected_explanation: str
-
-class SQLValidationResult(BaseModel):
-    is_sql_valid: bool = Field(description="Whether the SQL query is valid and safe to execute")
-    issues: List[str] = Field(default_factory=list, description="List of identified issues with the SQL query")
-    suggested_fix: str = Field(default="", description="Suggested fix for the SQL query if issues are found")
-
-class SQLExecutionResult(BaseModel):
-    success: bool
-    data: Optional[List[Dict[str, Any]]] = None
-    error_message: Optional[str] = None
-
-class EvaluationResult(BaseModel):
-    is_result_relevant: bool = Field(description="Whether the results are relevant to the original query")
-    explanation: str = Field(description="Explanation of the evaluation")
-    requires_visualization: bool = Field(description="Whether the results would benefit from visualization")
-    summary: str = Field(description="Human-friendly summary of the results")
-
-class Visualization(BaseModel):
-    image: str = Field(description="Base64 encoded image of the visualization")
-    description: str = Field(description="Description of the visualization")
-
-
-class SQLCorrectionResult(BaseModel):
-    analysis: str = Field(default="No analysis provided", description="Analysis of why the current SQL query is not producing relevant results")
-    identified_issues: str = Field(default="No issues identified", description="List of specific issues identified in the current SQL query")
-    corrected_sql_query: str = Field(default="", description="A corrected SQL query that addresses the identified issues")
-
-class AgentState(TypedDict):
-    user_query: str
-    db_info: Optional[dict]
-    analyzed_query: Optional[AnalyzedQuery]
-    generated_sql: Optional[GeneratedSQL]
-    validation_result: Optional[SQLValidationResult]
-    execution_result: Optional[SQLExecutionResult]
-    evaluation_result: Optional[EvaluationResult]
-    visualization: Optional[Visualization]
-    summary: Optional[str]
-    error: Optional[str]
-    is_query_relevant: bool
-    is_result_relevant: bool
-    regenerate_list: List[str]
-    reanalyze_list: List[str]
-    reflection: Optional[Dict[str, Any]]
-    reflected_generated_sql: Optional[ReflectedGeneratedSQL]
-    relevant_memories: Optional[List[Dict[str, Any]]]
-    session_id: str
-    sql_correction: Optional[SQLCorrectionResult]
- 
-
-
+# app/models.py
+from typing import TypedDict
+from langchain_core.pydantic_v1 import BaseModel, Field
+from typing import Dict, List, Any, Optional
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+import sys
+import hashlib
+import numpy as np
+import pandas as pd
+
+db = SQLAlchemy()
+
+class SessionHistory(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(50), nullable=False)
+    run_id = db.Column(db.String(50), nullable=False)
+    query = db.Column(db.Text, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Serves "latest turns of a session" without scanning or sorting the table
+    __table_args__ = (db.Index('ix_session_history_session_id_timestamp', 'session_id', 'timestamp'),)
+
+    def __repr__(self):
+        return f'<SessionHistory {self.id}>'
+
+class TableSchema(BaseModel):
+    name: str
+    columns: Dict[str, str]
+
+class TableSample(BaseModel):
+    name: str
+    data: List[Dict[str, Any]]
+
+class TableInfo(BaseModel):
+    table_schema: TableSchema
+    sample: TableSample
+
+class AnalyzedQuery(BaseModel):
+    original_query: str
+    analyzed_query: str
+    selected_tables: List[str]
+    explanation: str
+    is_query_relevant: bool
+
+class GeneratedSQL(BaseModel):
+    sql_query: str
+    explanation: str
+
+class ReflectedGeneratedSQL(BaseModel):
+    reflected_sql_query: str
+    reflected_explanation: str
+
+class SQLValidationResult(BaseModel):
+    is_sql_valid: bool = Field(description="Whether the SQL query is valid and safe to execute")
+    issues: List[str] = Field(default_factory=list, description="List of identified issues with the SQL query")
+    suggested_fix: str = Field(default="", description="Suggested fix for the SQL query if issues are found")
+
+class ColumnarResult:
+    """
+    Query result stored column-wise: the column names plus one typed NumPy array per column
+    (integer columns with NULLs are masked int64 arrays). Consumers get DataFrame views via
+    to_frame(); the row-dict form is only built at the API edge via to_records().
+    The arrays are read-only, since cached results are shared between requests.
+    """
+
+    def __init__(self, columns: List[str], arrays: List[np.ndarray]):
+        self.columns = list(columns)
+        self.arrays = list(arrays)
+        for array in self.arrays:
+            array.flags.writeable = False
+            if np.ma.isMaskedArray(array):
+                np.ma.getmaskarray(array).flags.writeable = False
+
+    @classmethod
+    def from_columns(cls, columns: List[str], column_values: List[List[Any]]) -> "ColumnarResult":
+        return cls(columns, [_to_typed_array(values) for values in column_values])
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "ColumnarResult":
+        columns = list(records[0].keys()) if records else []
+        return cls.from_columns(columns, [[record.get(column) for record in records] for column in columns])
+
+    def __len__(self):
+        return len(self.arrays[0]) if self.arrays else 0
+
+    def __repr__(self):
+        return f"ColumnarResult(columns={self.columns}, rows={len(self)})"
+
+    @property
+    def nbytes(self) -> int:
+        size = 0
+        for array in self.arrays:
+            size += array.nbytes
+            if np.ma.isMaskedArray(array):
+                size += np.ma.getmaskarray(array).nbytes
+            elif array.dtype == object:
+                size += sum(sys.getsizeof(value) for value in array)
+        return size
+
+    def fingerprint(self) -> str:
+        """Hash of the column names, types and values, e.g. to cache artifacts derived from the result."""
+        digest = hashlib.sha1()
+        for column, array in zip(self.columns, self.arrays):
+            digest.update(f"{column}\x1f{array.dtype.str}\x1f{len(array)}\x1e".encode("utf-8"))
+            if array.dtype == object:
+                digest.update("\x1f".join(map(repr, array.tolist())).encode("utf-8"))
+            elif np.ma.isMaskedArray(array):
+                digest.update(np.ascontiguousarray(array.filled(0)).tobytes())
+                digest.update(np.ascontiguousarray(np.ma.getmaskarray(array)).tobytes())
+            else:
+                digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame backed by the existing arrays (no copy)."""
+        return pd.DataFrame(dict(zip(self.columns, self.arrays)), columns=self.columns, copy=False)
+
+    def to_records(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        column_lists = []
+        for array in self.arrays:
+            values = array[:limit].tolist()  # masked entries become None
+            if array.dtype.kind == 'f':
+                values = [None if value != value else value for value in values]  # NaN -> None
+            column_lists.append(values)
+        return [dict(zip(self.columns, row)) for row in zip(*column_lists)]
+
+def _to_typed_array(values: List[Any]) -> np.ndarray:
+    present = [value for value in values if value is not None]
+    kinds = {type(value) for value in present}
+    has_nulls = len(present) < len(values)
+
+    if kinds == {bool} and not has_nulls:
+        return np.array(values, dtype=bool)
+    if kinds == {int}:
+        try:
+            if not has_nulls:
+                return np.array(values, dtype=np.int64)
+            # Stays integer (3, not 3.0) with the NULLs masked
+            return np.ma.masked_array([0 if value is None else value for value in values],
+                                      mask=[value is None for value in values], dtype=np.int64)
+        except OverflowError:
+            pass
+    elif kinds and kinds <= {int, float}:
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+class SQLExecutionResult(BaseModel):
+    success: bool
+    data: Optional[ColumnarResult] = None
+    error_message: Optional[str] = None
+    truncated: bool = Field(default=False, description="Whether reading stopped at the row or byte cap")
+    row_count: int = Field(default=0, description="Number of rows returned in data")
+    total_row_count: Optional[int] = Field(default=None, description="Total rows the query produces, if known")
+
+    class Config:
+        arbitrary_types_allowed = True
+
+class ColumnProfile(BaseModel):
+    name: str
+    dtype: str = Field(description="NumPy dtype of the column (object for text and mixed values)")
+    nulls: int = 0
+    distinct: int = 0
+    min: Optional[Any] = None
+    max: Optional[Any] = None
+    mean: Optional[float] = None
+    top_values: Optional[Dict[str, int]] = Field(default=None, description="Most frequent values of a text column")
+
+class ResultProfile(BaseModel):
+    row_count: int = Field(description="Rows in the execution result")
+    profiled_rows: int = Field(description="Rows the statistics were computed on (a sample for large results)")
+    columns: List[ColumnProfile] = Field(default_factory=list)
+    head: List[Dict[str, Any]] = Field(default_factory=list, description="First rows of the result")
+
+    @property
+    def sampled(self) -> bool:
+        return self.profiled_rows < self.row_count
+
+class EvaluationResult(BaseModel):
+    is_result_relevant: bool = Field(description="Whether the results are relevant to the original query")
+    explanation: str = Field(description="Explanation of the evaluation")
+    requires_visualization: bool = Field(description="Whether the results would benefit from visualization")
+    summary: str = Field(description="Human-friendly summary of the results")
+
+class Visualization(BaseModel):
+    image: Optional[str] = Field(default=None, description="Base64 encoded image of the visualization (raster and SVG formats)")
+    spec: Optional[Dict[str, Any]] = Field(default=None, description="Vega-Lite specification rendered by the browser")
+    format: str = Field(default="png", description="Output format: png, jpeg, svg or vega-lite")
+    description: str = Field(description="Description of the visualization")
+
+
+class SQLCorrectionResult(BaseModel):
+    analysis: str = Field(default="No analysis provided", description="Analysis of why the current SQL query is not producing relevant results")
+    identified_issues: str = Field(default="No issues identified", description="List of specific issues identified in the current SQL query")
+    corrected_sql_query: str = Field(default="", description="A corrected SQL query that addresses the identified issues")
+
+class AgentState(TypedDict):
+    user_query: str
+    query_embedding: Optional[List[float]]
+    db_info: Optional[dict]
+    analyzed_query: Optional[AnalyzedQuery]
+    generated_sql: Optional[GeneratedSQL]
+    validation_result: Optional[SQLValidationResult]
+    execution_result: Optional[SQLExecutionResult]
+    result_profile: Optional[ResultProfile]
+    evaluation_result: Optional[EvaluationResult]
+    visualization: Optional[Visualization]
+    visualization_future: Optional[Any]  # Future of the chart while it renders
+    visualization_explanation: Optional[str]  # Why the chart type was chosen
+    summary: Optional[str]
+    error: Optional[str]
+    is_query_relevant: bool
+    is_result_relevant: bool
+    regenerate_list: List[str]
+    reanalyze_list: List[str]
+    reflection: Optional[Dict[str, Any]]
+    reflected_generated_sql: Optional[ReflectedGeneratedSQL]
+    relevant_memories: Optional[List[Dict[str, Any]]]
+    session_id: str
+    run_id: Optional[str]
+    sql_correction: Optional[SQLCorrectionResult]
+ 
+
+
@@ -1,269 +1,453 @@
-# app/routes.py
-import json
-from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
-from app.services.graph_service import create_analysis_graph
-from app.config import Config
-from app.services.session_service import SessionService
-from app import memory_service
-from app.models import AgentState
-import traceback
-import logging
-import time
-from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, render_template
-
-main_bp = Blueprint('main', __name__)
-logger = logging.getLogger(__name__)
-
-@main_bp.route('/')
-def index():
-    return render_template('index.html')
-
-@main_bp.route('/analyze', methods=['POST'])
-def analyze_query():
-    start_time = time.time()
-    logger.info("Starting query analysis")
-
-    data = request.json
-    user_query = data.get('query')
-
-    if not user_query:
-        return jsonify({"error": "No query provided"}), 400
-
-    try:
-        # Session setup
-        session_id = SessionService.get_or_create_session()
-        run_id = SessionService.create_run()
-
-        # Memory search
-        relevant_memories = memory_service.search_memory(user_query)
-
-        # Create analysis graph
-        analysis_graph = create_analysis_graph(memory_service)
-
-        # Prepare initial state
-        initial_state = AgentState(
-            user_query=user_query,
-            db_info=None,
-            analyzed_query=None,
-            generated_sql=None,
-            validation_result=None,
-            execution_result=None,
-            evaluation_result=None,
-            visualization=None,
-            summary=None,
-            error=None,
-            is_query_relevant=False,
-            is_result_relevant=False,
-            regenerate_list=[],
-            reanalyze_list=[],
-            reflection=None,
-            reflected_generated_sql=None,
-            relevant_memories=relevant_memories,
-            session_id=session_id,
-            run_id=run_id,
-            recent_history=[],
-            sql_correction=None
-        )
-
-        # Invoke graph
-        final_state = analysis_graph.invoke(initial_state)
-
-        # Prepare response
-        response = {
-            "summary": final_state.get('summary', "No summary available."),
-            "visualization": None
-        }
-
-        if final_state.get('visualization'):
-            response["visualization"] = {
-                "image": final_state['visualization'].image,
-                "description": final_state['visualization'].description
-            }
-
-        # Add interaction to long-term memory
-        memory_service.add_memory(
-            text=f"Query: {user_query}\nResponse: {response['summary']}",
-            metadata={"session_id": session_id, "run_id": run_id}
-        )
-
-        # Add interaction to session history
-        SessionService.add_to_session_history(
-            session_id=session_id,
-            run_id=run_id,
-            query=user_query,
-            response=response['summary']
-        )
-
-        end_time = time.time()
-        logger.info(f"Total query analysis completed in {end_time - start_time:.2f} seconds")
-
-        return jsonify(response)
-
-    except Exception as e:
-        logger.error(f"Error in analyze_query: {str(e)}", exc_info=True)
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-
-@main_bp.route('/chat', methods=['POST'])
-def chat():
-    data = request.json
-    user_query = data.get('query')
-
-    if not user_query:
-        return jsonify({"error": "No query provided"}), 400
-
-    try:
-        # Session setup
-        session_id = SessionService.get_or_create_session()
-        run_id = SessionService.create_run()
-
-        # Memory search
-        relevant_memories = memory_service.search_memory(user_query)
-
-        # Create analysis graph
-        analysis_graph = create_analysis_graph(memory_service)
-
-        # Prepare initial state
-        initial_state = AgentState(
-            user_query=user_query,
-            db_info=None,
-            analyzed_query=None,
-            generated_sql=None,
-            validation_result=None,
-            execution_result=None,
-            evaluation_result=None,
-            visualization=None,
-            summary=None,
-            error=None,
-            is_query_relevant=False,
-            is_result_relevant=False,
-            regenerate_list=[],
-            reanalyze_list=[],
-            reflection=None,
-            reflected_generated_sql=None,
-            relevant_memories=relevant_memories,
-            session_id=session_id,
-            run_id=run_id,
-            recent_history=[],
-            sql_correction=None
-        )
-
-        final_state = analysis_graph.invoke(initial_state)
-
-        if final_state:
-            response = {
-                "summary": final_state.get('summary', "No summary available."),
-                "visualization": None
-            }
-
-            if final_state.get('visualization'):
-                response["visualization"] = {
-                    "image": final_state['visualization'].image,
-                    "description": final_state['visualization'].description
-                }
-
-            # Add interaction to long-term memory
-            memory_service.add_memory(
-                text=f"Query: {user_query}\nResponse: {response['summary']}",
-                metadata={"session_id": session_id, "run_id": run_id}
-            )
-
-            # Add interaction to session history
-            SessionService.add_to_session_history(
-                session_id=session_id,
-                run_id=run_id,
-                query=user_query,
-                response=response['summary']
-            )
-
-            return jsonify(response)
-
-        else:
-            return jsonify({"error": "No result generated"}), 500
-
-    except Exception as e:
-        logger.error(f"Error in chat: {str(e)}", exc_info=True)
-        return jsonify({"error": str(e)}), 500
-    
-
-@main_bp.route('/stream', methods=['POST'])
-def stream_chat():
-    data = request.json
-    user_query = data.get('query')
-
-    if not user_query:
-        return jsonify({"error": "No query provided"}), 400
-
-    def generate():
-        try:
-            # Session setup
-            session_id = SessionService.get_or_create_session()
-            run_id = SessionService.create_run()
-
-            # Memory search
-            relevant_memories = memory_service.search_memory(user_query)
-
-            # Create analysis graph
-            analysis_graph = create_analysis_graph(memory_service)
-
-            # Prepare initial state
-            initial_state = AgentState(
-                user_query=user_query,
-                db_info=None,
-                analyzed_query=None,
-                generated_sql=None,
-                validation_result=None,
-                execution_result=None,
-                evaluation_result=None,
-                visualization=None,
-                summary=None,
-                error=None,
-                is_query_relevant=False,
-                is_result_relevant=False,
-                regenerate_list=[],
-                reanalyze_list=[],
-                reflection=None,
-                reflected_generated_sql=None,
-                relevant_memories=relevant_memories,
-                session_id=session_id,
-                run_id=run_id,
-                recent_history=[],
-                sql_correction=None
-            )
-
-            for state in analysis_graph.stream(initial_state):
-                # Stream intermediate results
-                yield json.dumps({"type": "update", "content": str(state)}) + "\n"
-
-            # Final result
-            response = {
-                "summary": state.get('summary', "No summary available."),
-                "visualization": None
-            }
-
-            if state.get('visualization'):
-                response["visualization"] = {
-                    "image": state['visualization'].image,
-                    "description": state['visualization'].description
-                }
-
-            # Add interaction to long-term memory
-            memory_service.add_memory(
-                text=f"Query: {user_query}\nResponse: {response['summary']}",
-                metadata={"session_id": session_id, "run_id": run_id}
-            )
-
-            # Add interaction to session history
-            SessionService.add_to_session_history(
-                session_id=session_id,
-                run_id=run_id,
-                query=user_query,
-                response=response['summary']
-            )
-
-            yield json.dumps({"type": "final", "content": response}) + "\n"
-
-        except Exception as e:
-            logger.error(f"Error in stream_chat: {str(e)}", exc_info=True)
-            yield json.dumps({"type": "error", "content": str(e)}) + "\n"
-
-    return Response(stream_with_context(generate()), content_type='application/json')
\ No newline at end of file
+# app/routes.py
+import hmac
+import json
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from app.services.graph_service import create_analysis_graph
+from app.config import Config
+from app.services.session_service import SessionService, session_history
+from app.services.database_service import DatabaseService
+from app.services.sql_executor_service import result_cache
+from app.services.schema_index_service import schema_index
+from app.services.visualizer_service import chart_cache
+from app.services.chart_renderer_service import chart_renderer
+from app.utils.db_utils import get_pool_metrics
+from app.utils.metrics_utils import RequestMetrics, start_request_metrics, render_metrics, REQUEST_DURATION
+from app.utils.trace_utils import start_trace, trace_recorder
+from app.utils.stream_utils import DeltaStream
+from app import memory_service
+from app.models import AgentState
+import traceback
+import logging
+import threading
+import time
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, render_template
+
+main_bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
+
+_graph_lock = threading.Lock()
+
+def get_analysis_graph():
+    """
+    Return the app's compiled analysis graph, compiling it on first use.
+    The graph topology never changes, so one compiled graph is shared by all requests;
+    per-request inputs only travel through the state passed to invoke/stream.
+    """
+    app = current_app._get_current_object()
+    analysis_graph = getattr(app, 'analysis_graph', None)
+    if analysis_graph is None:
+        with _graph_lock:
+            analysis_graph = getattr(app, 'analysis_graph', None)
+            if analysis_graph is None:
+                start_time = time.time()
+                analysis_graph = create_analysis_graph(memory_service)
+                app.analysis_graph = analysis_graph
+                logger.info(f"Analysis graph compiled in {time.time() - start_time:.3f} seconds")
+    return analysis_graph
+
+def admin_required(view):
+    """Serve the view only to callers sending ADMIN_TOKEN, or to anyone in debug mode when no token is set."""
+    @functools.wraps(view)
+    def guarded(*args, **kwargs):
+        token = current_app.config.get('ADMIN_TOKEN')
+        if token:
+            if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+                return jsonify({"error": "Invalid or missing admin token"}), 403
+        elif not current_app.debug:
+            return jsonify({"error": "Admin operations are disabled; set ADMIN_TOKEN to enable them"}), 403
+        return view(*args, **kwargs)
+    return guarded
+
+def build_initial_state(user_query, session_id, run_id, query_embedding=None):
+    return AgentState(
+        user_query=user_query,
+        query_embedding=query_embedding,
+        db_info=None,
+        analyzed_query=None,
+        generated_sql=None,
+        validation_result=None,
+        execution_result=None,
+        result_profile=None,
+        evaluation_result=None,
+        visualization=None,
+        visualization_future=None,
+        visualization_explanation=None,
+        summary=None,
+        error=None,
+        is_query_relevant=False,
+        is_result_relevant=False,
+        regenerate_list=[],
+        reanalyze_list=[],
+        reflection=None,
+        reflected_generated_sql=None,
+        relevant_memories=[],
+        session_id=session_id,
+        run_id=run_id,
+        recent_history=[],
+        sql_correction=None
+    )
+
+def metered_response(payload, request_metrics, endpoint):
+    """JSON response carrying the per-request node breakdown in a Server-Timing header."""
+    REQUEST_DURATION.observe(time.time() - request_metrics.started_at, endpoint=endpoint)
+    response = jsonify(payload)
+    response.headers['Server-Timing'] = request_metrics.server_timing()
+    logger.info(f"Request breakdown: {request_metrics.summary()}")
+    return response
+
+def lookup_cached_answer(user_query, query_embedding):
+    answer_cache = getattr(current_app, 'answer_cache', None)
+    if answer_cache is None:
+        return None
+    cached_response, tier = answer_cache.lookup(user_query, query_embedding)
+    if cached_response is None:
+        return None
+    logger.info(f"Answer cache {tier} hit for query: {user_query[:50]}...")
+    return {**cached_response, "cached": tier}
+
+def store_cached_answer(user_query, final_state, response, query_embedding):
+    answer_cache = getattr(current_app, 'answer_cache', None)
+    execution_result = final_state.get('execution_result')
+    # Only answers backed by a successful query are worth replaying
+    if answer_cache is not None and execution_result is not None and execution_result.success:
+        answer_cache.store(user_query, response, query_embedding)
+
+def prepare_analysis(user_query, session_id, run_id):
+    """
+    Work shared by the analysis endpoints before the graph runs: the answer-cache lookup,
+    recorded in the session history on a hit (memories are retrieved inside the graph).
+    Returns (cached_response, None) on a cache hit, otherwise (None, initial_state).
+    """
+    # Answer cache (shares the query embedding with the memory search); without a memory
+    # service there is no embedding and only the exact tier applies
+    query_embedding = memory_service.embed_query(user_query) if memory_service is not None else None
+    cached_response = lookup_cached_answer(user_query, query_embedding)
+    if cached_response is not None:
+        SessionService.add_to_session_history(
+            session_id=session_id,
+            run_id=run_id,
+            query=user_query,
+            response=cached_response['summary']
+        )
+        return cached_response, None
+
+    return None, build_initial_state(user_query, session_id, run_id, query_embedding)
+
+def complete_analysis(user_query, session_id, run_id, final_state):
+    """Build the response from the final graph state, then cache it and record the interaction."""
+    response = {
+        "summary": final_state.get('summary', "No summary available."),
+        "visualization": None
+    }
+
+    if final_state.get('visualization'):
+        response["visualization"] = {
+            "format": final_state['visualization'].format,
+            "image": final_state['visualization'].image,
+            "spec": final_state['visualization'].spec,
+            "description": final_state['visualization'].description
+        }
+
+    store_cached_answer(user_query, final_state, response, final_state.get('query_embedding'))
+
+    # Add interaction to long-term memory
+    if memory_service is not None:
+        memory_service.add_memory(
+            text=f"Query: {user_query}\nResponse: {response['summary']}",
+            metadata={"session_id": session_id, "run_id": run_id}
+        )
+
+    # Add interaction to session history
+    SessionService.add_to_session_history(
+        session_id=session_id,
+        run_id=run_id,
+        query=user_query,
+        response=response['summary']
+    )
+    return response
+
+def run_analysis(app, user_query):
+    """
+    Answer one question of a batch (runs in a batch worker thread); returns the response and
+    the question's RequestMetrics. Each question gets a run-scoped session, so the result
+    evaluator never reads the answers to the other questions of the batch as conversation history.
+    """
+    with app.app_context(), start_request_metrics() as question_metrics:
+        run_id = SessionService.create_run()
+        session_id = f"batch-{run_id}"
+        with start_trace(run_id, endpoint='batch', query=user_query):
+            cached_response, initial_state = prepare_analysis(user_query, session_id, run_id)
+            if cached_response is not None:
+                return cached_response, question_metrics
+            final_state = get_analysis_graph().invoke(initial_state)
+            return complete_analysis(user_query, session_id, run_id, final_state), question_metrics
+
+@main_bp.route('/')
+def index():
+    return render_template('index.html')
+
+@main_bp.route('/analyze', methods=['POST'])
+def analyze_query():
+    start_time = time.time()
+    logger.info("Starting query analysis")
+
+    data = request.json
+    user_query = data.get('query')
+
+    if not user_query:
+        return jsonify({"error": "No query provided"}), 400
+
+    with start_request_metrics() as request_metrics:
+        try:
+            # Session setup
+            session_id = SessionService.get_or_create_session()
+            run_id = SessionService.create_run()
+            with start_trace(run_id, endpoint='analyze', query=user_query):
+                cached_response, initial_state = prepare_analysis(user_query, session_id, run_id)
+                if cached_response is not None:
+                    return metered_response(cached_response, request_metrics, 'analyze')
+
+                # Invoke the shared compiled graph
+                final_state = get_analysis_graph().invoke(initial_state)
+                response = complete_analysis(user_query, session_id, run_id, final_state)
+
+            end_time = time.time()
+            logger.info(f"Total query analysis completed in {end_time - start_time:.2f} seconds")
+
+            return metered_response(response, request_metrics, 'analyze')
+
+        except Exception as e:
+            logger.error(f"Error in analyze_query: {str(e)}", exc_info=True)
+            return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@main_bp.route('/chat', methods=['POST'])
+def chat():
+    data = request.json
+    user_query = data.get('query')
+
+    if not user_query:
+        return jsonify({"error": "No query provided"}), 400
+
+    with start_request_metrics() as request_metrics:
+        try:
+            # Session setup
+            session_id = SessionService.get_or_create_session()
+            run_id = SessionService.create_run()
+            with start_trace(run_id, endpoint='chat', query=user_query):
+                cached_response, initial_state = prepare_analysis(user_query, session_id, run_id)
+                if cached_response is not None:
+                    return metered_response(cached_response, request_metrics, 'chat')
+
+                final_state = get_analysis_graph().invoke(initial_state)
+
+                if final_state:
+                    response = complete_analysis(user_query, session_id, run_id, final_state)
+                    return metered_response(response, request_metrics, 'chat')
+
+                else:
+                    return jsonify({"error": "No result generated"}), 500
+
+        except Exception as e:
+            logger.error(f"Error in chat: {str(e)}", exc_info=True)
+            return jsonify({"error": str(e)}), 500
+    
+
+@main_bp.route('/stream', methods=['GET', 'POST'])
+def stream_chat():
+    """
+    Server-Sent Events for one question: run_started, node_started and node_finished
+    (with the state keys the node changed), payload (large values, sent once and then
+    referenced by hash), and final or error.
+    GET ?query=... exists only for EventSource clients, which cannot send a POST body. It is
+    not a safe GET: like POST it runs the analysis and records the question in the session
+    history and long-term memory, so other clients should POST.
+    """
+    user_query = read_stream_query()
+    if not user_query:
+        return jsonify({"error": "No query provided"}), 400
+
+    # Session setup before streaming starts, so the session cookie goes out with the headers
+    session_id = SessionService.get_or_create_session()
+    run_id = SessionService.create_run()
+
+    def generate():
+        events = DeltaStream()
+        with start_request_metrics() as request_metrics:
+            try:
+                with start_trace(run_id, endpoint='stream', query=user_query):
+                    cached_response, initial_state = prepare_analysis(user_query, session_id, run_id)
+                    events.state.update(initial_state or {})
+                    yield events.event("run_started", {"run_id": run_id, "cached": cached_response is not None})
+                    if cached_response is not None:
+                        yield from events.final(cached_response)
+                        return
+
+                    # Nodes return partial updates (parallel branches in the same step); DeltaStream merges them
+                    for debug_event in get_analysis_graph().stream(initial_state, stream_mode="debug"):
+                        yield from events.graph_event(debug_event)
+
+                    response = complete_analysis(user_query, session_id, run_id, events.state)
+
+                REQUEST_DURATION.observe(time.time() - request_metrics.started_at, endpoint='stream')
+                yield from events.final(response, metrics=request_metrics.summary())
+
+            except Exception as e:
+                logger.error(f"Error in stream_chat: {str(e)}", exc_info=True)
+                yield events.event("error", {"message": str(e)})
+
+    response = Response(stream_with_context(generate()), content_type='text/event-stream')
+    response.headers.update(SSE_HEADERS)
+    return response
+
+def read_stream_query():
+    """The question of a /stream request: ?query=... for GET (EventSource), the JSON body for POST."""
+    if request.method == 'GET':
+        return request.args.get('query')
+    return (request.get_json(silent=True) or {}).get('query')
+
+# Deliver each event as it is produced, including through proxies
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+@main_bp.route('/batch', methods=['POST'])
+def batch_analyze():
+    """
+    Answer a list of questions in one request. Identical questions run once; the others go
+    through the shared graph concurrently, and each answer is streamed back as an NDJSON
+    line as soon as it is ready, with the positions of its question in the request.
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(query, str) and query.strip() for query in queries):
+        return jsonify({"error": "'queries' must be a non-empty list of questions"}), 400
+    if len(queries) > Config.BATCH_MAX_QUERIES:
+        return jsonify({"error": f"A batch holds at most {Config.BATCH_MAX_QUERIES} queries"}), 400
+    try:
+        concurrency = max(1, min(int(data.get('concurrency') or Config.BATCH_CONCURRENCY), Config.BATCH_MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'concurrency' must be a number"}), 400
+
+    positions = {}
+    for index, query in enumerate(queries):
+        positions.setdefault(query.strip(), []).append(index)
+
+    # The shared resources are loaded once before fanning out
+    app = current_app._get_current_object()
+    get_analysis_graph()
+    try:
+        DatabaseService.get_schema()
+    except Exception as e:
+        logger.warning(f"Schema preload for batch failed: {str(e)}")
+    # Totals of all questions; each question records into its own metrics in run_analysis
+    request_metrics = RequestMetrics()
+    logger.info(f"Batch of {len(queries)} queries ({len(positions)} unique), concurrency {concurrency}")
+
+    def generate():
+        executor = ThreadPoolExecutor(max_workers=min(concurrency, len(positions)), thread_name_prefix="batch")
+        try:
+            futures = {executor.submit(run_analysis, app, query): query for query in positions}
+            failed = 0
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    response, question_metrics = future.result()
+                    request_metrics.add(question_metrics)
+                    line = {"type": "result", "query": query, "indices": positions[query], "content": response,
+                            "metrics": question_metrics.summary()}
+                except Exception as e:
+                    logger.error(f"Error in batch query '{query[:50]}': {str(e)}", exc_info=True)
+                    failed += 1
+                    line = {"type": "error", "query": query, "indices": positions[query], "content": str(e)}
+                yield json.dumps(line) + "\n"
+
+            REQUEST_DURATION.observe(time.time() - request_metrics.started_at, endpoint='batch')
+            yield json.dumps({"type": "summary", "queries": len(queries), "unique": len(positions), "failed": failed,
+                              "metrics": request_metrics.summary()}) + "\n"
+        finally:
+            # Stop queued questions when the client goes away
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return Response(stream_with_context(generate()), content_type='application/x-ndjson')
+
+
+@main_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@main_bp.route('/debug/runs', methods=['GET'])
+@admin_required
+def list_traced_runs():
+    return jsonify(trace_recorder.list_runs())
+
+
+@main_bp.route('/debug/runs/<run_id>', methods=['GET'])
+@admin_required
+def get_run_trace(run_id):
+    run = trace_recorder.get_run(run_id)
+    if run is None:
+        return jsonify({"error": "Run not found (not sampled or evicted from the trace buffer)"}), 404
+    return jsonify(run)
+
+
+@main_bp.route('/admin/schema', methods=['GET'])
+def schema_cache_status():
+    return jsonify(DatabaseService.get_schema_cache_stats())
+
+
+@main_bp.route('/admin/schema/refresh', methods=['POST'])
+@admin_required
+def refresh_schema_cache():
+    try:
+        return jsonify(DatabaseService.refresh_schema_cache())
+    except Exception as e:
+        logger.error(f"Error refreshing schema cache: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@main_bp.route('/admin/schema/index', methods=['GET'])
+def schema_index_status():
+    return jsonify(schema_index.get_stats())
+
+
+@main_bp.route('/admin/memory', methods=['GET'])
+def memory_status():
+    return jsonify(memory_service.get_stats() if memory_service is not None else None)
+
+
+@main_bp.route('/admin/history', methods=['GET'])
+def history_status():
+    return jsonify(session_history.get_stats())
+
+
+@main_bp.route('/admin/renderer', methods=['GET'])
+def renderer_status():
+    return jsonify(chart_renderer.get_stats())
+
+
+@main_bp.route('/admin/pool', methods=['GET'])
+def pool_status():
+    return jsonify(get_pool_metrics())
+
+
+@main_bp.route('/admin/cache', methods=['GET'])
+def cache_status():
+    answer_cache = getattr(current_app, 'answer_cache', None)
+    return jsonify({
+        "answer_cache": answer_cache.get_stats() if answer_cache is not None else None,
+        "result_cache": result_cache.get_stats(),
+        "chart_cache": chart_cache.get_stats()
+    })
+
+
+@main_bp.route('/admin/cache/clear', methods=['POST'])
+@admin_required
+def clear_cache():
+    answer_cache = getattr(current_app, 'answer_cache', None)
+    if answer_cache is not None:
+        answer_cache.clear()
+    result_cache.clear()
+    chart_cache.clear()
+    return jsonify({"status": "cleared"})
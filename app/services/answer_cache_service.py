@@ -0,0 +1,183 @@
+# app/services/answer_cache_service.py
+
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+import numpy as np
+from app.config import Config
+from app.services.database_service import DatabaseService
+
+logger = logging.getLogger(__name__)
+
+NUMBER_WORDS = {
+    "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+    "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10",
+    "eleven": "11", "twelve": "12", "fifteen": "15", "twenty": "20",
+    "fifty": "50", "hundred": "100", "thousand": "1000"
+}
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation, spell numbers as digits and collapse whitespace."""
+    words = re.sub(r"[^\w\s]", " ", query.lower()).split()
+    return " ".join(NUMBER_WORDS.get(word, word) for word in words)
+
+def _default_version():
+    return (DatabaseService.get_schema_fingerprint(), DatabaseService.get_data_version())
+
+class AnswerCache:
+    """
+    Two-tier cache of final answers in front of the analysis graph.
+
+    The exact tier matches on the normalized question text; the optional similarity tier
+    compares the question embedding (the one MemoryService already computes) against cached
+    entries and only answers when the literals of both questions (numbers, quoted values,
+    capitalized names) are equal, since embeddings barely tell "sales in France" from
+    "sales in Germany".
+    All entries belong to one (schema fingerprint, data version) pair and are dropped as
+    soon as either changes.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, similarity_threshold=None, similarity_enabled=None,
+                 version_provider=_default_version):
+        self.ttl = Config.ANSWER_CACHE_TTL if ttl is None else ttl
+        self.max_entries = Config.ANSWER_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.similarity_threshold = Config.ANSWER_CACHE_SIMILARITY_THRESHOLD if similarity_threshold is None else similarity_threshold
+        self.similarity_enabled = Config.ANSWER_CACHE_SIMILARITY_ENABLED if similarity_enabled is None else similarity_enabled
+        self.version_provider = version_provider
+        self._entries = OrderedDict()  # normalized query -> {"response", "embedding", "literals", "created_at"}
+        self._version = None
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def lookup(self, query, embedding=None):
+        """Return (response, tier) for a cached answer, or (None, None) on a miss."""
+        version = self._current_version()
+        if version is None:
+            return None, None
+
+        key = normalize_query(query)
+        vector = self._as_unit_vector(embedding) if self.similarity_enabled else None
+        with self._lock:
+            self._sync_version(version)
+            self._expire()
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return entry["response"], "exact"
+
+            if vector is not None:
+                similar_key = self._find_similar(vector, _literals(query, key))
+                if similar_key is not None:
+                    self._entries.move_to_end(similar_key)
+                    self.stats["similar_hits"] += 1
+                    return self._entries[similar_key]["response"], "similar"
+
+            self.stats["misses"] += 1
+            return None, None
+
+    def store(self, query, response, embedding=None):
+        version = self._current_version()
+        if version is None:
+            return
+
+        key = normalize_query(query)
+        with self._lock:
+            self._sync_version(version)
+            self._entries[key] = {
+                "response": response,
+                "embedding": self._as_unit_vector(embedding),
+                "literals": _literals(query, key),
+                "created_at": time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["exact_hits"] + self.stats["similar_hits"] + self.stats["misses"]
+            hits = self.stats["exact_hits"] + self.stats["similar_hits"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _current_version(self):
+        try:
+            version = self.version_provider()
+        except Exception as e:
+            logger.warning(f"Answer cache disabled for this request, could not read data version: {str(e)}")
+            return None
+        return None if version is None or None in version else version
+
+    def _sync_version(self, version):
+        if version != self._version:
+            if self._entries:
+                logger.info("Schema or data changed, invalidating answer cache")
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry["created_at"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _find_similar(self, vector, literals):
+        if self._matrix is None:
+            self._matrix_keys = [key for key, entry in self._entries.items()
+                                 if entry["embedding"] is not None and entry["embedding"].shape == vector.shape]
+            self._matrix = np.vstack([self._entries[key]["embedding"] for key in self._matrix_keys]) \
+                if self._matrix_keys else np.empty((0, vector.shape[0]), dtype=np.float32)
+        if not self._matrix_keys or self._matrix.shape[1] != vector.shape[0]:
+            return None
+
+        similarities = self._matrix @ vector
+        # Best candidates first; literals must match so "top 5" never answers "top 10"
+        for index in np.argsort(similarities)[::-1]:
+            if similarities[index] < self.similarity_threshold:
+                break
+            key = self._matrix_keys[index]
+            if self._entries[key]["literals"] == literals:
+                return key
+        return None
+
+    @staticmethod
+    def _as_unit_vector(embedding):
+        if embedding is None:
+            return None
+        try:
+            vector = np.asarray(embedding, dtype=np.float32)
+        except (TypeError, ValueError):
+            return None
+        norm = np.linalg.norm(vector)
+        if vector.ndim != 1 or norm == 0:
+            return None
+        return vector / norm
+
+_QUOTED = re.compile(r"(?<!\w)[\"']([^\"']+)[\"'](?!\w)")
+
+def _literals(query, normalized_query):
+    """Numbers (in order), quoted values and capitalized names past the first word of a question."""
+    numbers = tuple(re.findall(r"\d+(?:\.\d+)?", normalized_query))
+    quoted = _QUOTED.findall(query)
+    names = [word for word in re.findall(r"\b\w[\w-]*", _QUOTED.sub(" ", query))[1:] if word[0].isupper()]
+    return numbers, frozenset(value.strip().lower() for value in quoted + names)
@@ -0,0 +1,201 @@
+# app/services/chart_renderer_service.py
+
+import os
+import time
+import heapq
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+def _init_worker(memory_limit_mb, warm_up):
+    """Runs once in every worker: import the plotting stack, then cap further memory growth."""
+    if warm_up:
+        from app.services.visualizer_service import render_chart
+        from app.models import ColumnarResult
+        render_chart(ColumnarResult.from_columns(["x", "y"], [["a", "b"], [1, 2]]), "warm-up", "bar", "x", "y", dpi=10)
+    if memory_limit_mb:
+        _limit_address_space(memory_limit_mb)
+
+def _limit_address_space(memory_limit_mb):
+    try:
+        import resource
+        with open("/proc/self/statm") as statm:
+            current = int(statm.read().split()[0]) * resource.getpagesize()
+        limit = current + memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    except (ImportError, OSError, ValueError) as e:
+        logger.warning(f"Chart renderer memory limit not applied: {str(e)}")
+
+def _ping():
+    return os.getpid()
+
+def _render(*args, **kwargs):
+    from app.services.visualizer_service import render_chart
+    return render_chart(*args, **kwargs)
+
+class ChartRenderer:
+    """
+    Renders matplotlib charts in a small pool of pre-warmed worker processes, keeping
+    pyplot's global state out of the request threads. submit() returns a Future that
+    resolves to the Visualization, or to None when the render fails, runs out of memory
+    or is not done within the timeout of being submitted (the pool is then replaced so
+    the stuck worker is killed).
+    When the pool is disabled, charts render in the calling thread under a lock.
+    """
+
+    def __init__(self, workers=None, timeout=None, memory_limit_mb=None, enabled=None, warm_up=True):
+        self.workers = Config.CHART_RENDER_WORKERS if workers is None else workers
+        self.timeout = Config.CHART_RENDER_TIMEOUT if timeout is None else timeout
+        self.memory_limit_mb = Config.CHART_RENDER_MEMORY_MB if memory_limit_mb is None else memory_limit_mb
+        self.enabled = Config.CHART_RENDER_POOL_ENABLED if enabled is None else enabled
+        self.warm_up = warm_up
+        self._pool = None
+        self._lock = threading.Lock()
+        self._inline_lock = threading.Lock()
+        # Watchdog heap of (deadline, sequence, pool future, result future, pool)
+        self._deadlines = []
+        self._deadlines_changed = threading.Condition()
+        self._sequence = 0
+        self._watchdog = None
+        self.stats = {"renders": 0, "failures": 0, "timeouts": 0, "restarts": 0, "inline": 0}
+
+    def start(self):
+        """Create the pool and wait until every worker has finished its imports."""
+        if not self.enabled:
+            return
+        pool = self._get_pool()
+        start_time = time.time()
+        try:
+            pids = {future.result() for future in [pool.submit(_ping) for _ in range(self.workers)]}
+        except Exception as e:
+            logger.warning(f"Chart renderer warm-up failed: {str(e)}")
+            return
+        logger.info(f"Chart renderer warmed up {len(pids)} workers in {time.time() - start_time:.2f} seconds")
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in the pool; the returned Future never raises."""
+        result = Future()
+        if not self.enabled:
+            self.stats["inline"] += 1
+            with self._inline_lock:
+                self._resolve(result, func, args, kwargs)
+            return result
+
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                pool_future = pool.submit(func, *args, **kwargs)
+                break
+            except Exception as e:  # BrokenProcessPool after a worker died, or a pool shut down by a restart
+                logger.warning(f"Chart renderer pool unavailable, restarting: {str(e)}")
+                self._restart(pool)
+        else:
+            result.set_result(None)
+            return result
+
+        pool_future.add_done_callback(lambda done: self._complete(done, result))
+        self._watch(time.monotonic() + self.timeout, pool_future, result, pool)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def get_stats(self):
+        return {**self.stats, "workers": self.workers, "enabled": self.enabled, "timeout": self.timeout,
+                "memory_limit_mb": self.memory_limit_mb, "running": self._pool is not None}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Workers must not inherit the server's threads and locks
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit_mb, self.warm_up)
+                )
+            return self._pool
+
+    def _restart(self, broken_pool):
+        with self._lock:
+            if self._pool is not broken_pool:
+                return  # already replaced
+            self._pool = None
+        self.stats["restarts"] += 1
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+        terminate_workers = getattr(broken_pool, "terminate_workers", None)
+        if terminate_workers is not None:
+            terminate_workers()
+        else:
+            for process in list((getattr(broken_pool, "_processes", None) or {}).values()):
+                process.terminate()
+        # Warm the replacement up front so the next render does not pay for worker start-up
+        threading.Thread(target=self.start, name="chart-renderer-warm-up", daemon=True).start()
+
+    def _complete(self, pool_future, result):
+        if result.done():
+            return  # timed out already
+        try:
+            value = pool_future.result()
+            self.stats["renders"] += 1
+        except Exception as e:
+            logger.error(f"Chart rendering failed, continuing without a chart: {str(e)}")
+            self.stats["failures"] += 1
+            value = None
+        try:
+            result.set_result(value)
+        except Exception:
+            pass  # resolved concurrently by the watchdog
+
+    def _resolve(self, result, func, args, kwargs):
+        try:
+            value = func(*args, **kwargs)
+            self.stats["renders"] += 1
+        except Exception as e:
+            logger.error(f"Chart rendering failed, continuing without a chart: {str(e)}")
+            self.stats["failures"] += 1
+            value = None
+        result.set_result(value)
+
+    def _watch(self, deadline, pool_future, result, pool):
+        with self._deadlines_changed:
+            self._sequence += 1
+            heapq.heappush(self._deadlines, (deadline, self._sequence, pool_future, result, pool))
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch_loop, name="chart-render-watchdog", daemon=True)
+                self._watchdog.start()
+            self._deadlines_changed.notify()
+
+    def _watch_loop(self):
+        while True:
+            with self._deadlines_changed:
+                while not self._deadlines:
+                    self._deadlines_changed.wait()
+                deadline, _, pool_future, result, pool = self._deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0 and not pool_future.done():
+                    self._deadlines_changed.wait(remaining)
+                    continue
+                heapq.heappop(self._deadlines)
+            if pool_future.done() or result.done():
+                continue
+            logger.error(f"Chart rendering exceeded {self.timeout} seconds, continuing without a chart")
+            self.stats["timeouts"] += 1
+            try:
+                result.set_result(None)
+            except Exception:
+                pass
+            self._restart(pool)
+
+chart_renderer = ChartRenderer()
+
+def render_in_pool(*args, **kwargs):
+    """Future of render_chart(*args, **kwargs) from the shared renderer."""
+    return chart_renderer.submit(_render, *args, **kwargs)
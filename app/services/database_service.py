@@ -1,22 +1,154 @@
-# app/services/database_service.py
-from sqlalchemy import create_engine, inspect
-from app.config import Config
-from app.models import TableInfo, TableSchema, TableSample
-
-class DatabaseService:
-    @staticmethod
-    def get_database_info(state):
-        print("=================== Getting db info =====================")
-        engine = create_engine(Config.DATABASE_URL)
-        inspector = inspect(engine)
-        table_info = {}
-
-        for table_name in inspector.get_table_names():
-            columns = {col['name']: str(col['type']) for col in inspector.get_columns(table_name)}
-            table_info[table_name] = TableInfo(
-                table_schema=TableSchema(name=table_name, columns=columns),
-                sample=TableSample(name=table_name, data=[])
-            )
-
-        state["db_info"] = table_info
-        return state
+# app/services/database_service.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from app.config import Config
+from app.models import TableInfo, TableSchema, TableSample
+from app.utils.db_utils import get_engine
+
+logger = logging.getLogger(__name__)
+
+class DatabaseService:
+    # Process-wide schema cache: database URL -> {"version", "fingerprint", "tables", "loaded_at"}
+    _schema_cache = {}
+    _schema_locks = {}
+    _locks_guard = threading.Lock()
+
+    @staticmethod
+    def get_database_info(state):
+        print("=================== Getting db info =====================")
+        # Runs in parallel with the memory retrieval, so it only returns the key it writes
+        return {"db_info": DatabaseService.get_schema()}
+
+    @staticmethod
+    def get_schema(database_url=None, force_refresh=False):
+        """
+        Return the {table_name: TableInfo} mapping for the database, loading it at most
+        once per schema change. Concurrent callers that miss the cache share one load.
+        """
+        database_url = database_url or Config.DATABASE_URL
+        entry = DatabaseService._schema_cache.get(database_url)
+
+        if entry is not None and not force_refresh:
+            version = DatabaseService._get_schema_version(database_url)
+            if DatabaseService._is_entry_fresh(entry, version):
+                return dict(entry["tables"])
+
+        with DatabaseService._get_lock(database_url):
+            # Another thread may have reloaded the schema while we were waiting
+            entry = DatabaseService._schema_cache.get(database_url)
+            version = DatabaseService._get_schema_version(database_url)
+            if entry is not None and not force_refresh and DatabaseService._is_entry_fresh(entry, version):
+                return dict(entry["tables"])
+
+            entry = DatabaseService._load_schema(database_url, version)
+            DatabaseService._schema_cache[database_url] = entry
+            return dict(entry["tables"])
+
+    @staticmethod
+    def get_schema_fingerprint(database_url=None):
+        """Content hash of the cached schema, stable across processes and restarts."""
+        database_url = database_url or Config.DATABASE_URL
+        # Same freshness check as get_schema, so a changed schema never keeps its old fingerprint
+        DatabaseService.get_schema(database_url)
+        return DatabaseService._schema_cache[database_url]["fingerprint"]
+
+    @staticmethod
+    def get_data_version(database_url=None):
+        """
+        Token that changes whenever the data may have changed, used to key result caches.
+        File-backed SQLite databases use the mtime/size of the database and its WAL file;
+        other databases get a time bucket of DATA_VERSION_TTL seconds.
+        Returns None when no safe token exists (e.g. in-memory SQLite), meaning "do not cache".
+        """
+        database_url = database_url or Config.DATABASE_URL
+        if database_url.startswith("sqlite"):
+            database = make_url(database_url).database
+            if database in (None, "", ":memory:"):
+                return None
+            parts = []
+            for path in (database, f"{database}-wal"):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    stat = None
+                # Readers create an empty WAL file, which must not count as a data change
+                parts.append(f"{stat.st_mtime_ns}:{stat.st_size}" if stat and stat.st_size else "-")
+            return "|".join(parts)
+        return f"ttl:{int(time.time() // Config.DATA_VERSION_TTL)}"
+
+    @staticmethod
+    def refresh_schema_cache(database_url=None):
+        """Admin hook: drop the cached schema and reload it immediately."""
+        database_url = database_url or Config.DATABASE_URL
+        logger.info(f"Forcing schema cache refresh for {database_url}")
+        DatabaseService.get_schema(database_url, force_refresh=True)
+        return DatabaseService.get_schema_cache_stats()
+
+    @staticmethod
+    def get_schema_cache_stats():
+        return {
+            url: {
+                "tables": len(entry["tables"]),
+                "version": entry["version"],
+                "fingerprint": entry["fingerprint"],
+                "age_seconds": round(time.time() - entry["loaded_at"], 2)
+            }
+            for url, entry in DatabaseService._schema_cache.items()
+        }
+
+    @staticmethod
+    def _get_lock(database_url):
+        with DatabaseService._locks_guard:
+            return DatabaseService._schema_locks.setdefault(database_url, threading.Lock())
+
+    @staticmethod
+    def _is_entry_fresh(entry, version):
+        if version is not None:
+            return entry["version"] == version
+        # No cheap change marker for this dialect: fall back to a TTL
+        return time.time() - entry["loaded_at"] < Config.SCHEMA_CACHE_TTL
+
+    @staticmethod
+    def _get_schema_version(database_url):
+        """Cheap schema change marker. Returns None when the dialect has none."""
+        if not database_url.startswith("sqlite"):
+            return None
+        try:
+            engine = get_engine(database_url)
+            with engine.connect() as connection:
+                return connection.execute(text("PRAGMA schema_version")).scalar()
+        except Exception as e:
+            logger.warning(f"Could not read schema_version, falling back to TTL: {str(e)}")
+            return None
+
+    @staticmethod
+    def _load_schema(database_url, version):
+        start_time = time.time()
+        engine = get_engine(database_url)
+        inspector = inspect(engine)
+        table_info = {}
+
+        for table_name in inspector.get_table_names():
+            columns = {col['name']: str(col['type']) for col in inspector.get_columns(table_name)}
+            table_info[table_name] = TableInfo(
+                table_schema=TableSchema(name=table_name, columns=columns),
+                sample=TableSample(name=table_name, data=[])
+            )
+
+        fingerprint = hashlib.sha1(
+            json.dumps({name: info.table_schema.columns for name, info in table_info.items()}, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+        logger.info(f"Loaded schema for {len(table_info)} tables in {time.time() - start_time:.2f} seconds")
+        return {
+            "version": version,
+            "fingerprint": fingerprint,
+            "tables": table_info,
+            "loaded_at": time.time()
+        }
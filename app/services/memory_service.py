@@ -1,91 +1,224 @@
-# app/services/memory_service.py
-# app/services/memory_service.py
-from langchain_milvus import Milvus
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_openai import OpenAIEmbeddings
-from app.config import Config
-import logging
-
-logger = logging.getLogger(__name__)
-
-class MemoryService:
-    def __init__(self):
-        self.embedding_function = self._create_embedding_function()
-        self.vector_store = self._create_vector_store()
-        self.memory_buffer = []
-        self.buffer_size = 10
-
-    def initialize(self):
-        self.vector_store = self._create_vector_store()
-        # Load existing memories or perform any other initialization
-        logger.info("MemoryService initialized")
-
-    def _create_embedding_function(self):
-        if Config.USE_OLLAMA:
-            logger.info("Using Ollama embeddings")
-            return OllamaEmbeddings(
-                base_url=Config.OLLAMA_BASE_URL,
-                model=Config.OLLAMA_MODEL
-            )
-        elif Config.USE_OPENAI:
-            logger.info("Using OpenAI embeddings")
-            return OpenAIEmbeddings()
-        else:
-            logger.error("No valid embedding configuration found")
-            raise ValueError("No valid embedding configuration found")
-
-    def _create_vector_store(self):
-        if Config.USE_CHROMADB:
-            logger.info("Initializing ChromaDB")
-            return Chroma(
-                collection_name=Config.CHROMA_COLLECTION_NAME,
-                embedding_function=self.embedding_function,
-                persist_directory=Config.CHROMA_PERSIST_DIRECTORY
-            )
-        elif Config.USE_MILVUS:
-            logger.info("Initializing Milvus")
-            from langchain_community.vectorstores import Milvus
-            return Milvus(
-                embedding_function=self.embedding_function,
-                collection_name=Config.MILVUS_COLLECTION,
-                connection_args={"host": Config.MILVUS_HOST, "port": Config.MILVUS_PORT}
-            )
-        else:
-            logger.error("No valid vector store configuration found")
-            raise ValueError("No valid vector store configuration found")
-
-    def add_memory(self, text, metadata=None):
-        try:
-            self.vector_store.add_texts([text], metadatas=[metadata] if metadata else None)
-            if isinstance(self.vector_store, Chroma):
-                self.vector_store.persist()  # Only for ChromaDB
-            logger.info(f"Successfully added memory: {text[:50]}...")
-        except Exception as e:
-            logger.error(f"Failed to add memory: {str(e)}")
-            raise
-
-    def search_memory(self, query, k=5):
-        if not self.vector_store:
-            logger.error("Vector store not initialized")
-            return []
-        try:
-            results = self.vector_store.similarity_search(query, k=k)
-            logger.info(f"Successfully searched memory for query: {query[:50]}...")
-            return results
-        except Exception as e:
-            logger.error(f"Failed to search memory: {str(e)}")
-            return []
-
-    def clear_memory(self):
-        try:
-            if isinstance(self.vector_store, Chroma):
-                self.vector_store.delete_collection()
-                self.vector_store = self._create_vector_store()
-            elif isinstance(self.vector_store, Milvus):
-                self.vector_store.drop()
-                self.vector_store = self._create_vector_store()
-            logger.info("Successfully cleared memory")
-        except Exception as e:
-            logger.error(f"Failed to clear memory: {str(e)}")
+# app/services/memory_service.py
+# app/services/memory_service.py
+from langchain_milvus import Milvus
+from langchain_community.vectorstores import Chroma
+from langchain_community.embeddings import OllamaEmbeddings
+from langchain_openai import OpenAIEmbeddings
+from app.config import Config
+from app.utils.embedding_utils import CachedEmbeddings, cached_embeddings
+from app.utils.metrics_utils import MEMORY_QUEUE_DEPTH, MEMORY_WRITES, MEMORY_FLUSH_DURATION
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class MemoryService:
+    def __init__(self):
+        self.embedding_function = self._create_embedding_function()
+        self.vector_store = self._create_vector_store()
+        # Write-behind queue of (text, metadata, failed attempts), stored in batches by the writer thread
+        self.memory_buffer = []
+        self.buffer_size = Config.MEMORY_BATCH_SIZE
+        self.flush_interval = Config.MEMORY_FLUSH_INTERVAL
+        self.max_pending = Config.MEMORY_MAX_PENDING
+        self.max_retries = Config.MEMORY_MAX_RETRIES
+        self._buffer_changed = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._writer = None
+        self._closed = False
+        self.stats = {"written": 0, "failed": 0, "dropped": 0, "batches": 0, "last_flush_seconds": None}
+
+    def initialize(self):
+        self.vector_store = self._create_vector_store()
+        # Load existing memories or perform any other initialization
+        logger.info("MemoryService initialized")
+
+    def _create_embedding_function(self):
+        if Config.USE_OLLAMA:
+            logger.info("Using Ollama embeddings")
+            return cached_embeddings(OllamaEmbeddings(
+                base_url=Config.OLLAMA_BASE_URL,
+                model=Config.OLLAMA_MODEL
+            ), f"ollama/{Config.OLLAMA_MODEL}")
+        elif Config.USE_OPENAI:
+            logger.info("Using OpenAI embeddings")
+            embeddings = OpenAIEmbeddings()
+            return cached_embeddings(embeddings, f"openai/{embeddings.model}")
+        else:
+            logger.error("No valid embedding configuration found")
+            raise ValueError("No valid embedding configuration found")
+
+    def _create_vector_store(self):
+        if Config.USE_CHROMADB:
+            logger.info("Initializing ChromaDB")
+            return Chroma(
+                collection_name=Config.CHROMA_COLLECTION_NAME,
+                embedding_function=self.embedding_function,
+                persist_directory=Config.CHROMA_PERSIST_DIRECTORY
+            )
+        elif Config.USE_MILVUS:
+            logger.info("Initializing Milvus")
+            from langchain_community.vectorstores import Milvus
+            return Milvus(
+                embedding_function=self.embedding_function,
+                collection_name=Config.MILVUS_COLLECTION,
+                connection_args={"host": Config.MILVUS_HOST, "port": Config.MILVUS_PORT}
+            )
+        else:
+            logger.error("No valid vector store configuration found")
+            raise ValueError("No valid vector store configuration found")
+
+    def add_memory(self, text, metadata=None):
+        """
+        Queue a memory for the background writer, which stores everything pending in one
+        add_texts call (one embedding request) once buffer_size memories are queued or
+        flush_interval seconds have passed. Queued memories are not searchable until written.
+        A batch that fails is requeued and retried, up to max_retries times.
+        """
+        if not Config.MEMORY_WRITE_BEHIND or self._closed:
+            self._write_batch([(text, metadata, 0)])
+            return
+        with self._buffer_changed:
+            # Back-pressure when the writer falls behind
+            while len(self.memory_buffer) >= self.max_pending and not self._closed:
+                self._buffer_changed.wait()
+            self.memory_buffer.append((text, metadata, 0))
+            MEMORY_QUEUE_DEPTH.set(len(self.memory_buffer))
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._flush_loop, name="memory-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+            self._buffer_changed.notify_all()
+
+    def flush(self):
+        """Write all queued memories now; returns how many were written."""
+        with self._flush_lock:
+            with self._buffer_changed:
+                items, self.memory_buffer = self.memory_buffer, []
+                MEMORY_QUEUE_DEPTH.set(0)
+                self._buffer_changed.notify_all()
+            if not items:
+                return 0
+            try:
+                self._write_batch(items)
+            except Exception:
+                self.stats["failed"] += len(items)
+                MEMORY_WRITES.inc(len(items), status="error")
+                self._requeue(items)
+                return 0
+            return len(items)
+
+    def _requeue(self, items):
+        """Put a failed batch back at the head of the queue; memories out of retries (or left at close) are dropped."""
+        with self._buffer_changed:
+            retry = [] if self._closed else [(text, metadata, attempts + 1) for text, metadata, attempts in items
+                                             if attempts < self.max_retries]
+            dropped = len(items) - len(retry)
+            if dropped:
+                self.stats["dropped"] += dropped
+                MEMORY_WRITES.inc(dropped, status="dropped")
+                logger.error(f"Dropped {dropped} memories that could not be written")
+            self.memory_buffer[:0] = retry
+            MEMORY_QUEUE_DEPTH.set(len(self.memory_buffer))
+
+    def close(self):
+        """Flush pending memories and stop the writer thread (also run at interpreter exit)."""
+        with self._buffer_changed:
+            self._closed = True
+            self._buffer_changed.notify_all()
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join()
+        self.flush()
+
+    def get_stats(self):
+        with self._buffer_changed:
+            pending = len(self.memory_buffer)
+        return {**self.stats, "pending": pending, "batch_size": self.buffer_size,
+                "flush_interval": self.flush_interval, "write_behind": Config.MEMORY_WRITE_BEHIND,
+                "embedding_cache": self.embedding_function.get_stats()
+                if isinstance(self.embedding_function, CachedEmbeddings) else None}
+
+    def _flush_loop(self):
+        while True:
+            with self._buffer_changed:
+                while not self.memory_buffer and not self._closed:
+                    self._buffer_changed.wait()
+                if not self.memory_buffer:
+                    return
+                # Wait for a full batch, at most flush_interval after the first pending memory
+                deadline = time.monotonic() + self.flush_interval
+                while len(self.memory_buffer) < self.buffer_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._buffer_changed.wait(remaining)
+            if not self.flush():
+                # The batch failed and was requeued; wait flush_interval before retrying it
+                with self._buffer_changed:
+                    deadline = time.monotonic() + self.flush_interval
+                    while not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._buffer_changed.wait(remaining)
+
+    def _write_batch(self, items):
+        texts = [text for text, _, _ in items]
+        metadatas = [metadata or {} for _, metadata, _ in items]
+        start_time = time.perf_counter()
+        try:
+            self.vector_store.add_texts(texts, metadatas=metadatas if any(metadatas) else None)
+            if isinstance(self.vector_store, Chroma):
+                self.vector_store.persist()  # Only for ChromaDB
+        except Exception as e:
+            logger.error(f"Failed to add {len(texts)} memories: {str(e)}")
+            raise
+        elapsed = time.perf_counter() - start_time
+        MEMORY_FLUSH_DURATION.observe(elapsed)
+        MEMORY_WRITES.inc(len(texts), status="ok")
+        self.stats["written"] += len(texts)
+        self.stats["batches"] += 1
+        self.stats["last_flush_seconds"] = round(elapsed, 3)
+        logger.info(f"Successfully added {len(texts)} memories in {elapsed:.2f} seconds")
+
+    def embed_query(self, query):
+        """Embed the query once so callers can share the vector (memory search, answer cache)."""
+        try:
+            return self.embedding_function.embed_query(query)
+        except Exception as e:
+            logger.error(f"Failed to embed query: {str(e)}")
+            return None
+
+    def search_memory(self, query, k=5, embedding=None):
+        if not self.vector_store:
+            logger.error("Vector store not initialized")
+            return []
+        try:
+            if embedding is not None:
+                results = self.vector_store.similarity_search_by_vector(embedding, k=k)
+            else:
+                results = self.vector_store.similarity_search(query, k=k)
+            logger.info(f"Successfully searched memory for query: {query[:50]}...")
+            return results
+        except Exception as e:
+            logger.error(f"Failed to search memory: {str(e)}")
+            return []
+
+    def clear_memory(self):
+        with self._buffer_changed:
+            self.memory_buffer.clear()
+            MEMORY_QUEUE_DEPTH.set(0)
+            self._buffer_changed.notify_all()
+        try:
+            if isinstance(self.vector_store, Chroma):
+                self.vector_store.delete_collection()
+                self.vector_store = self._create_vector_store()
+            elif isinstance(self.vector_store, Milvus):
+                self.vector_store.drop()
+                self.vector_store = self._create_vector_store()
+            logger.info("Successfully cleared memory")
+        except Exception as e:
+            logger.error(f"Failed to clear memory: {str(e)}")
             raise
\ No newline at end of file
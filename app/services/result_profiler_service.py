@@ -0,0 +1,94 @@
+# app/services/result_profiler_service.py
+
+import logging
+import numpy as np
+import pandas as pd
+from app.config import Config
+from app.models import AgentState, ColumnProfile, ResultProfile
+
+logger = logging.getLogger(__name__)
+
+TOP_VALUES = 3
+
+def profile_result(execution_result, sample_rows=None, head_rows=None) -> ResultProfile:
+    """
+    Per-column statistics of an execution result, computed once on the column arrays.
+    Results larger than `sample_rows` are profiled on an evenly spaced sample of rows.
+    """
+    sample_rows = Config.RESULT_PROFILE_SAMPLE_ROWS if sample_rows is None else sample_rows
+    head_rows = Config.RESULT_PROFILE_HEAD_ROWS if head_rows is None else head_rows
+
+    data = execution_result.data
+    row_count = len(data)
+    if row_count > sample_rows:
+        index = np.linspace(0, row_count - 1, sample_rows).astype(np.int64)
+        arrays = [array[index] for array in data.arrays]
+    else:
+        arrays = data.arrays
+
+    return ResultProfile(
+        row_count=row_count,
+        profiled_rows=len(arrays[0]) if arrays else 0,
+        columns=[profile_column(name, values) for name, values in zip(data.columns, arrays)],
+        head=data.to_records(limit=head_rows)
+    )
+
+def profile_column(name, values: np.ndarray) -> ColumnProfile:
+    column = ColumnProfile(name=name, dtype=str(values.dtype))
+    if values.dtype.kind == 'b':
+        column.distinct = len(np.unique(values))
+        if len(values):
+            column.mean = float(values.mean())
+    elif values.dtype.kind in 'iuf':
+        if np.ma.isMaskedArray(values):
+            present = values.compressed()
+        elif values.dtype.kind == 'f':
+            present = values[~np.isnan(values)]
+        else:
+            present = values
+        column.nulls = len(values) - len(present)
+        column.distinct = len(np.unique(present))
+        if len(present):
+            column.min, column.max = present.min().item(), present.max().item()
+            column.mean = round(float(present.mean()), 4)
+    else:
+        series = pd.Series(values, copy=False)
+        column.nulls = int(series.isna().sum())
+        counts = series.value_counts(dropna=True)
+        column.distinct = len(counts)
+        column.top_values = {str(value): int(count) for value, count in counts.head(TOP_VALUES).items()}
+    return column
+
+def describe_profile(profile: ResultProfile) -> str:
+    """Plain-text rendering of the profile for LLM prompts."""
+    if profile.row_count == 0:
+        return "No results"
+    lines = [f"Rows: {profile.row_count}" + (f" (statistics from a sample of {profile.profiled_rows})" if profile.sampled else "")]
+    for column in profile.columns:
+        stats = [f"nulls={column.nulls}", f"distinct={column.distinct}"]
+        if column.min is not None:
+            stats += [f"min={column.min}", f"max={column.max}", f"mean={column.mean}"]
+        if column.top_values:
+            stats.append(f"top={column.top_values}")
+        lines.append(f"- {column.name} ({column.dtype}): {', '.join(stats)}")
+    return "\n".join(lines)
+
+def get_result_profile(state: AgentState) -> ResultProfile:
+    """The profile stored by the profiler node, computed here if the node did not produce one."""
+    if state.get("result_profile") is None:
+        state["result_profile"] = profile_result(state["execution_result"])
+    return state["result_profile"]
+
+def result_profiler(state: AgentState) -> AgentState:
+    print("================= Profiling the results =================")
+    execution_result = state["execution_result"]
+    if execution_result is None or not execution_result.success or execution_result.data is None:
+        state["result_profile"] = None
+        return state
+
+    try:
+        state["result_profile"] = profile_result(execution_result)
+    except Exception as e:
+        logger.error(f"Error profiling the results: {str(e)}", exc_info=True)
+        state["result_profile"] = None
+    return state
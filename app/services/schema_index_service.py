@@ -0,0 +1,157 @@
+# app/services/schema_index_service.py
+
+import re
+import hashlib
+import logging
+import threading
+import numpy as np
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+def tokenize_identifier(text):
+    """Split snake_case / camelCase identifiers and free text into lowercase terms."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return [_stem(word) for word in re.split(r"[^A-Za-z0-9]+", text.lower()) if word]
+
+def _stem(word):
+    # Plural folding is enough to match "customers" with "customer_id"
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def table_document(table_name, table_info):
+    """Text indexed for a table: its name (weighted twice) followed by its column names."""
+    return " ".join([table_name, table_name] + list(table_info.table_schema.columns))
+
+class SchemaIndex:
+    """
+    Local retrieval index over the schema, used to shortlist candidate tables before the
+    analyzer prompt. Scores combine BM25 over table/column names with cosine similarity of
+    table embeddings when an embedding function is attached. update() only re-tokenizes and
+    re-embeds tables whose definition changed.
+    """
+
+    def __init__(self, embedding_function=None, k1=1.5, b=0.75):
+        self.embedding_function = embedding_function
+        self.k1 = k1
+        self.b = b
+        self.fingerprint = None
+        self._tables = {}  # table name -> {"hash", "terms", "embedding"}
+        self._names = []
+        self._embeddings = None
+        self._lock = threading.Lock()
+        self.stats = {"rebuilds": 0, "tables_reindexed": 0, "tables_embedded": 0}
+
+    def update(self, tables, fingerprint):
+        """Bring the index in line with the {table_name: TableInfo} schema."""
+        if fingerprint == self.fingerprint:
+            return
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return
+
+            documents = {name: table_document(name, info) for name, info in tables.items()}
+            changed = []
+            for name, document in documents.items():
+                content_hash = hashlib.sha1(document.encode("utf-8")).hexdigest()
+                entry = self._tables.get(name)
+                if entry is None or entry["hash"] != content_hash:
+                    self._tables[name] = {"hash": content_hash, "terms": tokenize_identifier(document), "embedding": None}
+                    changed.append(name)
+            for name in set(self._tables) - set(documents):
+                del self._tables[name]
+
+            self._embed([name for name in self._tables if self._tables[name]["embedding"] is None], documents)
+            self._build_matrices()
+            self.fingerprint = fingerprint
+            self.stats["rebuilds"] += 1
+            self.stats["tables_reindexed"] += len(changed)
+            logger.info(f"Schema index updated: {len(changed)} of {len(self._tables)} tables re-indexed")
+
+    def shortlist(self, query, top_n, embedding=None):
+        """The top_n table names most relevant to the query, best first."""
+        with self._lock:
+            if not self._names:
+                return []
+            scores = _normalize(self._bm25_scores(tokenize_identifier(query)))
+            if embedding is not None and self._embeddings is not None:
+                vector = np.asarray(embedding, dtype=np.float32)
+                if vector.shape[0] == self._embeddings.shape[1] and np.linalg.norm(vector) > 0:
+                    similarities = self._embeddings @ (vector / np.linalg.norm(vector))
+                    weight = Config.SCHEMA_INDEX_EMBEDDING_WEIGHT
+                    scores = (1 - weight) * scores + weight * _normalize(similarities)
+            order = np.argsort(-scores, kind="stable")[:top_n]
+            return [self._names[index] for index in order]
+
+    def get_stats(self):
+        return {**self.stats, "tables": len(self._tables), "fingerprint": self.fingerprint,
+                "embeddings": self._embeddings is not None}
+
+    def _embed(self, names, documents):
+        if self.embedding_function is None or not names:
+            return
+        try:
+            vectors = self.embedding_function.embed_documents([documents[name] for name in names])
+        except Exception as e:
+            logger.warning(f"Schema index falling back to BM25 only, embedding failed: {str(e)}")
+            return
+        for name, vector in zip(names, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            self._tables[name]["embedding"] = vector / norm if norm else vector
+        self.stats["tables_embedded"] += len(names)
+
+    def _build_matrices(self):
+        self._names = sorted(self._tables)
+        vocabulary = {}
+        rows, cols, counts = [], [], []
+        for row, name in enumerate(self._names):
+            terms, frequencies = np.unique(self._tables[name]["terms"], return_counts=True)
+            for term, frequency in zip(terms, frequencies):
+                rows.append(row)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(frequency)
+
+        self._vocabulary = vocabulary
+        self._term_frequencies = np.zeros((len(self._names), len(vocabulary)), dtype=np.float32)
+        self._term_frequencies[rows, cols] = counts
+        lengths = np.array([len(self._tables[name]["terms"]) for name in self._names], dtype=np.float32)
+        self._length_norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0)) if len(lengths) else lengths
+        document_frequency = (self._term_frequencies > 0).sum(axis=0)
+        self._idf = np.log(1 + (len(self._names) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        embeddings = [self._tables[name]["embedding"] for name in self._names]
+        if embeddings and all(vector is not None for vector in embeddings) and len({vector.shape for vector in embeddings}) == 1:
+            self._embeddings = np.vstack(embeddings)
+        else:
+            self._embeddings = None
+
+    def _bm25_scores(self, query_terms):
+        columns = [self._vocabulary[term] for term in set(query_terms) if term in self._vocabulary]
+        if not columns:
+            return np.zeros(len(self._names), dtype=np.float32)
+        tf = self._term_frequencies[:, columns]
+        weights = tf * (self.k1 + 1) / (tf + self._length_norm[:, None])
+        return weights @ self._idf[columns]
+
+def _normalize(scores):
+    spread = scores.max() - scores.min() if len(scores) else 0
+    return (scores - scores.min()) / spread if spread > 0 else np.zeros_like(scores, dtype=np.float32)
+
+# Process-wide index for the configured database; the app attaches the embedding function at startup
+schema_index = SchemaIndex()
+
+def shortlist_tables(tables, fingerprint, query, embedding=None):
+    """
+    Restrict the schema sent to the analyzer to the most relevant tables. Small schemas
+    (SCHEMA_INDEX_MIN_TABLES or fewer) are returned unchanged.
+    """
+    if not Config.SCHEMA_INDEX_ENABLED or len(tables) <= Config.SCHEMA_INDEX_MIN_TABLES:
+        return tables
+    schema_index.update(tables, fingerprint)
+    names = schema_index.shortlist(query, Config.SCHEMA_INDEX_TOP_N, embedding)
+    logger.info(f"Schema index shortlisted {len(names)} of {len(tables)} tables: {names}")
+    return {name: tables[name] for name in names if name in tables}
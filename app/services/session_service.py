@@ -1,72 +1,247 @@
-# app/services/session_service.py
-
-from flask import session
-import uuid
-from app.models import db, SessionHistory
-from sqlalchemy import desc
-import logging
-
-logger = logging.getLogger(__name__)
-
-class SessionService:
-    @staticmethod
-    def get_or_create_session():
-        if 'user_id' not in session:
-            session['user_id'] = str(uuid.uuid4())
-        return session['user_id']
-
-    @staticmethod
-    def create_run():
-        return str(uuid.uuid4())
-
-    @staticmethod
-    def get_session_history(session_id, limit=10):
-        if not session_id:
-            logger.warning("get_session_history called without session_id")
-            return []
-        try:
-            return db.session.query(SessionHistory).filter(SessionHistory.session_id == session_id)\
-                .order_by(desc(SessionHistory.timestamp))\
-                .limit(limit)\
-                .all()
-        except Exception as e:
-            logger.error(f"Error in get_session_history: {str(e)}", exc_info=True)
-            return []
-
-    @staticmethod
-    def add_to_session_history(session_id, run_id, query, response):
-        if not session_id:
-            logger.warning("add_to_session_history called without session_id")
-            return
-        try:
-            new_history = SessionHistory(
-                session_id=session_id,
-                run_id=run_id,
-                query=query,
-                response=response
-            )
-            db.session.add(new_history)
-            db.session.commit()
-            logger.info(f"Added new history entry for session {session_id}")
-        except Exception as e:
-            logger.error(f"Error in add_to_session_history: {str(e)}", exc_info=True)
-            db.session.rollback()
-
-    @staticmethod
-    def get_recent_history(session_id, limit=5):
-        if not session_id:
-            logger.warning("get_recent_history called without session_id")
-            return []
-        try:
-            recent_history = SessionService.get_session_history(session_id=session_id, limit=limit)
-            return [
-                {
-                    "query": history.query,
-                    "response": history.response,
-                    "timestamp": history.timestamp.isoformat()
-                }
-                for history in recent_history
-            ]
-        except Exception as e:
-            logger.error(f"Error in get_recent_history: {str(e)}", exc_info=True)
-            return []
\ No newline at end of file
+# app/services/session_service.py
+
+from flask import session
+import uuid
+from app.config import Config
+from app.models import db, SessionHistory
+from app.utils.metrics_utils import HISTORY_QUEUE_DEPTH, HISTORY_WRITES
+from sqlalchemy import desc, insert
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HistoryEntry = namedtuple("HistoryEntry", ["session_id", "run_id", "query", "response", "timestamp"])
+
+class SessionHistoryStore:
+    """
+    Session history behind a write-behind queue and a bounded cache of recent turns.
+    Inserts are committed in groups by a writer thread (batch_size entries, or
+    flush_interval seconds after the first one). Reads of up to cache_turns turns come
+    from a per-session cache, filled from the database plus the not yet committed entries
+    on a miss and appended to on every write, for the cache_sessions most recently used
+    sessions. The cache is per process: with several server processes a session's turns
+    recorded by another process show up once its cache entry is evicted.
+    Writes go to the database of the app bound with init_app.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_pending=None, cache_sessions=None, cache_turns=None,
+                 write_behind=None):
+        self.batch_size = Config.SESSION_HISTORY_BATCH_SIZE if batch_size is None else batch_size
+        self.flush_interval = Config.SESSION_HISTORY_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.max_pending = Config.SESSION_HISTORY_MAX_PENDING if max_pending is None else max_pending
+        self.cache_sessions = Config.SESSION_HISTORY_CACHE_SESSIONS if cache_sessions is None else cache_sessions
+        self.cache_turns = Config.SESSION_HISTORY_CACHE_TURNS if cache_turns is None else cache_turns
+        self.write_behind = Config.SESSION_HISTORY_WRITE_BEHIND if write_behind is None else write_behind
+        self._pending = []
+        self._in_flight = []  # taken from _pending, not committed yet
+        self._recent = OrderedDict()  # session_id -> deque of HistoryEntry, oldest first
+        self._commits = 0
+        self._buffer_changed = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._writer = None
+        self._closed = False
+        self._app = None
+        self.stats = {"written": 0, "failed": 0, "batches": 0, "cache_hits": 0, "cache_misses": 0}
+
+    def init_app(self, app):
+        """Write to the database of `app` from now on; entries queued for a previous app are committed first."""
+        if self._app is not None and self._app is not app:
+            self.flush()
+        self._app = app
+
+    def add(self, session_id, run_id, query, response):
+        if self._app is None:
+            raise RuntimeError("SessionHistoryStore is not bound to an app, call init_app() first")
+        entry = HistoryEntry(session_id, run_id, query, response, datetime.utcnow())
+        with self._buffer_changed:
+            recent = self._recent.get(session_id)
+            if recent is not None:
+                recent.append(entry)
+            if not self.write_behind or self._closed:
+                self._in_flight.append(entry)
+            else:
+                # Back-pressure when the writer falls behind
+                while len(self._pending) >= self.max_pending and not self._closed:
+                    self._buffer_changed.wait()
+                self._pending.append(entry)
+                HISTORY_QUEUE_DEPTH.set(len(self._pending))
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._flush_loop, name="session-history-writer", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.close)
+                self._buffer_changed.notify_all()
+                return
+        self._write([entry])
+
+    def recent(self, session_id, limit=10):
+        """The session's latest limit entries, newest first."""
+        cacheable = 0 < limit <= self.cache_turns and self.cache_sessions > 0
+        if cacheable:
+            with self._buffer_changed:
+                recent = self._recent.get(session_id)
+                if recent is not None:
+                    self._recent.move_to_end(session_id)
+                    self.stats["cache_hits"] += 1
+                    return list(reversed(recent))[:limit]
+        self.stats["cache_misses"] += 1
+        return self._load(session_id, max(limit, self.cache_turns) if cacheable else limit, cacheable)[:limit]
+
+    def flush(self):
+        """Commit all queued entries now; returns how many were written."""
+        with self._flush_lock:
+            with self._buffer_changed:
+                entries, self._pending = self._pending, []
+                self._in_flight.extend(entries)
+                HISTORY_QUEUE_DEPTH.set(0)
+                self._buffer_changed.notify_all()
+            if not entries:
+                return 0
+            return self._write(entries)
+
+    def close(self):
+        """Commit pending entries and stop the writer thread (also run at interpreter exit)."""
+        with self._buffer_changed:
+            self._closed = True
+            self._buffer_changed.notify_all()
+        if self._writer is not None and self._writer is not threading.current_thread():
+            self._writer.join()
+        self.flush()
+
+    def clear_cache(self):
+        with self._buffer_changed:
+            self._recent.clear()
+
+    def get_stats(self):
+        with self._buffer_changed:
+            pending, cached = len(self._pending), len(self._recent)
+        return {**self.stats, "pending": pending, "cached_sessions": cached, "batch_size": self.batch_size,
+                "flush_interval": self.flush_interval, "write_behind": self.write_behind}
+
+    def _flush_loop(self):
+        while True:
+            with self._buffer_changed:
+                while not self._pending and not self._closed:
+                    self._buffer_changed.wait()
+                if not self._pending:
+                    return
+                # Wait for a full batch, at most flush_interval after the first pending entry
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._buffer_changed.wait(remaining)
+            self.flush()
+
+    def _write(self, entries):
+        """Insert the entries in one statement and one commit."""
+        written = 0
+        try:
+            with self._app.app_context():
+                try:
+                    db.session.execute(insert(SessionHistory), [entry._asdict() for entry in entries])
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+            written = len(entries)
+            HISTORY_WRITES.inc(written, status="ok")
+            self.stats["written"] += written
+            self.stats["batches"] += 1
+            logger.info(f"Added {written} session history entries")
+        except Exception as e:
+            logger.error(f"Error writing {len(entries)} session history entries: {str(e)}", exc_info=True)
+            HISTORY_WRITES.inc(len(entries), status="error")
+            self.stats["failed"] += len(entries)
+            # The cache must not keep serving turns that never reached the table
+            with self._buffer_changed:
+                for session_id in {entry.session_id for entry in entries}:
+                    self._recent.pop(session_id, None)
+        finally:
+            with self._buffer_changed:
+                written_ids = {id(entry) for entry in entries}
+                self._in_flight = [entry for entry in self._in_flight if id(entry) not in written_ids]
+                self._commits += 1
+        return written
+
+    def _load(self, session_id, limit, cache):
+        with self._buffer_changed:
+            commits = self._commits
+        rows = db.session.query(SessionHistory).filter(SessionHistory.session_id == session_id)\
+            .order_by(desc(SessionHistory.timestamp))\
+            .limit(limit)\
+            .all()
+        stored = [HistoryEntry(row.session_id, row.run_id, row.query, row.response, row.timestamp) for row in rows]
+        with self._buffer_changed:
+            # Entries still queued (or being committed) are not in the table yet
+            queued = [entry for entry in self._in_flight + self._pending if entry.session_id == session_id]
+            entries = sorted(dict.fromkeys(stored + queued), key=lambda entry: entry.timestamp, reverse=True)[:limit]
+            # A commit that landed during the query may be missing from both lists, so only cache a consistent view
+            if cache and commits == self._commits and session_id not in self._recent:
+                self._recent[session_id] = deque(reversed(entries[:self.cache_turns]), maxlen=self.cache_turns)
+                while len(self._recent) > self.cache_sessions:
+                    self._recent.popitem(last=False)
+        return entries
+
+session_history = SessionHistoryStore()
+
+def create_history_indexes():
+    """Add the SessionHistory indexes to a table created before they were declared."""
+    for index in SessionHistory.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+class SessionService:
+    @staticmethod
+    def get_or_create_session():
+        if 'user_id' not in session:
+            session['user_id'] = str(uuid.uuid4())
+        return session['user_id']
+
+    @staticmethod
+    def create_run():
+        return str(uuid.uuid4())
+
+    @staticmethod
+    def get_session_history(session_id, limit=10):
+        if not session_id:
+            logger.warning("get_session_history called without session_id")
+            return []
+        try:
+            return session_history.recent(session_id, limit)
+        except Exception as e:
+            logger.error(f"Error in get_session_history: {str(e)}", exc_info=True)
+            return []
+
+    @staticmethod
+    def add_to_session_history(session_id, run_id, query, response):
+        if not session_id:
+            logger.warning("add_to_session_history called without session_id")
+            return
+        try:
+            session_history.add(session_id, run_id, query, response)
+        except Exception as e:
+            logger.error(f"Error in add_to_session_history: {str(e)}", exc_info=True)
+
+    @staticmethod
+    def get_recent_history(session_id, limit=5):
+        if not session_id:
+            logger.warning("get_recent_history called without session_id")
+            return []
+        try:
+            recent_history = SessionService.get_session_history(session_id=session_id, limit=limit)
+            return [
+                {
+                    "query": history.query,
+                    "response": history.response,
+                    "timestamp": history.timestamp.isoformat()
+                }
+                for history in recent_history
+            ]
+        except Exception as e:
+            logger.error(f"Error in get_recent_history: {str(e)}", exc_info=True)
+            return []
@@ -1,49 +1,230 @@
-# app/services/sql_executor_service.py
-
-from sqlalchemy import create_engine, text
-from app.config import Config
-from app.models import SQLExecutionResult, SQLCorrectionResult
-import pandas as pd
-from app.models import AgentState
-
-
-
-def execute_sql(state: AgentState) -> AgentState:
-    print ("============= Executing SQL Code ==============")
-    engine = create_engine(Config.DATABASE_URL)
-    try:
-        with engine.connect() as connection:
-            result = connection.execute(text(state["generated_sql"].sql_query))
-            df = pd.DataFrame(result.fetchall(), columns=result.keys())
-        state["execution_result"] = SQLExecutionResult(success=True, data=df.to_dict(orient='records'))
-    except Exception as e:
-        state["execution_result"] = SQLExecutionResult(success=False, error_message=str(e))
-    return state
-
-
-
-def execute_sql_reflection(state: AgentState) -> AgentState:
-    print ("============= [Reflection] Executing SQL Code ==============")
-    engine = create_engine(Config.DATABASE_URL)
-    try:
-        with engine.connect() as connection:
-            result = connection.execute(text(state["reflected_generated_sql"].reflected_sql_query))
-            df = pd.DataFrame(result.fetchall(), columns=result.keys())
-        state["execution_result"] = SQLExecutionResult(success=True, data=df.to_dict(orient='records'))
-    except Exception as e:
-        state["execution_result"] = SQLExecutionResult(success=False, error_message=str(e))
-    return state
-
-
-
-def execute_sql_corrected(state: AgentState) -> AgentState:
-    print ("============= [Correction] Executing SQL Code ==============")
-    engine = create_engine(Config.DATABASE_URL)
-    try:
-        with engine.connect() as connection:
-            result = connection.execute(text(state["sql_correction"].corrected_sql_query))
-            df = pd.DataFrame(result.fetchall(), columns=result.keys())
-        state["execution_result"] = SQLExecutionResult(success=True, data=df.to_dict(orient='records'))
-    except Exception as e:
-        state["execution_result"] = SQLExecutionResult(success=False, error_message=str(e))
-    return state
\ No newline at end of file
+# app/services/sql_executor_service.py
+
+import hashlib
+import sys
+import threading
+import time
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from sqlalchemy import text
+from app.config import Config
+from app.models import SQLExecutionResult, SQLCorrectionResult, ColumnarResult
+from app.models import AgentState
+from app.utils.db_utils import get_engine
+from app.utils.sql_utils import normalize_sql
+from app.utils.metrics_utils import record_sql_time
+from app.utils.trace_utils import span
+from app.services.database_service import DatabaseService
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    LRU cache of successful query results bounded by an estimated byte budget.
+    Keys combine the database URL, a fingerprint of the normalized SQL and the
+    database data version, so any data change makes old entries unreachable.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = Config.RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._entries = OrderedDict()  # key -> (SQLExecutionResult, size_in_bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "too_large": 0}
+
+    @staticmethod
+    def make_key(sql_query, database_url=None):
+        """Return the cache key, or None when the data version is unknown (never cache)."""
+        database_url = database_url or Config.DATABASE_URL
+        data_version = DatabaseService.get_data_version(database_url)
+        if data_version is None:
+            return None
+        fingerprint = hashlib.sha1(normalize_sql(sql_query).encode("utf-8")).hexdigest()
+        return (database_url, fingerprint, data_version)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, execution_result):
+        size = execution_result.data.nbytes if execution_result.data is not None else 0
+        with self._lock:
+            if size > self.max_bytes:
+                self.stats["too_large"] += 1
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (execution_result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0
+            }
+
+def estimate_row_size(values):
+    """Approximate in-memory size of one row's values."""
+    return sum(sys.getsizeof(value) for value in values)
+
+result_cache = ResultCache()
+
+def run_sql(sql_query: str) -> SQLExecutionResult:
+    with span("sql", "sql", sql=sql_query[:1000]) as attributes:
+        execution_result, cached = _run_sql(sql_query)
+        if attributes is not None:
+            attributes.update(cached=cached, success=execution_result.success, rows=execution_result.row_count,
+                              truncated=execution_result.truncated)
+        return execution_result
+
+def _run_sql(sql_query):
+    cache_key = ResultCache.make_key(sql_query) if Config.RESULT_CACHE_ENABLED else None
+    if cache_key is not None:
+        execution_result = result_cache.get(cache_key)
+        if execution_result is not None:
+            logger.info("Serving SQL result from the result cache")
+            return execution_result, True
+
+    engine = get_engine()
+    start_time = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            execution_result = fetch_capped(connection, sql_query)
+    except Exception as e:
+        return SQLExecutionResult(success=False, error_message=str(e)), False
+    finally:
+        record_sql_time(time.perf_counter() - start_time)
+
+    if cache_key is not None:
+        result_cache.put(cache_key, execution_result)
+    return execution_result, False
+
+def fetch_capped(connection, sql_query: str) -> SQLExecutionResult:
+    """
+    Stream the result in fetchmany batches and stop reading as soon as the row cap
+    (SQL_MAX_ROWS) or byte cap (SQL_MAX_RESULT_BYTES) is reached, so peak memory stays
+    bounded however many rows the query would return.
+    """
+    result = connection.execution_options(stream_results=True, max_row_buffer=Config.SQL_FETCH_SIZE)\
+        .execute(text(sql_query))
+    columns = list(result.keys())
+    # Values are appended straight into per-column lists, then packed into typed arrays once
+    column_values = [[] for _ in columns]
+    row_count = 0
+    size = 0
+    truncated = False
+
+    try:
+        while not truncated:
+            batch = result.fetchmany(Config.SQL_FETCH_SIZE)
+            if not batch:
+                break
+            for values in batch:
+                if row_count >= Config.SQL_MAX_ROWS:
+                    truncated = True
+                    break
+                row_size = estimate_row_size(values)
+                if row_count and size + row_size > Config.SQL_MAX_RESULT_BYTES:
+                    truncated = True
+                    break
+                for column_list, value in zip(column_values, values):
+                    column_list.append(value)
+                row_count += 1
+                size += row_size
+    finally:
+        result.close()
+
+    total_row_count = row_count
+    if truncated:
+        total_row_count = count_rows(connection, sql_query)
+        logger.warning(f"SQL result truncated to {row_count} rows (total: {total_row_count})")
+
+    return SQLExecutionResult(
+        success=True,
+        data=ColumnarResult.from_columns(columns, column_values),
+        truncated=truncated,
+        row_count=row_count,
+        total_row_count=total_row_count
+    )
+
+def count_rows(connection, sql_query: str):
+    """
+    Total row count of a truncated result, or None when counting is disabled (the default),
+    fails or takes longer than SQL_COUNT_TIMEOUT seconds.
+    """
+    if not Config.SQL_COUNT_TRUNCATED_ROWS:
+        return None
+    try:
+        count_query = f"SELECT COUNT(*) FROM ({sql_query.strip().rstrip(';')}) AS capped_result"
+        with time_limit(connection, Config.SQL_COUNT_TIMEOUT):
+            return connection.execute(text(count_query)).scalar()
+    except Exception as e:
+        logger.warning(f"Could not count rows of truncated result: {str(e)}")
+        return None
+
+@contextmanager
+def time_limit(connection, seconds):
+    """
+    Interrupt statements that run longer than `seconds` on this connection. Implemented for
+    SQLite with a progress handler; other dialects rely on their server-side statement timeout.
+    """
+    if connection.dialect.name != "sqlite" or not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    driver_connection = connection.connection.driver_connection
+    # A non-zero return aborts the statement with "interrupted"
+    driver_connection.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+    try:
+        yield
+    finally:
+        driver_connection.set_progress_handler(None, 10000)
+
+
+def execute_into_state(state: AgentState, get_sql_query) -> AgentState:
+    try:
+        sql_query = get_sql_query(state)
+    except Exception as e:
+        state["execution_result"] = SQLExecutionResult(success=False, error_message=str(e))
+        return state
+    state["execution_result"] = run_sql(sql_query)
+    return state
+
+
+
+def execute_sql(state: AgentState) -> AgentState:
+    print ("============= Executing SQL Code ==============")
+    return execute_into_state(state, lambda s: s["generated_sql"].sql_query)
+
+
+
+def execute_sql_reflection(state: AgentState) -> AgentState:
+    print ("============= [Reflection] Executing SQL Code ==============")
+    return execute_into_state(state, lambda s: s["reflected_generated_sql"].reflected_sql_query)
+
+
+
+def execute_sql_corrected(state: AgentState) -> AgentState:
+    print ("============= [Correction] Executing SQL Code ==============")
+    return execute_into_state(state, lambda s: s["sql_correction"].corrected_sql_query)
@@ -1,44 +1,52 @@
-# app/services/summarizer_service.py
-
-from langchain.prompts import ChatPromptTemplate
-from app.models import AgentState
-import json
-from app.utils.llm_utils import get_llm
-
-def summarizer_node(state: AgentState) -> AgentState:
-    print("=================== Summarization =====================")
-    if not state["analyzed_query"].is_query_relevant:
-        state['summary'] = f"I'm sorry, but your query '{state['user_query']}' is not relevant to the available database information. {state['analyzed_query'].explanation}"
-        return state
-
-    #llm = ChatOpenAI(model_name=Config.LLM_MODEL, temperature=Config.LLM_TEMPERATURE)
-    llm = get_llm("openai","gpt-3.5-turbo") # gpt-3.5-turbo, GPT-4o-mini
-    # llm = get_llm("groq", "gemma2-9b-it") # llama-3.1-70b-versatile, llama3-groq-70b-8192-tool-use-preview, gemma2-9b-it, mixtral-8x7b-32768, llama-3.1-8b-instant
-
-    prompt = ChatPromptTemplate.from_template("""
-        Given the following information:
-        1. Original user query: {user_query}
-        2. Analyzed query: {analyzed_query}
-        3. SQL query executed: {sql_query}
-        4. Query execution result: {execution_result}
-        5. Result evaluation: {evaluation_result}
-
-        Please provide an insightful answer to the user's original query. 
-        Your response should be clear, concise, and directly address the user's question 
-        while incorporating the relevant information from the query results.
-
-        Answer:
-    """)
-
-    chain = prompt | llm | (lambda x: x.content)
-
-    response = chain.invoke({
-        "user_query": state['user_query'],
-        "analyzed_query": state['analyzed_query'].analyzed_query,
-        "sql_query": state['generated_sql'].sql_query if state['generated_sql'] else "",
-        "execution_result": json.dumps(state['execution_result'].data) if state['execution_result'] else "",
-        "evaluation_result": state['evaluation_result'].explanation if state['evaluation_result'] else ""
-    })
-
-    state['summary'] = response
-    return state
\ No newline at end of file
+# app/services/summarizer_service.py
+
+import asyncio
+import logging
+from langchain.prompts import ChatPromptTemplate
+from app.models import AgentState
+from app.utils.llm_utils import get_chain, count_tokens, llm_node, ainvoke_llm
+from app.utils.digest_utils import build_result_digest
+from app.services.result_profiler_service import get_result_profile
+
+logger = logging.getLogger(__name__)
+
+SUMMARIZER_PROMPT = ChatPromptTemplate.from_template("""
+        Given the following information:
+        1. Original user query: {user_query}
+        2. Analyzed query: {analyzed_query}
+        3. SQL query executed: {sql_query}
+        4. Query execution result (row counts, column statistics and representative rows): {execution_result}
+        5. Result evaluation: {evaluation_result}
+
+        Please provide an insightful answer to the user's original query. 
+        Your response should be clear, concise, and directly address the user's question 
+        while incorporating the relevant information from the query results.
+
+        Answer:
+    """)
+
+@llm_node
+async def summarizer_node(state: AgentState) -> dict:
+    # Runs in parallel with the visualizer, so it only returns the keys it writes
+    print("=================== Summarization =====================")
+    if not state["analyzed_query"].is_query_relevant:
+        return {"summary": f"I'm sorry, but your query '{state['user_query']}' is not relevant to the available database information. {state['analyzed_query'].explanation}"}
+
+    #llm = ChatOpenAI(model_name=Config.LLM_MODEL, temperature=Config.LLM_TEMPERATURE)
+    # llm = get_llm("groq", "gemma2-9b-it") # llama-3.1-70b-versatile, llama3-groq-70b-8192-tool-use-preview, gemma2-9b-it, mixtral-8x7b-32768, llama-3.1-8b-instant
+
+    chain = get_chain(SUMMARIZER_PROMPT, "openai", "gpt-3.5-turbo") # gpt-3.5-turbo, GPT-4o-mini
+
+    inputs = {
+        "user_query": state['user_query'],
+        "analyzed_query": state['analyzed_query'].analyzed_query,
+        "sql_query": state['generated_sql'].sql_query if state['generated_sql'] else "",
+        "execution_result": await asyncio.to_thread(lambda: build_result_digest(state['execution_result'], get_result_profile(state))) if state['execution_result'] and state['execution_result'].data is not None else "",
+        "evaluation_result": state['evaluation_result'].explanation if state['evaluation_result'] else ""
+    }
+    logger.info(f"Summarizer prompt: {count_tokens(SUMMARIZER_PROMPT.format(**inputs))} tokens "
+                f"({count_tokens(inputs['execution_result'])} for the result digest)")
+
+    response = await ainvoke_llm(chain, inputs)
+
+    return {"summary": response.content}
\ No newline at end of file
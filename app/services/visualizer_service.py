@@ -1,159 +1,356 @@
-# app/services/visualizer_service.py
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from io import BytesIO
-import base64
-from app.models import Visualization, AgentState
-from app.utils.llm_utils import get_llm
-from langchain.prompts import ChatPromptTemplate
-import json
-import logging
-from matplotlib.dates import DateFormatter
-import matplotlib.dates as mdates
-
-logger = logging.getLogger(__name__)
-
-def visualization_check(state: AgentState) -> AgentState:
-    print("=================== Visualization Checkpoint =====================")
-    return state
-
-def create_visualization(data, query, visualization_type, x_column, y_column=None, title=None, palette='viridis', style='darkgrid'):
-    df = pd.DataFrame(data)
-    sns.set_style(style)
-    sns.set_palette(palette)
-    plt.figure(figsize=(12, 7))
-
-    # Check if x_column is a datetime
-    is_time_series = pd.api.types.is_datetime64_any_dtype(df[x_column])
-    if is_time_series:
-        df[x_column] = pd.to_datetime(df[x_column])
-
-    # Check if y_column is provided and valid
-    y_column_provided = y_column and y_column.strip() and y_column in df.columns
-    
-    if not y_column_provided:
-        y_column = x_column
-        x_column = df.index.name if df.index.name else 'Index'
-
-    if visualization_type == "bar":
-        ax = sns.barplot(data=df, x=x_column, y=y_column)
-        plt.xticks(rotation=45, ha='right')
-    elif visualization_type == "line":
-        ax = sns.lineplot(data=df, x=x_column, y=y_column, marker='o')
-        plt.plot(df[x_column], df[y_column], alpha=0)  # This creates anchor points for the spline
-        if is_time_series:
-            plt.gcf().autofmt_xdate()
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
-            ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-    elif visualization_type == "scatter":
-        ax = sns.scatterplot(data=df, x=x_column, y=y_column)
-    elif visualization_type == "pie":
-        plt.pie(df[y_column], labels=df[x_column], autopct='%1.1f%%', startangle=90, wedgeprops=dict(width=0.5))
-        plt.axis('equal')
-    elif visualization_type == "histogram":
-        ax = sns.histplot(data=df, x=x_column, y=y_column, kde=True)
-    elif visualization_type == "box":
-        ax = sns.boxplot(data=df, x=x_column, y=y_column)
-        plt.xticks(rotation=45, ha='right')
-    elif visualization_type == "heatmap":
-        ax = sns.heatmap(df.pivot(x_column, y_column, values=df.columns[-1]), annot=True, cmap='YlGnBu')
-    else:
-        raise ValueError(f"Unsupported visualization type: {visualization_type}")
-
-    plt.title(title or f"Visualization for: {query}", fontsize=16, fontweight='bold', pad=20)
-    plt.tight_layout()
-
-    # Add some styling to make the plot more visually appealing
-    if visualization_type != "pie":
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['bottom'].set_linewidth(0.5)
-        ax.spines['left'].set_linewidth(0.5)
-        
-    for spine in plt.gca().spines.values():
-        spine.set_edgecolor('#888888')
-
-    plt.grid(True, linestyle='--', alpha=0.7)
-    
-    # Make the plot area have rounded corners
-    plt.gca().patch.set_facecolor('#F0F0F0')
-    plt.gcf().patch.set_facecolor('white')
-    plt.gca().patch.set_alpha(0.3)
-    
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight', facecolor='white', edgecolor='none')
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    plt.close()
-
-    if y_column_provided:
-        description = f"{visualization_type.capitalize()} chart visualization of {x_column} vs {y_column} for the query: {query}"
-    else:
-        description = f"{visualization_type.capitalize()} chart visualization of {x_column} for the query: {query}"
-    
-    return Visualization(image=image_base64, description=description)
-
-def select_visualization(state: AgentState) -> dict:
-    llm = get_llm("openai","gpt-3.5-turbo")
-    
-    prompt = ChatPromptTemplate.from_template("""
-    Given the following information:
-    1. Original user query: {user_query}
-    2. Analyzed query: {analyzed_query}
-    3. SQL query executed: {sql_query}
-    4. Query execution result (first 5 rows): {sample_data}
-    5. Data columns and types: {data_types}
-
-    You are an expert data analyst. Select the most appropriate visualization type and parameters to best represent the data and answer the user's query.
-    Consider the data types, the number of data points, and the nature of the question being asked.
-    If there's a date or time column, consider using it for the x-axis in a time series visualization.
-
-    Respond in the following JSON format:
-    {{
-        "visualization_type": "bar|line|scatter|pie|histogram|box|heatmap",
-        "x_column": "name of the column for x-axis",
-        "y_column": "name of the column for y-axis (if applicable)",
-        "title": "A descriptive title for the visualization",
-        "explanation": "A brief explanation of why this visualization was chosen"
-    }}
-    """)
-
-    df = pd.DataFrame(state["execution_result"].data)
-    sample_data = df.head().to_dict()
-    data_types = df.dtypes.to_dict()
-
-    chain = prompt | llm
-
-    try:
-        response = chain.invoke({
-            "user_query": state["user_query"],
-            "analyzed_query": state["analyzed_query"].analyzed_query,
-            "sql_query": state["generated_sql"].sql_query,
-            "sample_data": json.dumps(sample_data),
-            "data_types": str(data_types)
-        })
-        
-        visualization_params = json.loads(response.content)
-        logger.info(f"Selected visualization: {visualization_params}")
-        return visualization_params
-    except Exception as e:
-        logger.error(f"Error in visualization selection: {str(e)}")
-        return {"visualization_type": "bar", "x_column": df.columns[0], "y_column": df.columns[1] if len(df.columns) > 1 else None}
-
-def data_visualizer(state: AgentState) -> AgentState:
-    print("=================== Data Visualization =====================")
-    if not state["execution_result"].success or not state["evaluation_result"].requires_visualization:
-        state["visualization"] = None
-    else:
-        visualization_params = select_visualization(state)
-        state["visualization"] = create_visualization(
-            state["execution_result"].data,
-            state["analyzed_query"].original_query,
-            visualization_params["visualization_type"],
-            visualization_params["x_column"],
-            visualization_params.get("y_column"),
-            visualization_params.get("title")
-        )
-        state["visualization_explanation"] = visualization_params.get("explanation", "")
-    return state
+# app/services/visualizer_service.py
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+from io import BytesIO
+import base64
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from app.config import Config
+from app.services.chart_renderer_service import render_in_pool
+from app.models import Visualization, AgentState, ColumnarResult
+from app.utils.llm_utils import get_chain, llm_node, ainvoke_llm
+from app.services.result_profiler_service import get_result_profile
+from app.utils.downsample_utils import reduce_for_chart, describe_reduction
+from langchain.prompts import ChatPromptTemplate
+import json
+import logging
+from matplotlib.dates import DateFormatter
+import matplotlib.dates as mdates
+
+logger = logging.getLogger(__name__)
+
+RASTER_FORMATS = ("png", "jpeg", "svg")
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+
+class ChartCache:
+    """
+    LRU cache of rendered charts bounded by payload bytes. Keys hash the result data
+    together with every chart parameter, so a repeated answer reuses its chart.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = Config.CHART_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._entries = OrderedDict()  # key -> (Visualization, size_in_bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(data, *params):
+        if isinstance(data, ColumnarResult):
+            data_hash = data.fingerprint()
+        else:
+            data_hash = hashlib.sha1(json.dumps(data, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+        return hashlib.sha1(json.dumps([data_hash, *params], default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, visualization):
+        size = len(visualization.image or "") + (len(json.dumps(visualization.spec, default=str)) if visualization.spec else 0)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (visualization, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+chart_cache = ChartCache()
+
+def visualization_check(state: AgentState) -> AgentState:
+    print("=================== Visualization Checkpoint =====================")
+    return state
+
+def create_visualization(data, query, visualization_type, x_column, y_column=None, title=None, palette='viridis', style='darkgrid',
+                         output_format=None, dpi=None):
+    """The chart, or None when rendering failed or timed out."""
+    return submit_visualization(data, query, visualization_type, x_column, y_column, title, palette, style,
+                                output_format, dpi).result()
+
+def submit_visualization(data, query, visualization_type, x_column, y_column=None, title=None, palette='viridis',
+                         style='darkgrid', output_format=None, dpi=None):
+    """
+    Start the chart in the configured output format (CHART_FORMAT / CHART_DPI) and return a
+    Future of it. Raster charts render in the chart renderer's worker processes; cached charts
+    and Vega-Lite specs resolve immediately. The Future resolves to None if rendering fails.
+    """
+    output_format = output_format or Config.CHART_FORMAT
+    dpi = dpi or Config.CHART_DPI
+    if output_format != "vega-lite" and output_format not in RASTER_FORMATS:
+        raise ValueError(f"Unsupported chart format: {output_format}")
+
+    future = Future()
+    key = None
+    if Config.CHART_CACHE_ENABLED:
+        key = ChartCache.make_key(data, query, visualization_type, x_column, y_column, title, palette, style, output_format, dpi)
+        visualization = chart_cache.get(key)
+        if visualization is not None:
+            future.set_result(visualization)
+            return future
+
+    if output_format == "vega-lite":
+        try:
+            future.set_result(build_chart_spec(data, query, visualization_type, x_column, y_column, title))
+        except Exception as e:
+            logger.error(f"Error building chart spec: {str(e)}")
+            future.set_result(None)
+    else:
+        future = render_in_pool(data, query, visualization_type, x_column, y_column, title, palette, style, output_format, dpi)
+
+    if key is not None:
+        future.add_done_callback(lambda done: _cache_chart(key, done))
+    return future
+
+def _cache_chart(key, future):
+    if future.result() is not None:
+        chart_cache.put(key, future.result())
+
+def render_chart(data, query, visualization_type, x_column, y_column=None, title=None, palette='viridis', style='darkgrid',
+                 image_format='png', dpi=300):
+    df = data.to_frame() if isinstance(data, ColumnarResult) else pd.DataFrame(data)
+    df, reduction = reduce_for_chart(df, visualization_type, x_column, y_column)
+    weights = reduction.get("weights") if reduction else None
+    binned_column = x_column
+    sns.set_style(style)
+    sns.set_palette(palette)
+    plt.figure(figsize=(12, 7))
+
+    # Check if x_column is a datetime
+    is_time_series = pd.api.types.is_datetime64_any_dtype(df[x_column])
+    if is_time_series:
+        df[x_column] = pd.to_datetime(df[x_column])
+
+    # Check if y_column is provided and valid
+    y_column_provided = y_column and y_column.strip() and y_column in df.columns
+    
+    if not y_column_provided:
+        y_column = x_column
+        x_column = df.index.name if df.index.name else 'Index'
+
+    if visualization_type == "bar":
+        ax = sns.barplot(data=df, x=x_column, y=y_column)
+        plt.xticks(rotation=45, ha='right')
+    elif visualization_type == "line":
+        ax = sns.lineplot(data=df, x=x_column, y=y_column, marker='o')
+        plt.plot(df[x_column], df[y_column], alpha=0)  # This creates anchor points for the spline
+        if is_time_series:
+            plt.gcf().autofmt_xdate()
+            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
+            ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    elif visualization_type == "scatter":
+        ax = sns.scatterplot(data=df, x=x_column, y=y_column, size=weights)
+    elif visualization_type == "pie":
+        plt.pie(df[y_column], labels=df[x_column], autopct='%1.1f%%', startangle=90, wedgeprops=dict(width=0.5))
+        plt.axis('equal')
+    elif visualization_type == "histogram" and weights:
+        # Counts were binned up front; draw the bars from them
+        ax = plt.gca()
+        ax.bar(df[binned_column], df[weights], width=df[f"{binned_column}_end"] - df[binned_column], align='edge',
+               edgecolor='white')
+    elif visualization_type == "histogram":
+        ax = sns.histplot(data=df, x=x_column, y=y_column, kde=True)
+    elif visualization_type == "box":
+        ax = sns.boxplot(data=df, x=x_column, y=y_column)
+        plt.xticks(rotation=45, ha='right')
+    elif visualization_type == "heatmap":
+        grid = df.pivot_table(index=x_column, columns=y_column, values=df.columns[-1], aggfunc="mean")
+        ax = sns.heatmap(grid, annot=grid.size <= 400, cmap='YlGnBu')
+    else:
+        raise ValueError(f"Unsupported visualization type: {visualization_type}")
+
+    plt.title(title or f"Visualization for: {query}", fontsize=16, fontweight='bold', pad=20)
+    plt.tight_layout()
+
+    # Add some styling to make the plot more visually appealing
+    if visualization_type != "pie":
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['bottom'].set_linewidth(0.5)
+        ax.spines['left'].set_linewidth(0.5)
+        
+    for spine in plt.gca().spines.values():
+        spine.set_edgecolor('#888888')
+
+    plt.grid(True, linestyle='--', alpha=0.7)
+    
+    # Make the plot area have rounded corners
+    plt.gca().patch.set_facecolor('#F0F0F0')
+    plt.gcf().patch.set_facecolor('white')
+    plt.gca().patch.set_alpha(0.3)
+    
+    buffer = BytesIO()
+    plt.savefig(buffer, format=image_format, dpi=dpi, bbox_inches='tight', facecolor='white', edgecolor='none')
+    buffer.seek(0)
+    image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    plt.close()
+
+    description = chart_description(visualization_type, x_column, y_column if y_column_provided else None, query)
+    description += describe_reduction(reduction)
+    return Visualization(image=image_base64, format=image_format, description=description)
+
+def chart_description(visualization_type, x_column, y_column, query):
+    if y_column:
+        return f"{visualization_type.capitalize()} chart visualization of {x_column} vs {y_column} for the query: {query}"
+    return f"{visualization_type.capitalize()} chart visualization of {x_column} for the query: {query}"
+
+def build_chart_spec(data, query, visualization_type, x_column, y_column=None, title=None):
+    """Vega-Lite specification of the chart, with the plotted columns inlined as data values."""
+    df = data.to_frame() if isinstance(data, ColumnarResult) else pd.DataFrame(data)
+    df, reduction = reduce_for_chart(df, visualization_type, x_column, y_column)
+    weights = reduction.get("weights") if reduction else None
+    binned_column = x_column
+    y_column_provided = bool(y_column and y_column.strip() and y_column in df.columns)
+    if not y_column_provided:
+        df = df.rename_axis('Index').reset_index()
+        x_column, y_column = 'Index', x_column
+
+    x = {"field": x_column, "type": _vega_type(df[x_column])}
+    y = {"field": y_column, "type": _vega_type(df[y_column])}
+    fields = [x_column, y_column]
+
+    if visualization_type in ("bar", "line", "scatter"):
+        mark = {"bar": {"type": "bar"}, "line": {"type": "line", "point": True}, "scatter": {"type": "point"}}[visualization_type]
+        if visualization_type == "bar":
+            x["sort"] = None  # keep the query's ORDER BY
+        encoding = {"x": x, "y": y, "tooltip": [x, y]}
+        if weights:
+            size = {"field": weights, "type": "quantitative", "title": "rows"}
+            encoding.update(size=size, tooltip=[x, y, size])
+            fields.append(weights)
+    elif visualization_type == "pie":
+        mark = {"type": "arc", "innerRadius": 50}
+        encoding = {"theta": {"field": y_column, "type": "quantitative"}, "color": {"field": x_column, "type": "nominal"},
+                    "tooltip": [x, y]}
+    elif visualization_type == "histogram" and weights:
+        mark = {"type": "bar"}
+        encoding = {"x": {"field": binned_column, "type": _vega_type(df[binned_column]), "bin": {"binned": True}},
+                    "x2": {"field": f"{binned_column}_end"},
+                    "y": {"field": weights, "type": "quantitative", "title": "count"}}
+        fields = [binned_column, f"{binned_column}_end", weights]
+    elif visualization_type == "histogram":
+        value_column = x_column if y_column_provided else y_column
+        mark = {"type": "bar"}
+        encoding = {"x": {"field": value_column, "type": "quantitative", "bin": True}, "y": {"aggregate": "count"}}
+        fields = [value_column]
+    elif visualization_type == "box":
+        mark = {"type": "boxplot"}
+        encoding = {"x": {**x, "type": "nominal"}, "y": {**y, "type": "quantitative"}}
+    elif visualization_type == "heatmap":
+        value_column = df.columns[-1]
+        mark = {"type": "rect"}
+        encoding = {"x": {**x, "type": "nominal"}, "y": {**y, "type": "nominal"},
+                    "color": {"field": value_column, "type": "quantitative"}}
+        fields.append(value_column)
+    else:
+        raise ValueError(f"Unsupported visualization type: {visualization_type}")
+
+    spec = {
+        "$schema": VEGA_LITE_SCHEMA,
+        "title": title or f"Visualization for: {query}",
+        "width": "container",
+        "height": 400,
+        "data": {"values": json.loads(df[list(dict.fromkeys(fields))].to_json(orient="records", date_format="iso"))},
+        "mark": mark,
+        "encoding": encoding
+    }
+    description = chart_description(visualization_type, x_column, y_column if y_column_provided else None, query)
+    description += describe_reduction(reduction)
+    return Visualization(spec=spec, format="vega-lite", description=description)
+
+def _vega_type(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "temporal"
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return "quantitative"
+    return "nominal"
+
+VISUALIZATION_SELECTION_PROMPT = ChatPromptTemplate.from_template("""
+    Given the following information:
+    1. Original user query: {user_query}
+    2. Analyzed query: {analyzed_query}
+    3. SQL query executed: {sql_query}
+    4. Query execution result (first rows): {sample_data}
+    5. Data columns and types: {data_types}
+
+    You are an expert data analyst. Select the most appropriate visualization type and parameters to best represent the data and answer the user's query.
+    Consider the data types, the number of data points, and the nature of the question being asked.
+    If there's a date or time column, consider using it for the x-axis in a time series visualization.
+
+    Respond in the following JSON format:
+    {{
+        "visualization_type": "bar|line|scatter|pie|histogram|box|heatmap",
+        "x_column": "name of the column for x-axis",
+        "y_column": "name of the column for y-axis (if applicable)",
+        "title": "A descriptive title for the visualization",
+        "explanation": "A brief explanation of why this visualization was chosen"
+    }}
+    """)
+
+async def select_visualization(state: AgentState) -> dict:
+    profile = await asyncio.to_thread(get_result_profile, state)
+    columns = [column.name for column in profile.columns]
+    sample_data = profile.head
+    data_types = {column.name: column.dtype for column in profile.columns}
+
+    chain = get_chain(VISUALIZATION_SELECTION_PROMPT, "openai", "gpt-3.5-turbo")
+
+    try:
+        response = await ainvoke_llm(chain, {
+            "user_query": state["user_query"],
+            "analyzed_query": state["analyzed_query"].analyzed_query,
+            "sql_query": state["generated_sql"].sql_query,
+            "sample_data": json.dumps(sample_data, default=str),
+            "data_types": str(data_types)
+        })
+        
+        visualization_params = json.loads(response.content)
+        logger.info(f"Selected visualization: {visualization_params}")
+        return visualization_params
+    except Exception as e:
+        logger.error(f"Error in visualization selection: {str(e)}")
+        return {"visualization_type": "bar", "x_column": columns[0], "y_column": columns[1] if len(columns) > 1 else None}
+
+@llm_node
+async def data_visualizer(state: AgentState) -> dict:
+    # Runs in parallel with the summarizer, so it only returns the keys it writes. The chart
+    # keeps rendering after the node returns; the join node waits for visualization_future.
+    print("=================== Data Visualization =====================")
+    if not state["execution_result"].success or not state["evaluation_result"].requires_visualization:
+        return {"visualization": None}
+
+    visualization_params = await select_visualization(state)
+    visualization_future = await asyncio.to_thread(
+        submit_visualization,
+        state["execution_result"].data,
+        state["analyzed_query"].original_query,
+        visualization_params["visualization_type"],
+        visualization_params["x_column"],
+        visualization_params.get("y_column"),
+        visualization_params.get("title")
+    )
+    return {"visualization_future": visualization_future, "visualization_explanation": visualization_params.get("explanation", "")}
@@ -5,13 +5,22 @@ document.addEventListener('DOMContentLoaded', function() {
     const userInput = document.getElementById('user-input');
     const sendButton = document.querySelector('.chat-input button');
 
+    const imageTypes = { png: 'image/png', jpeg: 'image/jpeg', svg: 'image/svg+xml' };
+
     function addMessage(sender, content, isImage = false) {
         const messageElement = document.createElement('div');
         messageElement.classList.add('message', sender === 'user' ? 'user-message' : 'bot-message');
 
-        if (isImage) {
+        if (isImage && content.format === 'vega-lite') {
+            // Chart spec rendered in the browser (needs vega-embed on the page)
+            const chart = document.createElement('div');
+            chart.classList.add('visualization-image');
+            messageElement.appendChild(chart);
+            chatMessages.appendChild(messageElement);
+            vegaEmbed(chart, content.spec, { actions: false });
+        } else if (isImage) {
             const img = document.createElement('img');
-            img.src = `data:image/png;base64,${content}`;
+            img.src = `data:${imageTypes[content.format] || 'image/png'};base64,${content.image}`;
             img.classList.add('visualization-image');
             messageElement.appendChild(img);
         } else {
@@ -52,8 +61,8 @@ document.addEventListener('DOMContentLoaded', function() {
             }
 
             // Display visualization if available
-            if (data.visualization && data.visualization.image) {
-                addMessage('bot', data.visualization.image, true);
+            if (data.visualization && (data.visualization.image || data.visualization.spec)) {
+                addMessage('bot', data.visualization, true);
                 if (data.visualization.description) {
                     addMessage('bot', data.visualization.description);
                 }
@@ -0,0 +1,123 @@
+# app/utils/db_utils.py
+
+import threading
+import logging
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# One pooled engine per database URL for the whole process
+_engines = {}
+_engine_stats = {}
+_engines_lock = threading.Lock()
+_stats_lock = threading.Lock()  # the pool events fire on request threads
+
+def get_engine(database_url=None):
+    """
+    Return the shared engine for the database URL, creating it on first use.
+    """
+    database_url = database_url or Config.DATABASE_URL
+    engine = _engines.get(database_url)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(database_url)
+        if engine is None:
+            engine = _create_engine(database_url)
+            _engines[database_url] = engine
+        return engine
+
+def dispose_engine(database_url=None):
+    """Close all pooled connections for the database URL and forget the engine."""
+    database_url = database_url or Config.DATABASE_URL
+    with _engines_lock:
+        engine = _engines.pop(database_url, None)
+        _engine_stats.pop(database_url, None)
+    if engine is not None:
+        engine.dispose()
+
+def get_pool_metrics():
+    metrics = {}
+    for database_url, engine in list(_engines.items()):
+        pool = engine.pool
+        pool_metrics = {"status": pool.status()}
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                pool_metrics[name] = getattr(pool, name)()
+        with _stats_lock:
+            pool_metrics.update(_engine_stats.get(database_url, {}))
+        metrics[database_url] = pool_metrics
+    return metrics
+
+def _create_engine(database_url):
+    is_sqlite = database_url.startswith("sqlite")
+    is_memory_db = is_sqlite and make_url(database_url).database in (None, "", ":memory:")
+    engine_kwargs = {"pool_size": Config.DB_POOL_SIZE}
+    if not is_memory_db:
+        engine_kwargs.update(
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_recycle=Config.DB_POOL_RECYCLE
+        )
+    if is_sqlite:
+        # Pooled connections are handed between request threads
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+
+    engine = create_engine(database_url, **engine_kwargs)
+    stats = _engine_stats.setdefault(database_url, {"connections_opened": 0, "checkouts": 0})
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        with _stats_lock:
+            stats["connections_opened"] += 1
+        if is_sqlite:
+            _apply_sqlite_pragmas(dbapi_connection)
+        elif Config.DB_READ_ONLY:
+            _apply_read_only_session(engine.dialect.name, dbapi_connection)
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with _stats_lock:
+            stats["checkouts"] += 1
+
+    logger.info(f"Created pooled engine for {engine.url!r} (read_only={Config.DB_READ_ONLY})")
+    return engine
+
+def _apply_sqlite_pragmas(dbapi_connection):
+    pragmas = [
+        f"PRAGMA mmap_size={Config.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={Config.SQLITE_CACHE_SIZE}",
+    ]
+    if Config.SQLITE_WAL:
+        pragmas.append("PRAGMA journal_mode=WAL")
+    if Config.DB_READ_ONLY:
+        pragmas.append("PRAGMA query_only=ON")
+
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in pragmas:
+            try:
+                cursor.execute(pragma)
+            except Exception as e:
+                # e.g. WAL cannot be enabled on a read-only file; the rest still apply
+                logger.warning(f"Could not apply '{pragma}': {str(e)}")
+    finally:
+        cursor.close()
+
+def _apply_read_only_session(dialect_name, dbapi_connection):
+    statements = {
+        "postgresql": "SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY",
+        "mysql": "SET SESSION TRANSACTION READ ONLY",
+    }
+    statement = statements.get(dialect_name)
+    if statement is None:
+        logger.warning(f"Read-only mode is not supported for dialect {dialect_name}")
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(statement)
+    finally:
+        cursor.close()
@@ -0,0 +1,110 @@
+# app/utils/digest_utils.py
+
+import re
+import json
+import pandas as pd
+from app.config import Config
+from app.utils.llm_utils import count_tokens
+
+MAX_VALUE_CHARS = 80
+
+def build_result_digest(execution_result, profile, token_budget=None, sample_rows=None, model_name="gpt-3.5-turbo") -> str:
+    """
+    Compact JSON description of a query result for LLM prompts: row counts, the per-column
+    statistics of the result profile, the sums of the measure columns and a bounded set of
+    representative rows (head, tail and top-k by the main measure). Small results are passed
+    whole; larger ones shrink until they fit the budget, down to the row counts alone, with
+    "truncated" set once column statistics had to go. Notes say when the statistics come
+    from a sample or the rows stop at the fetch cap.
+    """
+    token_budget = Config.SUMMARY_RESULT_TOKEN_BUDGET if token_budget is None else token_budget
+    sample_rows = Config.SUMMARY_SAMPLE_ROWS if sample_rows is None else sample_rows
+
+    df = execution_result.data.to_frame()
+    digest = {
+        "row_count": len(df),
+        # Unknown (null) when the result was truncated and the remaining rows were not counted
+        "total_row_count": execution_result.total_row_count if execution_result.truncated else len(df),
+        "truncated": execution_result.truncated,
+        "columns": [column.dict(exclude_none=True) for column in profile.columns],
+        "sums": column_sums(df)
+    }
+    notes = coverage_notes(execution_result, profile, len(df))
+    if notes:
+        digest["notes"] = notes
+
+    # Every cell costs at least a token, so only results that could fit are tried whole
+    if len(df) * max(len(df.columns), 1) <= token_budget:
+        text = _dump({**digest, "rows": _rows(df, range(len(df)))})
+        if count_tokens(text, model_name) <= token_budget:
+            return text
+
+    measure = main_measure(df)
+    for n in range(sample_rows, -1, -1):
+        text = _dump({**digest, **representative_rows(df, n, measure)})
+        if count_tokens(text, model_name) <= token_budget:
+            return text
+
+    # Still too large with no rows at all: describe as many columns as fit, then drop the
+    # sums and notes; the digest stays valid JSON and says it was cut
+    digest["truncated"] = True
+    columns = digest.pop("columns")
+    for keep in range(len(columns) - 1, -1, -1):
+        text = _dump({**digest, "columns": columns[:keep], "omitted_columns": len(columns) - keep})
+        if count_tokens(text, model_name) <= token_budget:
+            return text
+    for key in ("sums", "notes"):
+        digest.pop(key, None)
+        text = _dump({**digest, "omitted_columns": len(columns)})
+        if count_tokens(text, model_name) <= token_budget:
+            return text
+    return _dump({key: digest[key] for key in ("row_count", "total_row_count", "truncated")})
+
+def measure_columns(df: pd.DataFrame):
+    """Numeric columns that are not identifiers."""
+    return [name for name in df.columns
+            if df[name].dtype.kind in 'iuf' and not re.search(r"(^|_)id$", str(name).lower())]
+
+def main_measure(df: pd.DataFrame):
+    """Last numeric column that is not an identifier, e.g. the SUM/COUNT of a GROUP BY."""
+    measures = measure_columns(df)
+    return measures[-1] if measures else None
+
+def column_sums(df: pd.DataFrame) -> dict:
+    """Sum of each measure column over all fetched rows (not the profile sample)."""
+    return {name: round(df[name].sum().item(), 6) for name in measure_columns(df)}
+
+def coverage_notes(execution_result, profile, row_count) -> list:
+    notes = []
+    if execution_result.truncated:
+        total = execution_result.total_row_count
+        notes.append(f"Only the first {row_count} of {total if total is not None else 'an unknown number of'} rows were "
+                     f"fetched; statistics, sums and rows cover the fetched rows only")
+    if profile.sampled:
+        notes.append(f"Column statistics are computed on a sample of {profile.profiled_rows} of {profile.row_count} rows")
+    return notes
+
+def representative_rows(df: pd.DataFrame, n: int, measure=None) -> dict:
+    if n == 0:
+        return {}
+    rows = {"head": _rows(df, range(min(n, len(df)))),
+            "tail": _rows(df, range(max(len(df) - n, n), len(df)))}
+    if measure is not None:
+        top = df[measure].nlargest(n).index
+        rows["top_by"] = measure
+        rows["top"] = _rows(df, top)
+    return rows
+
+def _rows(df, index):
+    records = df.iloc[list(index)].to_dict(orient="records")
+    return [{key: _clip(value) for key, value in record.items()} for record in records]
+
+def _clip(value):
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, str) and len(value) > MAX_VALUE_CHARS:
+        return value[:MAX_VALUE_CHARS] + "..."
+    return value
+
+def _dump(digest):
+    return json.dumps(digest, default=str, separators=(",", ":"))
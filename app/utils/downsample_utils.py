@@ -0,0 +1,177 @@
+# app/utils/downsample_utils.py
+
+import numpy as np
+import pandas as pd
+from app.config import Config
+
+# Preferred name of the weight (count) column of binned frames, prefixed with "_" until it is unused
+WEIGHT_COLUMN = "points"
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: indices of n_out points (first and last included) that
+    preserve the visual shape of the series. x must be sorted.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets between the end points
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+def minmax_decimate(y, n_out):
+    """Indices of the minimum and maximum of each of n_out // 2 equal-width buckets (plus the end points)."""
+    n = len(y)
+    buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.arange(n)
+    bucket = np.arange(n) * buckets // n
+    order = np.lexsort((y, bucket))  # by bucket, then by value
+    starts = np.searchsorted(bucket[order], np.arange(buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+def top_n_with_other(labels, values, n):
+    """
+    Sum values per label and keep the n largest labels plus an "Other" total of the rest. When
+    a kept category is itself called "Other", the total is labelled "Other (<k> more)" instead.
+    """
+    codes, categories = pd.factorize(labels)
+    weights = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    totals = np.bincount(codes[codes >= 0], weights=weights[codes >= 0], minlength=len(categories))
+    top = np.argsort(-totals, kind="stable")[:n]
+    other = weights.sum() - totals[top].sum()
+    kept = list(np.asarray(categories, dtype=object)[top])
+    other_label = "Other"
+    if other_label in {str(label) for label in kept}:
+        other_label = f"Other ({len(categories) - len(top)} more)"
+    return kept + [other_label], np.append(totals[top], other)
+
+def unused_column(name, columns):
+    """`name`, prefixed with underscores until it matches none of `columns`."""
+    columns = {str(column) for column in columns}
+    while name in columns:
+        name = f"_{name}"
+    return name
+
+def _numeric(series):
+    """Float values of a numeric or datetime column (NaN for nulls), plus a function mapping floats back."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        timestamps = pd.DatetimeIndex(series)
+        values = np.where(timestamps.isna(), np.nan, timestamps.asi8.astype(np.float64))
+        if timestamps.tz is None:
+            return values, lambda result: pd.to_datetime(np.asarray(result).astype(np.int64))
+        return values, lambda result: pd.to_datetime(np.asarray(result).astype(np.int64), utc=True).tz_convert(timestamps.tz)
+    return np.asarray(series, dtype=np.float64), lambda result: result
+
+def _is_numeric(series):
+    return (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)) \
+        or pd.api.types.is_datetime64_any_dtype(series)
+
+def reduce_for_chart(df, visualization_type, x_column, y_column=None, max_points=None):
+    """
+    Shrink large results before plotting, using the reduction that suits the chart type:
+    LTTB or min/max decimation for lines, 2D binning for scatter plots and heatmaps, top-N
+    plus "Other" for bar and pie charts, and pre-binned counts for histograms. Returns
+    (frame, reduction) where reduction is None when the data is plotted as is, otherwise a
+    dict describing it (method, rows, points and, for binned data, the weight column).
+    """
+    max_points = max_points or Config.CHART_MAX_POINTS
+    rows = len(df)
+    has_y = bool(y_column) and y_column in df.columns and y_column != x_column
+    reduced = None
+
+    if visualization_type == "histogram" and x_column in df.columns and _is_numeric(df[x_column]) and rows > max_points:
+        values, restore = _numeric(df[x_column])
+        values = values[~np.isnan(values)]
+        counts, edges = np.histogram(values, bins=Config.CHART_HISTOGRAM_BINS)
+        weight_column = unused_column(WEIGHT_COLUMN, [*df.columns, f"{x_column}_end"])
+        frame = pd.DataFrame({x_column: restore(edges[:-1]), f"{x_column}_end": restore(edges[1:]), weight_column: counts})
+        reduced = (frame, {"method": "prebinned", "weights": weight_column})
+
+    elif not has_y or x_column not in df.columns:
+        return df, None
+
+    elif visualization_type == "line" and rows > max_points and _is_numeric(df[x_column]) and _is_numeric(df[y_column]):
+        x, _ = _numeric(df[x_column])
+        y, _ = _numeric(df[y_column])
+        keep = ~(np.isnan(x) | np.isnan(y))
+        positions = np.flatnonzero(keep)
+        order = positions[np.argsort(x[keep], kind="stable")]
+        if Config.CHART_LINE_DOWNSAMPLING == "minmax":
+            picked = order[minmax_decimate(y[order], max_points)]
+        else:
+            picked = order[lttb(x[order], y[order], max_points)]
+        frame = df.iloc[picked][[x_column, y_column]].reset_index(drop=True)
+        reduced = (frame, {"method": Config.CHART_LINE_DOWNSAMPLING})
+
+    elif visualization_type in ("bar", "pie") and _is_numeric(df[y_column]) and not _is_numeric(df[x_column]) \
+            and df[x_column].nunique() > Config.CHART_MAX_CATEGORIES:
+        labels, totals = top_n_with_other(df[x_column].to_numpy(), df[y_column].to_numpy(), Config.CHART_MAX_CATEGORIES)
+        frame = pd.DataFrame({x_column: labels, y_column: totals})
+        reduced = (frame, {"method": "top_n_other"})
+
+    elif visualization_type == "scatter" and rows > max_points and _is_numeric(df[x_column]) and _is_numeric(df[y_column]):
+        x, restore_x = _numeric(df[x_column])
+        y, restore_y = _numeric(df[y_column])
+        keep = ~(np.isnan(x) | np.isnan(y))
+        counts, x_edges, y_edges = np.histogram2d(x[keep], y[keep], bins=Config.CHART_SCATTER_BINS)
+        x_index, y_index = np.nonzero(counts)
+        weight_column = unused_column(WEIGHT_COLUMN, df.columns)
+        frame = pd.DataFrame({
+            x_column: restore_x((x_edges[x_index] + x_edges[x_index + 1]) / 2),
+            y_column: restore_y((y_edges[y_index] + y_edges[y_index + 1]) / 2),
+            weight_column: counts[x_index, y_index]
+        })
+        reduced = (frame, {"method": "binned_2d", "weights": weight_column})
+
+    elif visualization_type == "heatmap":
+        value_column = df.columns[-1]
+        if value_column in (x_column, y_column) or not _is_numeric(df[value_column]):
+            return df, None
+        if _is_numeric(df[x_column]) and _is_numeric(df[y_column]) and rows > max_points:
+            x, restore_x = _numeric(df[x_column])
+            y, restore_y = _numeric(df[y_column])
+            values = np.asarray(df[value_column], dtype=np.float64)
+            keep = ~(np.isnan(x) | np.isnan(y) | np.isnan(values))
+            bins = Config.CHART_HEATMAP_BINS
+            counts, x_edges, y_edges = np.histogram2d(x[keep], y[keep], bins=bins)
+            sums, _, _ = np.histogram2d(x[keep], y[keep], bins=[x_edges, y_edges], weights=values[keep])
+            x_index, y_index = np.nonzero(counts)
+            frame = pd.DataFrame({
+                x_column: restore_x((x_edges[x_index] + x_edges[x_index + 1]) / 2),
+                y_column: restore_y((y_edges[y_index] + y_edges[y_index + 1]) / 2),
+                value_column: sums[x_index, y_index] / counts[x_index, y_index]
+            })
+            reduced = (frame, {"method": "binned_2d_mean"})
+        elif df[x_column].nunique() > Config.CHART_HEATMAP_BINS or df[y_column].nunique() > Config.CHART_HEATMAP_BINS:
+            # Keep the categories carrying the largest totals on each axis
+            keep = np.ones(rows, dtype=bool)
+            for column in (x_column, y_column):
+                totals = df.groupby(column, sort=False)[value_column].sum()
+                keep &= df[column].isin(totals.nlargest(Config.CHART_HEATMAP_BINS).index).to_numpy()
+            reduced = (df.loc[keep, [x_column, y_column, value_column]].reset_index(drop=True), {"method": "top_n"})
+
+    if reduced is None:
+        return df, None
+    frame, reduction = reduced
+    reduction.update(rows=rows, points=len(frame))
+    return frame, reduction
+
+def describe_reduction(reduction):
+    if reduction is None:
+        return ""
+    methods = {"lttb": "LTTB downsampling", "minmax": "min/max decimation", "top_n_other": "top categories plus Other",
+               "binned_2d": "2D binning", "binned_2d_mean": "2D binning", "top_n": "top categories",
+               "prebinned": "pre-binned counts"}
+    return f" ({reduction['rows']} rows reduced to {reduction['points']} with {methods[reduction['method']]})"
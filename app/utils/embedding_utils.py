@@ -0,0 +1,155 @@
+# app/utils/embedding_utils.py
+
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+def embedding_key(model_name, kind, text):
+    """Cache key: model name, embedding kind (query or document) and a hash of the text."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model_name}:{kind}:{digest}"
+
+class EmbeddingStore:
+    """On-disk SQLite table of float32 vectors, shared by all processes using the same file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._connection = connection
+        return self._connection
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            connection = self._connect()
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def put_many(self, items):
+        if not items:
+            return
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                                       [(key, vector.tobytes()) for key, vector in items.items()])
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an in-process LRU in front of an on-disk store. Vectors are
+    kept as float32 and keyed by model name plus a hash of the text, so repeated queries
+    and memories are embedded once. embed_documents sends only the cache misses to the
+    backend, in one batch.
+    """
+
+    def __init__(self, backend, model_name, store=None, max_entries=None):
+        self.backend = backend
+        self.model_name = model_name
+        self.store = store
+        self.max_entries = Config.EMBEDDING_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries = OrderedDict()  # key -> float32 vector
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "backend_calls": 0}
+
+    def embed_documents(self, texts):
+        return [vector.tolist() for vector in self._embed(list(texts), "document")]
+
+    def embed_query(self, text):
+        return self._embed([text], "query")[0].tolist()
+
+    def get_stats(self):
+        with self._lock:
+            stats, entries = dict(self.stats), len(self._entries)
+        return {**stats, "model": self.model_name, "entries": entries, "max_entries": self.max_entries,
+                "path": self.store.path if self.store is not None else None}
+
+    def _embed(self, texts, kind):
+        keys = [embedding_key(self.model_name, kind, text) for text in texts]
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[key] = vector
+            self.stats["memory_hits"] += len(vectors)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing and self.store is not None:
+            try:
+                stored = self.store.get_many(missing)
+            except Exception as e:
+                logger.warning(f"Embedding store lookup failed: {str(e)}")
+                stored = {}
+            self._count(disk_hits=len(stored))
+            vectors.update(stored)
+            self._remember(stored)
+
+        # One backend call for everything still missing (duplicates embedded once)
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            self._count(misses=len(missing), backend_calls=1)
+            if kind == "query":
+                embedded = [self.backend.embed_query(text) for text in missing.values()]
+            else:
+                embedded = self.backend.embed_documents(list(missing.values()))
+            fresh = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, embedded)}
+            vectors.update(fresh)
+            self._remember(fresh)
+            if self.store is not None:
+                try:
+                    self.store.put_many(fresh)
+                except Exception as e:
+                    logger.warning(f"Embedding store write failed: {str(e)}")
+
+        return [vectors[key] for key in keys]
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, amount in increments.items():
+                self.stats[name] += amount
+
+    def _remember(self, vectors):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+def cached_embeddings(backend, model_name):
+    """Wrap the backend in the configured embedding cache, or return it as is when disabled."""
+    if not Config.EMBEDDING_CACHE_ENABLED:
+        return backend
+    store = EmbeddingStore(Config.EMBEDDING_CACHE_PATH) if Config.EMBEDDING_CACHE_PATH else None
+    return CachedEmbeddings(backend, model_name, store)
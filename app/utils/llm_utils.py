@@ -1,23 +1,214 @@
-# app/utils/llm_utils.py
-
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
-from app.config import Config
-
-def get_llm(provider, model_name):
-    temperature = Config.LLM_TEMPERATURE
-
-    if provider == 'openai':
-        return ChatOpenAI(model_name=model_name, temperature=temperature)
-    elif provider == 'anthropic':
-        return ChatAnthropic(model=model_name, temperature=temperature)
-    elif provider == 'groq':
-        return ChatGroq(model_name=model_name, temperature=temperature)
-    elif provider == 'ollama':
-        return ChatOllama(model=model_name, temperature=temperature)
-    else:
-        raise ValueError(f"Unsupported LLM provider: {provider}")
-
-
+# app/utils/llm_utils.py
+
+import os
+import asyncio
+import functools
+import threading
+import logging
+import weakref
+import httpx
+import tiktoken
+from langchain_openai import ChatOpenAI
+from langchain_anthropic import ChatAnthropic
+from langchain_groq import ChatGroq
+from langchain_ollama import ChatOllama
+from app.config import Config
+from app.utils.metrics_utils import llm_metrics_callback, count_http_request
+
+# Process-level registries: one chat model per (provider, model, temperature)
+# and one prompt | llm chain per (prompt, provider, model, temperature), kept per event loop
+# because the async HTTP client the models hold is bound to the loop that first used it
+_loop_resources = weakref.WeakKeyDictionary()  # event loop -> _LoopResources
+_registry_lock = threading.RLock()
+_http_client = None
+_encodings = {}
+
+# Background event loop that runs LLM nodes for the synchronous graph.invoke
+_llm_loop = None
+
+# LLM calls in flight across the process, whichever event loop awaits them
+_llm_slots = None
+
+logger = logging.getLogger(__name__)
+
+class _LoopResources:
+    """The async HTTP client, chat models and chains of one event loop."""
+
+    def __init__(self):
+        self.http_client = None
+        self.llms = {}
+        self.chains = {}
+
+def get_http_client():
+    """Shared keep-alive HTTP connection pool for the HTTP-based chat model clients."""
+    global _http_client
+    if _http_client is None:
+        with _registry_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    limits=_http_limits(),
+                    event_hooks={"request": [count_http_request]}
+                )
+    return _http_client
+
+def get_async_http_client():
+    """Async counterpart of get_http_client for the running event loop, used by ainvoke."""
+    resources = _get_loop_resources()
+    if resources.http_client is None:
+        resources.http_client = httpx.AsyncClient(
+            limits=_http_limits(),
+            event_hooks={"request": [_count_async_http_request]}
+        )
+    return resources.http_client
+
+async def close_async_http_client():
+    """Close the running loop's connection pool and drop the chat models and chains bound to it."""
+    resources = _loop_resources.pop(asyncio.get_running_loop(), None)
+    if resources is not None and resources.http_client is not None:
+        await resources.http_client.aclose()
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=Config.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=Config.LLM_HTTP_KEEPALIVE_EXPIRY
+    )
+
+async def _count_async_http_request(request):
+    count_http_request(request)
+
+def _get_loop_resources():
+    loop = asyncio.get_running_loop()
+    resources = _loop_resources.get(loop)
+    if resources is None:
+        with _registry_lock:
+            resources = _loop_resources.setdefault(loop, _LoopResources())
+    return resources
+
+def get_llm(provider, model_name, temperature=None):
+    """The cached chat model for the running event loop; call it from an llm_node."""
+    if temperature is None:
+        temperature = Config.LLM_TEMPERATURE
+
+    resources = _get_loop_resources()
+    key = (provider, model_name, temperature)
+    llm = resources.llms.get(key)
+    if llm is None:
+        llm = resources.llms.setdefault(key, _create_llm(provider, model_name, temperature))
+    return llm
+
+def get_chain(prompt, provider, model_name, temperature=None):
+    """
+    Return the cached `prompt | llm` chain for the running event loop. Prompts are
+    module-level constants, so their identity is a stable cache key for the lifetime of the process.
+    """
+    if temperature is None:
+        temperature = Config.LLM_TEMPERATURE
+
+    resources = _get_loop_resources()
+    key = (id(prompt), provider, model_name, temperature)
+    chain = resources.chains.get(key)
+    if chain is None:
+        chain = resources.chains.setdefault(key, prompt | get_llm(provider, model_name, temperature))
+    return chain
+
+def _create_llm(provider, model_name, temperature):
+    if provider == 'openai':
+        return ChatOpenAI(model_name=model_name, temperature=temperature, http_client=get_http_client(),
+                          http_async_client=get_async_http_client(), callbacks=[llm_metrics_callback])
+    elif provider == 'anthropic':
+        return ChatAnthropic(model=model_name, temperature=temperature, callbacks=[llm_metrics_callback])
+    elif provider == 'groq':
+        return ChatGroq(model_name=model_name, temperature=temperature, http_client=get_http_client(),
+                        http_async_client=get_async_http_client(), callbacks=[llm_metrics_callback])
+    elif provider == 'ollama':
+        return ChatOllama(model=model_name, temperature=temperature, callbacks=[llm_metrics_callback])
+    else:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+
+def count_tokens(text, model_name="gpt-3.5-turbo"):
+    """
+    Token count of `text` for the model's tokenizer. Falls back to ~4 characters per
+    token when the tokenizer is unavailable (unknown model or encoding files not cached).
+    """
+    encoding = _encodings.get(model_name)
+    if encoding is None and model_name not in _encodings:
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except Exception as e:
+            logger.warning(f"No tokenizer for {model_name}, estimating token counts: {str(e)}")
+            encoding = None
+        _encodings[model_name] = encoding
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+async def ainvoke_llm(chain, inputs):
+    """Await one LLM call, holding one of the process's LLM_MAX_CONCURRENCY slots while it is in flight."""
+    slots = await _acquire_llm_slot()
+    try:
+        return await chain.ainvoke(inputs)
+    finally:
+        slots.release()
+
+def _get_llm_slots():
+    global _llm_slots
+    if _llm_slots is None:
+        with _registry_lock:
+            if _llm_slots is None:
+                _llm_slots = threading.BoundedSemaphore(Config.LLM_MAX_CONCURRENCY)
+    return _llm_slots
+
+async def _acquire_llm_slot():
+    # A threading semaphore, since the serving loop and the background loop share the limit;
+    # when none is free, wait for one in a worker thread instead of on the loop
+    slots = _get_llm_slots()
+    if slots.acquire(blocking=False):
+        return slots
+    acquiring = asyncio.ensure_future(asyncio.to_thread(slots.acquire))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # The worker thread still gets the slot; hand it back once it does
+        acquiring.add_done_callback(lambda _: slots.release())
+        raise
+    return slots
+
+def llm_node(afunc):
+    """
+    Make an async node that awaits its LLM calls with ainvoke_llm runnable from both
+    graph.invoke and graph.ainvoke. graph.ainvoke awaits it on the serving event loop;
+    graph.invoke runs it on a background event loop shared by all synchronous requests
+    and waits for the result. Nodes run blocking work (database, CPU-heavy) with
+    asyncio.to_thread so that it never stalls the loop.
+    """
+    @functools.wraps(afunc)
+    def node(state):
+        return run_on_llm_loop(afunc(state))
+
+    node.afunc = afunc
+    return node
+
+def run_on_llm_loop(coroutine):
+    """Run a coroutine on the background LLM event loop from a synchronous caller."""
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_llm_loop()).result()
+
+def _get_llm_loop():
+    global _llm_loop
+    if _llm_loop is None:
+        with _registry_lock:
+            if _llm_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+                _llm_loop = loop
+    return _llm_loop
+
+def _reset_after_fork():
+    # The loop thread and the connection pools do not survive a fork
+    global _llm_loop, _http_client, _llm_slots
+    _llm_loop = None
+    _http_client = None
+    _llm_slots = None
+    _loop_resources.clear()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
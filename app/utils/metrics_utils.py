@@ -0,0 +1,306 @@
+# app/utils/metrics_utils.py
+
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.utils import RunnableCallable
+from app.utils.trace_utils import span, record_span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per 1K (prompt, completion) tokens, used to estimate LLM spend
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4-turbo": (0.01, 0.03),
+    "claude-3-5-sonnet-20240620": (0.003, 0.015),
+    "claude-3-haiku-20240307": (0.00025, 0.00125),
+}
+
+class _Metric:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Counter(_Metric):
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{self._format_labels(key)} {value}")
+        return lines
+
+class Gauge(_Metric):
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{self._format_labels(key)} {value}")
+        return lines
+
+class Histogram(_Metric):
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][index] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry["counts"]):
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', bound))} {count}")
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', '+Inf'))} {entry['count']}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {entry['sum']}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {entry['count']}")
+        return lines
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+REGISTRY = []
+
+NODE_DURATION = Histogram("graph_node_duration_seconds", "Wall time of each analysis graph node", ["node"])
+NODE_RUNS = Counter("graph_node_runs_total", "Analysis graph node executions", ["node", "status"])
+LLM_DURATION = Histogram("llm_call_duration_seconds", "Wall time of each LLM call", ["node", "model"])
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens consumed", ["node", "model", "kind"])
+LLM_COST = Counter("llm_cost_usd_total", "Estimated LLM spend in USD", ["node", "model"])
+LLM_RETRIES = Counter("llm_retries_total", "LLM HTTP requests retried by the client", ["node"])
+SQL_DURATION = Histogram("sql_execution_duration_seconds", "Time spent executing SQL against the analysed database", ["node"])
+REQUEST_DURATION = Histogram("analysis_request_duration_seconds", "End-to-end time of analysis requests", ["endpoint"])
+MEMORY_QUEUE_DEPTH = Gauge("memory_write_queue_depth", "Memories waiting to be written to the vector store")
+MEMORY_WRITES = Counter("memory_writes_total", "Memories written to the vector store", ["status"])
+MEMORY_FLUSH_DURATION = Histogram("memory_flush_duration_seconds", "Time to embed and store one batch of memories")
+HISTORY_QUEUE_DEPTH = Gauge("session_history_queue_depth", "Session history entries waiting to be committed")
+HISTORY_WRITES = Counter("session_history_writes_total", "Session history entries committed", ["status"])
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class RequestMetrics:
+    """Per-request breakdown of node time, LLM usage and SQL time."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.nodes = {}
+        self._lock = threading.Lock()
+
+    def record(self, node, **values):
+        with self._lock:
+            entry = self.nodes.setdefault(node, {
+                "runs": 0, "seconds": 0.0, "llm_calls": 0, "llm_seconds": 0.0, "prompt_tokens": 0,
+                "completion_tokens": 0, "cost_usd": 0.0, "http_requests": 0, "retries": 0, "sql_seconds": 0.0
+            })
+            for name, value in values.items():
+                entry[name] += value
+
+    def add(self, other):
+        """Fold the node totals of another RequestMetrics into this one, e.g. a batch question into the batch."""
+        with other._lock:
+            nodes = {node: dict(entry) for node, entry in other.nodes.items()}
+        for node, entry in nodes.items():
+            self.record(node, **entry)
+
+    def value(self, node, name):
+        with self._lock:
+            return self.nodes.get(node, {}).get(name, 0)
+
+    def summary(self):
+        with self._lock:
+            nodes = {node: {name: round(value, 6) if isinstance(value, float) else value for name, value in entry.items()}
+                     for node, entry in self.nodes.items()}
+        return {
+            "total_seconds": round(time.time() - self.started_at, 3),
+            "prompt_tokens": sum(entry["prompt_tokens"] for entry in nodes.values()),
+            "completion_tokens": sum(entry["completion_tokens"] for entry in nodes.values()),
+            "cost_usd": round(sum(entry["cost_usd"] for entry in nodes.values()), 6),
+            "nodes": nodes
+        }
+
+    def server_timing(self):
+        """Server-Timing header value: one entry per node plus the total."""
+        summary = self.summary()
+        entries = []
+        for node, entry in summary["nodes"].items():
+            description = f"tokens={entry['prompt_tokens'] + entry['completion_tokens']} cost={entry['cost_usd']}"
+            entries.append(f'{node};dur={entry["seconds"] * 1000:.1f};desc="{description}"')
+        entries.append(f"total;dur={summary['total_seconds'] * 1000:.1f}")
+        return ", ".join(entries)
+
+_request_metrics = ContextVar("request_metrics", default=None)
+_current_node = ContextVar("current_node", default=None)
+
+@contextmanager
+def start_request_metrics():
+    """Record node, LLM and SQL usage in the enclosed block into a new RequestMetrics, which is yielded."""
+    metrics = RequestMetrics()
+    token = _request_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+def get_request_metrics():
+    return _request_metrics.get()
+
+def current_node():
+    return _current_node.get() or "unknown"
+
+def _record_request(node, **values):
+    metrics = _request_metrics.get()
+    if metrics is not None:
+        metrics.record(node, **values)
+
+@contextmanager
+def _node_scope(name):
+    token = _current_node.set(name)
+    start_time = time.perf_counter()
+    status = "ok"
+    try:
+        with span(name, "node"):
+            yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start_time
+        _current_node.reset(token)
+        NODE_DURATION.observe(elapsed, node=name)
+        NODE_RUNS.inc(node=name, status=status)
+        _record_request(name, runs=1, seconds=elapsed)
+
+def instrument_node(name, func):
+    """
+    Wrap a graph node so its wall time and outcome are recorded (and traced) under `name`.
+    The returned runnable serves both invoke and ainvoke: nodes built with llm_node run
+    their async variant, other nodes run in a worker thread.
+    """
+    def run(state):
+        with _node_scope(name):
+            return func(state)
+
+    async def arun(state):
+        with _node_scope(name):
+            if hasattr(func, "afunc"):
+                return await func.afunc(state)
+            return await asyncio.to_thread(func, state)
+
+    return RunnableCallable(run, arun, name=name, trace=False)
+
+def _http_requests(node):
+    metrics = _request_metrics.get()
+    return metrics.value(node, "http_requests") if metrics is not None else 0
+
+def record_sql_time(seconds):
+    node = current_node()
+    SQL_DURATION.observe(seconds, node=node)
+    _record_request(node, sql_seconds=seconds)
+
+def count_http_request(request):
+    """httpx request hook for the shared LLM connection pool."""
+    _record_request(current_node(), http_requests=1)
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        # Dated snapshots, e.g. gpt-4o-mini-2024-07-18
+        prices = next((price for name, price in MODEL_PRICES.items() if model and model.startswith(name + "-")), (0.0, 0.0))
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1000
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records latency, token usage and estimated cost of every chat model call."""
+
+    # Cheap enough to run on the event loop under ainvoke instead of in a worker thread
+    run_inline = True
+
+    def __init__(self):
+        # run_id -> (wall clock start, perf counter start, HTTP requests the node had sent before the call)
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = (time.time(), time.perf_counter(), _http_requests(current_node()))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = (time.time(), time.perf_counter(), _http_requests(current_node()))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node = current_node()
+        started_at, start_time, requests_before = self._started.pop(run_id, (time.time(), time.perf_counter(), None))
+        elapsed = time.perf_counter() - start_time
+        llm_output = response.llm_output or {}
+        model = llm_output.get("model_name") or llm_output.get("model") or "unknown"
+        prompt_tokens, completion_tokens = _token_usage(response)
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        # Only clients on the shared HTTP pool report requests; each one past the first is a retry
+        retries = max(_http_requests(node) - requests_before - 1, 0) if requests_before is not None else 0
+
+        LLM_DURATION.observe(elapsed, node=node, model=model)
+        LLM_TOKENS.inc(prompt_tokens, node=node, model=model, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, node=node, model=model, kind="completion")
+        LLM_COST.inc(cost, node=node, model=model)
+        LLM_RETRIES.inc(retries, node=node)
+        _record_request(node, llm_calls=1, llm_seconds=elapsed, prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens, cost_usd=cost, retries=retries)
+        record_span("llm", "llm", started_at, elapsed, model=model, prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens, cost_usd=round(cost, 6), retries=retries)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            record_span("llm", "llm", started[0], time.perf_counter() - started[1], status="error", error=str(error))
+
+def _token_usage(response):
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    return 0, 0
+
+llm_metrics_callback = LLMMetricsCallback()
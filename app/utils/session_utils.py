@@ -0,0 +1,108 @@
+# app/utils/session_utils.py
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from cachelib import BaseCache, FileSystemCache
+from cachelib.serializers import BaseSerializer
+from flask_session import Session
+
+logger = logging.getLogger(__name__)
+
+class SQLiteCache(BaseCache):
+    """
+    cachelib backend keeping every entry in one SQLite file (WAL mode), shared by all
+    worker processes. Expired entries are skipped on read and deleted by a sweep that
+    runs with a write at most once every sweep_interval seconds.
+    """
+
+    def __init__(self, path, default_timeout=300, sweep_interval=300):
+        super().__init__(default_timeout)
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.serializer = BaseSerializer()
+        self._local = threading.local()  # one connection per thread; WAL lets readers run concurrently
+        self._last_sweep = time.time()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, no fsync per commit
+            connection.execute("CREATE TABLE IF NOT EXISTS cache "
+                               "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires)")
+            self._local.connection = connection
+        return connection
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0  # 0: never expires
+
+    def get(self, key):
+        row = self._connection().execute("SELECT value FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)",
+                                         (key, time.time())).fetchone()
+        return self.serializer.loads(row[0]) if row is not None else None
+
+    def set(self, key, value, timeout=None):
+        self._connection().execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                                   (key, self.serializer.dumps(value), self._expires(timeout)))
+        self._maybe_sweep()
+        return True
+
+    def add(self, key, value, timeout=None):
+        # Insert, or take over the key when the stored entry has expired
+        cursor = self._connection().execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+            "value = excluded.value, expires = excluded.expires WHERE cache.expires != 0 AND cache.expires <= ?",
+            (key, self.serializer.dumps(value), self._expires(timeout), time.time()))
+        self._maybe_sweep()
+        return cursor.rowcount > 0
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+        return True
+
+    def has(self, key):
+        return self._connection().execute("SELECT 1 FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)",
+                                          (key, time.time())).fetchone() is not None
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+        return True
+
+    def sweep(self):
+        """Delete expired entries; returns how many were removed."""
+        self._last_sweep = time.time()
+        cursor = self._connection().execute("DELETE FROM cache WHERE expires != 0 AND expires <= ?", (time.time(),))
+        if cursor.rowcount:
+            logger.info(f"Swept {cursor.rowcount} expired entries from {self.path}")
+        return cursor.rowcount
+
+    def _maybe_sweep(self):
+        if time.time() - self._last_sweep >= self.sweep_interval:
+            try:
+                self.sweep()
+            except sqlite3.Error as e:
+                logger.warning(f"Session sweep failed: {str(e)}")
+
+def init_session(app):
+    """
+    Set up the session backend named by SESSION_TYPE: "sqlite" (one SQLite file),
+    "filesystem" (one file per session) or "cookie" (Flask's signed-cookie sessions,
+    which need no server-side storage since a session only holds the user id).
+    """
+    session_type = app.config.get('SESSION_TYPE', 'filesystem')
+    if session_type == 'cookie':
+        return
+    if session_type == 'sqlite':
+        app.config['SESSION_TYPE'] = 'cachelib'
+        app.config['SESSION_CACHELIB'] = SQLiteCache(app.config['SESSION_SQLITE_PATH'],
+                                                     sweep_interval=app.config.get('SESSION_SWEEP_INTERVAL', 300))
+    elif session_type == 'filesystem':
+        app.config['SESSION_CACHELIB'] = FileSystemCache(app.config['SESSION_FILE_DIR'])
+    Session(app)
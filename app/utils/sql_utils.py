@@ -0,0 +1,214 @@
+# app/utils/sql_utils.py
+
+import re
+from typing import Dict, List, Tuple
+
+# Statements and keywords that can modify data or the database itself
+WRITE_KEYWORDS = (
+    "INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE", "TRUNCATE", "REPLACE", "MERGE",
+    "UPSERT", "ATTACH", "DETACH", "PRAGMA", "VACUUM", "REINDEX", "GRANT", "REVOKE", "CALL",
+    "EXEC", "EXECUTE", "COPY", "LOCK"
+)
+
+# Keywords that can follow a table reference, so they are never taken as an alias
+_CLAUSE_KEYWORDS = {
+    "WHERE", "GROUP", "ORDER", "HAVING", "LIMIT", "OFFSET", "JOIN", "INNER", "LEFT", "RIGHT",
+    "FULL", "OUTER", "CROSS", "NATURAL", "ON", "USING", "UNION", "INTERSECT", "EXCEPT", "WINDOW",
+    "AS", "SELECT", "FROM", "WITH", "RETURNING", "FETCH", "FOR"
+}
+
+_FROM_FUNCTIONS = {"EXTRACT", "SUBSTRING", "TRIM", "OVERLAY", "POSITION"}
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<identifier>"[^"]*"|`[^`]*`|\[[^\]]*\]|[A-Za-z_][\w$]*)
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<placeholder>\?)
+    | (?P<symbol><=|>=|<>|!=|\|\||[(),.;*=<>+\-/%])
+    """,
+    re.VERBOSE
+)
+
+# One left-to-right pass: a quote opens a literal (or quoted identifier) that runs to its closing
+# quote, and -- or /* only start a comment outside of one. Unterminated spans run to the end.
+_SEGMENT_PATTERN = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*(?:'|\Z))
+    | (?P<quoted>"(?:[^"]|"")*(?:"|\Z)|`[^`]*(?:`|\Z))
+    | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<code>[^'"`/\-]+|[/\-])
+    """,
+    re.VERBOSE | re.DOTALL
+)
+
+def split_segments(sql: str) -> List[Tuple[str, str]]:
+    """(kind, text) pieces of the statement: code, string, quoted (identifier) or comment."""
+    return [(match.lastgroup, match.group(0)) for match in _SEGMENT_PATTERN.finditer(sql)]
+
+def mask_literals(sql: str) -> str:
+    """Remove comments and replace string literals with '' so keyword scans ignore their contents."""
+    masked = []
+    for kind, text in split_segments(sql):
+        masked.append(" " if kind == "comment" else "''" if kind == "string" else text)
+    return "".join(masked)
+
+def split_statements(sql: str) -> List[str]:
+    return [statement.strip() for statement in mask_literals(sql).split(";") if statement.strip()]
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical form of a statement for fingerprinting: comments dropped, whitespace collapsed,
+    unquoted keywords/identifiers lowercased, string literals and quoted identifiers kept as-is.
+    """
+    # Comments become whitespace; runs of code are then normalized, literals never are
+    pieces = []
+    for kind, text in split_segments(sql):
+        if kind in ("code", "comment"):
+            code = " " if kind == "comment" else text
+            if pieces and pieces[-1][0] == "code":
+                pieces[-1] = ("code", pieces[-1][1] + code)
+            else:
+                pieces.append(("code", code))
+        else:
+            pieces.append((kind, text))
+    normalized = []
+    for kind, text in pieces:
+        if kind == "code":
+            text = re.sub(r"\s*([(),;=<>])\s*", r"\1", re.sub(r"\s+", " ", text).lower())
+        normalized.append(text)
+    return "".join(normalized).strip().rstrip(";").strip()
+
+def tokenize(sql: str) -> List[str]:
+    return [match.group(0) for match in _TOKEN_PATTERN.finditer(mask_literals(sql))]
+
+def unquote_identifier(identifier: str) -> str:
+    if identifier[:1] in ('"', '`', '[') and len(identifier) >= 2:
+        return identifier[1:-1]
+    return identifier
+
+def find_write_keywords(sql: str) -> List[str]:
+    """
+    Write/DDL keywords in statement-leading position: at the start, after `;`, or opening or
+    following a CTE body (`WITH d AS (DELETE ...)`, `WITH c AS (...) INSERT ...`). Elsewhere
+    the same words are names, e.g. `COUNT(*) AS replace` or the REPLACE() function.
+    """
+    tokens = tokenize(sql)
+    found = []
+    cte_bodies = []  # per open parenthesis: whether it opens a CTE body
+    leading = True
+    for index, token in enumerate(tokens):
+        keyword = token.upper()
+        if leading and keyword in WRITE_KEYWORDS and keyword not in found:
+            found.append(keyword)
+        if token == "(":
+            previous = tokens[index - 1].upper() if index > 0 else ""
+            cte_bodies.append(previous in ("AS", "MATERIALIZED"))
+            leading = cte_bodies[-1]
+        elif token == ")":
+            leading = cte_bodies.pop() if cte_bodies else False
+            # The main statement follows the last CTE; another CTE follows a comma
+            if leading and index + 1 < len(tokens) and tokens[index + 1] == ",":
+                leading = False
+        else:
+            leading = token == ";"
+    return found
+
+def extract_cte_names(sql: str) -> List[str]:
+    tokens = tokenize(sql)
+    names = []
+    for index, token in enumerate(tokens):
+        if token.upper() != "AS" or index == 0 or index + 1 >= len(tokens) or tokens[index + 1] != "(":
+            continue
+        previous = tokens[index - 1]
+        # `name AS (` directly after WITH / WITH RECURSIVE / a comma between CTEs
+        before = tokens[index - 2].upper() if index >= 2 else ""
+        if before in ("WITH", "RECURSIVE", ","):
+            names.append(unquote_identifier(previous).lower())
+    return names
+
+def extract_table_references(sql: str) -> List[Tuple[str, str]]:
+    """
+    Return (table, alias) pairs for every table named after FROM/JOIN (including
+    comma-separated FROM lists). Subqueries and table-valued functions are skipped.
+    """
+    tokens = tokenize(sql)
+    references = []
+    # Function calls whose arguments use FROM, e.g. EXTRACT(YEAR FROM order_date)
+    paren_owners = []
+    index = 0
+    while index < len(tokens):
+        keyword = tokens[index].upper()
+        if tokens[index] == "(":
+            paren_owners.append(tokens[index - 1].upper() if index > 0 else "")
+        elif tokens[index] == ")" and paren_owners:
+            paren_owners.pop()
+        if keyword not in ("FROM", "JOIN") or (paren_owners and paren_owners[-1] in _FROM_FUNCTIONS):
+            index += 1
+            continue
+
+        index += 1
+        while index < len(tokens):
+            if tokens[index] == "(" or tokens[index].upper() in _CLAUSE_KEYWORDS:
+                break
+            name = unquote_identifier(tokens[index])
+            index += 1
+            # schema.table
+            while index + 1 < len(tokens) and tokens[index] == ".":
+                name = unquote_identifier(tokens[index + 1])
+                index += 2
+            if index < len(tokens) and tokens[index] == "(":
+                break  # table-valued function, e.g. json_each(...)
+
+            alias = name
+            if index < len(tokens) and tokens[index].upper() == "AS":
+                index += 1
+            if index < len(tokens) and re.match(r'^["`\[A-Za-z_]', tokens[index]) \
+                    and tokens[index].upper() not in _CLAUSE_KEYWORDS:
+                alias = unquote_identifier(tokens[index])
+                index += 1
+            references.append((name, alias))
+
+            # Only FROM lists continue with commas
+            if keyword == "FROM" and index < len(tokens) and tokens[index] == ",":
+                index += 1
+                continue
+            break
+    return references
+
+def extract_qualified_columns(sql: str) -> List[Tuple[str, str]]:
+    """Return (qualifier, column) pairs for every `qualifier.column` reference."""
+    tokens = tokenize(sql)
+    columns = []
+    for index in range(1, len(tokens) - 1):
+        if tokens[index] != ".":
+            continue
+        qualifier, column = tokens[index - 1], tokens[index + 1]
+        if column == "*" or not re.match(r'^["`\[A-Za-z_]', qualifier) or not re.match(r'^["`\[A-Za-z_]', column):
+            continue
+        columns.append((unquote_identifier(qualifier), unquote_identifier(column)))
+    return columns
+
+def check_schema_references(sql: str, table_columns: Dict[str, List[str]]) -> List[str]:
+    """Report tables and alias-qualified columns that do not exist in the schema."""
+    issues = []
+    known_tables = {name.lower(): {column.lower() for column in columns} for name, columns in table_columns.items()}
+    cte_names = set(extract_cte_names(sql))
+
+    aliases = {}
+    for table, alias in extract_table_references(sql):
+        if table.lower() in cte_names:
+            aliases[alias.lower()] = None
+            continue
+        if table.lower() not in known_tables:
+            issues.append(f"Unknown table '{table}'. Available tables: {', '.join(sorted(table_columns))}")
+            continue
+        aliases[alias.lower()] = table.lower()
+        aliases.setdefault(table.lower(), table.lower())
+
+    for qualifier, column in extract_qualified_columns(sql):
+        table = aliases.get(qualifier.lower())
+        if table is None:
+            continue
+        if column.lower() not in known_tables[table]:
+            issues.append(f"Unknown column '{column}' in table '{table}'. Available columns: {', '.join(sorted(known_tables[table]))}")
+    return issues
@@ -0,0 +1,102 @@
+# app/utils/stream_utils.py
+
+import json
+import time
+import hashlib
+from app.config import Config
+from app.models import ColumnarResult
+from app.utils.json_encoder import CustomJSONEncoder
+
+# Internal state that clients have no use for
+SKIPPED_KEYS = {"query_embedding", "visualization_future"}
+
+class _EventEncoder(CustomJSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, ColumnarResult):
+            # Result rows are summarized; the full result is not part of the stream
+            return {"columns": obj.columns, "row_count": len(obj), "rows": obj.to_records(limit=Config.STREAM_PREVIEW_ROWS)}
+        try:
+            return super().default(obj)
+        except TypeError:
+            return str(obj)
+
+def sse_event(event, data, event_id=None):
+    """One Server-Sent Events frame."""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, cls=_EventEncoder)}")
+    return "\n".join(lines) + "\n\n"
+
+class DeltaStream:
+    """
+    Turns LangGraph debug stream events into SSE frames: node_started and node_finished
+    events, the latter carrying only the state keys the node changed. Values whose JSON is
+    larger than STREAM_INLINE_MAX_BYTES are sent once in a payload event and referenced by
+    {"$ref": <hash>} afterwards, e.g. the chart in the final response.
+    """
+
+    def __init__(self, initial_state=None):
+        self.state = dict(initial_state or {})
+        self.inline_max_bytes = Config.STREAM_INLINE_MAX_BYTES
+        self._event_id = 0
+        self._sent_payloads = set()
+        self._started = {}  # task id -> perf_counter at node start
+
+    def event(self, event, data):
+        self._event_id += 1
+        return sse_event(event, data, self._event_id)
+
+    def graph_event(self, debug_event):
+        """SSE frames for one event of graph.stream(..., stream_mode="debug")."""
+        payload = debug_event.get("payload", {})
+        if debug_event.get("type") == "task":
+            self._started[payload["id"]] = time.perf_counter()
+            return [self.event("node_started", {"node": payload["name"], "step": debug_event["step"]})]
+        if debug_event.get("type") != "task_result":
+            return []
+
+        started = self._started.pop(payload["id"], None)
+        changed = {}
+        for key, value in payload.get("result") or []:
+            if key not in SKIPPED_KEYS and not self._unchanged(key, value):
+                changed[key] = value
+            self.state[key] = value
+
+        frames = []
+        data = {"node": payload["name"], "step": debug_event["step"],
+                "seconds": round(time.perf_counter() - started, 3) if started is not None else None,
+                "changed": {key: self._encode(value, frames) for key, value in changed.items()}}
+        if payload.get("error"):
+            data["error"] = str(payload["error"])
+        frames.append(self.event("node_finished", data))
+        return frames
+
+    def final(self, response, **extra):
+        frames = []
+        content = {key: self._encode(value, frames) for key, value in response.items()}
+        frames.append(self.event("final", {"content": content, **extra}))
+        return frames
+
+    def _unchanged(self, key, value):
+        if key not in self.state:
+            return False
+        previous = self.state[key]
+        if previous is value:
+            return True
+        try:
+            return bool(previous == value)
+        except Exception:  # e.g. ambiguous array comparisons
+            return False
+
+    def _encode(self, value, frames):
+        """The value itself, or a reference to it after queueing a one-off payload frame."""
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        serialized = json.dumps(value, cls=_EventEncoder, sort_keys=True)
+        if len(serialized) <= self.inline_max_bytes:
+            return json.loads(serialized)
+        ref = hashlib.sha1(serialized.encode("utf-8")).hexdigest()[:16]
+        if ref not in self._sent_payloads:
+            self._sent_payloads.add(ref)
+            frames.append(self.event("payload", {"ref": ref, "value": json.loads(serialized)}))
+        return {"$ref": ref, "bytes": len(serialized)}
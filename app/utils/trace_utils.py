@@ -0,0 +1,135 @@
+# app/utils/trace_utils.py
+
+import json
+import time
+import itertools
+import random
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+class TraceRecorder:
+    """
+    Per-run span timelines kept in a bounded in-memory ring buffer (oldest runs are
+    dropped first) and optionally appended to a JSONL file, one span per line.
+    Runs that are not sampled record nothing.
+    """
+
+    def __init__(self, max_runs=None, max_spans_per_run=None, sample_rate=None, jsonl_path=None):
+        self.max_runs = Config.TRACE_BUFFER_RUNS if max_runs is None else max_runs
+        self.max_spans_per_run = Config.TRACE_MAX_SPANS_PER_RUN if max_spans_per_run is None else max_spans_per_run
+        self.sample_rate = Config.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.jsonl_path = Config.TRACE_JSONL_PATH if jsonl_path is None else jsonl_path
+        self._runs = OrderedDict()  # run_id -> {"run_id", "started_at", "attributes", "spans", "dropped_spans"}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._file = None
+
+    def start_run(self, run_id, **attributes):
+        """Begin recording a run; returns False when the run is not sampled."""
+        if not Config.TRACE_ENABLED or random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            self._runs[run_id] = {"run_id": run_id, "started_at": time.time(), "attributes": attributes,
+                                  "spans": [], "dropped_spans": 0}
+            while len(self._runs) > self.max_runs:
+                self._runs.popitem(last=False)
+        return True
+
+    def add_span(self, run_id, span):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            if len(run["spans"]) >= self.max_spans_per_run:
+                run["dropped_spans"] += 1
+                return
+            span["offset_ms"] = round((span["start"] - run["started_at"]) * 1000, 2)
+            run["spans"].append(span)
+        if self.jsonl_path:
+            self._write({"run_id": run_id, **span})
+
+    def get_run(self, run_id):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return None
+            spans = sorted(run["spans"], key=lambda span: span["start"])
+        finished_at = max((span["start"] + span["duration_ms"] / 1000 for span in spans), default=run["started_at"])
+        # How often each node ran, e.g. the number of SQL regeneration or correction passes
+        node_runs = {}
+        for span in spans:
+            if span["kind"] == "node":
+                node_runs[span["name"]] = node_runs.get(span["name"], 0) + 1
+        return {**run, "spans": spans, "span_count": len(spans), "node_runs": node_runs,
+                "duration_ms": round((finished_at - run["started_at"]) * 1000, 2)}
+
+    def list_runs(self):
+        with self._lock:
+            return [{"run_id": run_id, "started_at": run["started_at"], "spans": len(run["spans"]), **run["attributes"]}
+                    for run_id, run in reversed(self._runs.items())]
+
+    def _write(self, record):
+        try:
+            line = json.dumps(record, default=str)
+            with self._file_lock:
+                if self._file is None:
+                    self._file = open(self.jsonl_path, "a", encoding="utf-8", buffering=1)
+                self._file.write(line + "\n")
+        except Exception as e:
+            logger.warning(f"Could not write trace span: {str(e)}")
+
+trace_recorder = TraceRecorder()
+
+# (run_id, parent span id) of the sampled run being executed, None when not tracing
+_trace_context = ContextVar("trace_context", default=None)
+_span_ids = itertools.count(1)
+
+@contextmanager
+def start_trace(run_id, **attributes):
+    """Trace the enclosed block as run `run_id`; yields whether the run is sampled."""
+    sampled = trace_recorder.start_run(run_id, **attributes)
+    token = _trace_context.set((run_id, None) if sampled else None)
+    try:
+        yield sampled
+    finally:
+        _trace_context.reset(token)
+
+@contextmanager
+def span(name, kind, **attributes):
+    """Record the enclosed block as a span of the current run (no-op when not sampled)."""
+    context = _trace_context.get()
+    if context is None:
+        yield None
+        return
+
+    run_id, parent_id = context
+    record = {"span_id": next(_span_ids), "parent_id": parent_id, "name": name, "kind": kind,
+              "start": time.time(), "status": "ok", "attributes": attributes}
+    token = _trace_context.set((run_id, record["span_id"]))
+    start_time = time.perf_counter()
+    try:
+        yield record["attributes"]
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start_time) * 1000, 3)
+        _trace_context.reset(token)
+        trace_recorder.add_span(run_id, record)
+
+def record_span(name, kind, start, duration, status="ok", **attributes):
+    """Record an already finished operation (e.g. from callbacks with separate start/end hooks)."""
+    context = _trace_context.get()
+    if context is None:
+        return
+    run_id, parent_id = context
+    trace_recorder.add_span(run_id, {"span_id": next(_span_ids), "parent_id": parent_id, "name": name, "kind": kind,
+                                     "start": start, "duration_ms": round(duration * 1000, 3), "status": status,
+                                     "attributes": attributes})
@@ -0,0 +1,12 @@
+# asgi.py
+from app import create_app
+from app.asgi import create_asgi_app
+from app.config import Config
+
+app = create_asgi_app(create_app(Config))
+
+
+# Example to run (the analysis endpoints then use graph.ainvoke):
+"""
+   uvicorn asgi:app --host 127.0.0.1 --port 5000
+"""
@@ -0,0 +1,70 @@
+# benchmarks/chart_render_benchmark.py
+"""
+Render time and response payload size of each chart output mode, plus the cost of a
+chart cache hit. "png@300" is the previous fixed output.
+
+    python -m benchmarks.chart_render_benchmark --rows 200 --runs 3
+"""
+
+import matplotlib
+matplotlib.use('Agg')
+
+import json
+import time
+import logging
+import argparse
+import statistics
+import numpy as np
+import pandas as pd
+from app.models import ColumnarResult
+from app.services.visualizer_service import create_visualization, render_chart, build_chart_spec
+
+MODES = [("png", 300), ("png", 100), ("jpeg", 100), ("svg", None), ("vega-lite", None)]
+
+def sample_data(rows):
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2024-01-01", periods=rows, freq="D")
+    return {
+        "bar": ColumnarResult.from_columns(["customer", "total"], [[f"customer {i}" for i in range(min(rows, 30))],
+                                                                   rng.uniform(100, 1000, min(rows, 30)).tolist()]),
+        "line": ColumnarResult(["day", "revenue"], [days.values, rng.normal(1000, 150, rows)]),
+    }
+
+def render(mode, dpi, data, chart_type, x_column, y_column):
+    if mode == "vega-lite":
+        return build_chart_spec(data, "benchmark", chart_type, x_column, y_column)
+    return render_chart(data, "benchmark", chart_type, x_column, y_column, image_format=mode, dpi=dpi)
+
+def payload_size(visualization):
+    return len(json.dumps({"format": visualization.format, "image": visualization.image,
+                           "spec": visualization.spec, "description": visualization.description}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="rows of the line chart (the bar chart uses at most 30)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    charts = {"bar": ("customer", "total"), "line": ("day", "revenue")}
+    for chart_type, data in sample_data(args.rows).items():
+        x_column, y_column = charts[chart_type]
+        print(f"{chart_type} chart ({len(data)} rows)")
+        for mode, dpi in MODES:
+            timings = []
+            for _ in range(args.runs):
+                start_time = time.perf_counter()
+                visualization = render(mode, dpi, data, chart_type, x_column, y_column)
+                timings.append(time.perf_counter() - start_time)
+
+            create_visualization(data, "benchmark", chart_type, x_column, y_column, output_format=mode, dpi=dpi)
+            start_time = time.perf_counter()
+            create_visualization(data, "benchmark", chart_type, x_column, y_column, output_format=mode, dpi=dpi)
+            cached = time.perf_counter() - start_time
+
+            label = f"{mode}@{dpi}" if dpi else mode
+            print(f"  {label:10s} render {statistics.median(timings) * 1000:8.1f} ms  "
+                  f"payload {payload_size(visualization) / 1024:8.1f} KB  cache hit {cached * 1000:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/graph_fanout_benchmark.py
+"""
+Critical-path latency of the analysis graph with simulated node latencies.
+
+Every node is replaced by a stub that sleeps for a typical latency of the real node
+(LLM calls, schema load, vector search), so only the graph topology is measured.
+"Serial" is the sum of all node times, i.e. what the previous strict chain took;
+"wall" is the measured end-to-end time with the parallel fan-out.
+
+    python -m benchmarks.graph_fanout_benchmark --runs 5 --scale 0.5
+"""
+
+import time
+import logging
+import asyncio
+import argparse
+from types import SimpleNamespace
+from unittest.mock import patch
+from app.services import graph_service
+from app.utils.metrics_utils import start_request_metrics
+
+# Seconds per node, roughly what the real nodes take against gpt-3.5-turbo
+NODE_LATENCIES = {
+    "db_information": 0.05,
+    "memory_retrieval": 0.12,
+    "analyzer": 0.8,
+    "generator": 1.0,
+    "validator": 0.6,
+    "executor": 0.05,
+    "profiler": 0.01,
+    "evaluator": 0.7,
+    "visualizer": 1.1,
+    "summarizer": 1.4,
+}
+
+def stub(name, update, scale):
+    def node(state):
+        time.sleep(NODE_LATENCIES[name] * scale)
+        return update
+    return node
+
+def build_graph(scale):
+    evaluation = SimpleNamespace(requires_visualization=True, explanation="")
+    search_memory = stub("memory_retrieval", [], scale)
+    memory_service = SimpleNamespace(search_memory=lambda query, embedding=None: search_memory(query))
+    stubs = {
+        "DatabaseService": SimpleNamespace(get_database_info=stub("db_information", {"db_info": {}}, scale)),
+        "query_analyzer_table_selector": stub("analyzer", {"is_query_relevant": True}, scale),
+        "sql_generator_optimizer": stub("generator", {"generated_sql": None}, scale),
+        "sql_validator": stub("validator", {"validation_result": SimpleNamespace(is_sql_valid=True)}, scale),
+        "execute_sql": stub("executor", {"execution_result": None}, scale),
+        "result_profiler": stub("profiler", {"result_profile": None}, scale),
+        "result_evaluator": stub("evaluator", {"is_result_relevant": True, "evaluation_result": evaluation}, scale),
+        "data_visualizer": stub("visualizer", {"visualization": None}, scale),
+        "summarizer_node": stub("summarizer", {"summary": "ok"}, scale),
+    }
+    with patch.multiple(graph_service, **stubs):
+        return graph_service.create_analysis_graph(memory_service)
+
+def initial_state():
+    return {"user_query": "benchmark", "query_embedding": None, "regenerate_list": [], "reanalyze_list": [],
+            "relevant_memories": [], "session_id": "benchmark", "run_id": None}
+
+def run_once(graph, use_async):
+    with start_request_metrics() as request_metrics:
+        start_time = time.perf_counter()
+        if use_async:
+            state = asyncio.run(graph.ainvoke(initial_state()))
+        else:
+            state = graph.invoke(initial_state())
+        wall = time.perf_counter() - start_time
+    serial = sum(entry["seconds"] for entry in request_metrics.summary()["nodes"].values())
+    assert state["summary"] == "ok"
+    return wall, serial
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier applied to all node latencies")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    graph = build_graph(args.scale)
+    for mode, use_async in (("invoke", False), ("ainvoke", True)):
+        results = [run_once(graph, use_async) for _ in range(args.runs)]
+        wall = min(result[0] for result in results)
+        serial = min(result[1] for result in results)
+        print(f"{mode:8s} serial {serial:6.3f}s  wall {wall:6.3f}s  "
+              f"saved {serial - wall:6.3f}s ({(serial - wall) / serial:.0%})")
+
+if __name__ == "__main__":
+    main()
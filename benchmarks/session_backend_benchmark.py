@@ -0,0 +1,70 @@
+# benchmarks/session_backend_benchmark.py
+"""
+Per-request cost of each session backend for the only thing the app keeps in a
+session, the user id: new visitors (session created and stored) and returning
+visitors (session loaded), how many visitors lost their user id along the way,
+and what is left on disk. "filesystem" is the previous backend.
+
+    python -m benchmarks.session_backend_benchmark --visitors 1000 --requests 2
+"""
+
+import os
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import warnings
+from flask import Flask
+from app.services.session_service import SessionService
+from app.utils.session_utils import init_session
+
+BACKENDS = ("filesystem", "sqlite", "cookie")
+
+def create_session_app(session_type, directory):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY="benchmark", SESSION_TYPE=session_type, SESSION_PERMANENT=False,
+                      SESSION_USE_SIGNER=True, SESSION_FILE_DIR=os.path.join(directory, "flask_session"),
+                      SESSION_SQLITE_PATH=os.path.join(directory, "flask_session.db"))
+    init_session(app)
+    app.add_url_rule("/user", "user", SessionService.get_or_create_session)
+    return app
+
+def disk_usage(directory):
+    files = [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names]
+    return len(files), sum(os.path.getsize(path) for path in files)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visitors", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5, help="requests per visitor after the first")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    print(f"{args.visitors} visitors, {args.requests} returning requests each")
+    for session_type in BACKENDS:
+        directory = tempfile.mkdtemp()
+        try:
+            app = create_session_app(session_type, directory)
+            clients = [app.test_client() for _ in range(args.visitors)]
+
+            start_time = time.perf_counter()
+            user_ids = [client.get("/user").data for client in clients]
+            first = (time.perf_counter() - start_time) / args.visitors
+
+            start_time = time.perf_counter()
+            for _ in range(args.requests):
+                for client in clients:
+                    client.get("/user")
+            returning = (time.perf_counter() - start_time) / (args.visitors * args.requests)
+            lost = sum(client.get("/user").data != user_id for client, user_id in zip(clients, user_ids))
+
+            files, size = disk_usage(directory)
+            print(f"  {session_type:10s} new {first * 1000:6.3f} ms  returning {returning * 1000:6.3f} ms  "
+                  f"{lost:6d} lost  {files:6d} files  {size / 1024:8.1f} KB")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
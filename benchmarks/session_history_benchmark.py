@@ -0,0 +1,86 @@
+# benchmarks/session_history_benchmark.py
+"""
+Session history at scale: latest-turns lookup with and without the
+(session_id, timestamp) index and from the recent-turns cache, and inserts
+committed one by one (the previous behaviour) against batched commits.
+
+    python -m benchmarks.session_history_benchmark --rows 1000000 --sessions 50000
+"""
+
+import os
+import time
+import random
+import logging
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import insert, text
+from app.models import db, SessionHistory
+from app.services.session_service import SessionHistoryStore
+
+def fill(rows, sessions):
+    start = datetime(2024, 1, 1)
+    for offset in range(0, rows, 50000):
+        db.session.execute(insert(SessionHistory), [
+            {"session_id": f"session-{i % sessions}", "run_id": f"run-{i}", "query": f"query {i}",
+             "response": f"response {i}", "timestamp": start + timedelta(seconds=i)}
+            for i in range(offset, min(offset + 50000, rows))
+        ])
+    db.session.commit()
+
+def time_lookups(store, session_ids):
+    timings = []
+    for session_id in session_ids:
+        start_time = time.perf_counter()
+        store.recent(session_id, 10)
+        timings.append(time.perf_counter() - start_time)
+    return statistics.median(timings) * 1000
+
+def time_inserts(store, count):
+    start_time = time.perf_counter()
+    for i in range(count):
+        store.add(f"session-{i}", f"new-run-{i}", "query", "response")
+    store.flush()
+    return (time.perf_counter() - start_time) * 1000 / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=50)
+    parser.add_argument("--inserts", type=int, default=500)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(directory, 'history.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            fill(args.rows, args.sessions)
+            session_ids = [f"session-{random.randrange(args.sessions)}" for _ in range(args.lookups)]
+            uncached = SessionHistoryStore(cache_sessions=0, write_behind=False)
+            uncached.init_app(app)
+            print(f"{args.rows} rows, {args.sessions} sessions")
+
+            db.session.execute(text("DROP INDEX ix_session_history_session_id_timestamp"))
+            print(f"  lookup, no index      {time_lookups(uncached, session_ids):8.3f} ms")
+            db.session.execute(text("CREATE INDEX ix_session_history_session_id_timestamp "
+                                    "ON session_history (session_id, timestamp)"))
+            print(f"  lookup, index         {time_lookups(uncached, session_ids):8.3f} ms")
+            cached = SessionHistoryStore(write_behind=False)
+            cached.init_app(app)
+            time_lookups(cached, session_ids)
+            print(f"  lookup, cached        {time_lookups(cached, session_ids):8.3f} ms")
+
+            print(f"  insert, commit each   {time_inserts(uncached, args.inserts):8.3f} ms/row")
+            batched = SessionHistoryStore(write_behind=True, flush_interval=60)
+            batched.init_app(app)
+            print(f"  insert, batched       {time_inserts(batched, args.inserts):8.3f} ms/row")
+            batched.close()
+
+if __name__ == "__main__":
+    main()
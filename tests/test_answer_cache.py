@@ -0,0 +1,74 @@
+# tests/test_answer_cache.py
+
+import unittest
+from unittest.mock import patch
+from app.services.answer_cache_service import AnswerCache, normalize_query
+
+class TestAnswerCache(unittest.TestCase):
+    def setUp(self):
+        self.version = ("schema-1", "data-1")
+        self.cache = AnswerCache(ttl=60, max_entries=2, similarity_threshold=0.9, similarity_enabled=True,
+                                 version_provider=lambda: self.version)
+        self.response = {"summary": "Alice, Bob and Carol", "visualization": None}
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("Top FIVE customers, by order total?"), "top 5 customers by order total")
+
+    def test_exact_hit_on_reworded_punctuation(self):
+        self.cache.store("Top 5 customers by order total", self.response)
+        response, tier = self.cache.lookup("top five customers by order total?")
+        self.assertEqual(tier, "exact")
+        self.assertEqual(response, self.response)
+
+    def test_similarity_hit_requires_matching_numbers(self):
+        self.cache.store("top 5 customers by order total", self.response, embedding=[1.0, 0.0])
+        response, tier = self.cache.lookup("top 5 customers by total order amount", embedding=[0.99, 0.05])
+        self.assertEqual(tier, "similar")
+
+        response, tier = self.cache.lookup("top 10 customers by total order amount", embedding=[0.99, 0.05])
+        self.assertIsNone(response)
+        self.assertEqual(self.cache.get_stats()["misses"], 1)
+
+    def test_similarity_hit_requires_matching_names_and_quoted_values(self):
+        self.cache.store("Top 5 customers in France", self.response, embedding=[1.0, 0.0])
+        self.assertEqual(self.cache.lookup("Top 5 customers in Germany", embedding=[0.99, 0.05]), (None, None))
+        self.assertEqual(self.cache.lookup("Top 5 buyers in France", embedding=[0.99, 0.05])[1], "similar")
+
+        self.cache.store("revenue of 'Widget A' by month", self.response, embedding=[0.0, 1.0])
+        self.assertEqual(self.cache.lookup("revenue of 'Widget B' by month", embedding=[0.05, 0.99]), (None, None))
+
+    def test_similarity_tier_can_be_disabled(self):
+        cache = AnswerCache(similarity_threshold=0.9, similarity_enabled=False, version_provider=lambda: self.version)
+        cache.store("top 5 customers by order total", self.response, embedding=[1.0, 0.0])
+        self.assertEqual(cache.lookup("top 5 customers by total order amount", embedding=[0.99, 0.05]), (None, None))
+        self.assertEqual(cache.lookup("Top 5 customers by order total!")[1], "exact")
+
+    def test_data_version_change_invalidates(self):
+        self.cache.store("how many orders", self.response)
+        self.version = ("schema-1", "data-2")
+        response, _ = self.cache.lookup("how many orders")
+        self.assertIsNone(response)
+        self.assertEqual(self.cache.get_stats()["invalidations"], 1)
+
+    def test_ttl_expiry(self):
+        with patch("app.services.answer_cache_service.time.time", return_value=1000):
+            self.cache.store("first question", self.response)
+        self.cache.store("second question", self.response)
+
+        self.assertEqual(self.cache.lookup("first question"), (None, None))
+        self.assertEqual(self.cache.lookup("second question")[1], "exact")
+
+    def test_size_bounded_eviction(self):
+        for question in ("first question", "second question", "third question"):
+            self.cache.store(question, self.response)
+        self.assertEqual(self.cache.get_stats()["evictions"], 1)
+        self.assertEqual(self.cache.lookup("first question"), (None, None))
+        self.assertEqual(self.cache.lookup("third question")[1], "exact")
+
+    def test_unknown_data_version_disables_cache(self):
+        self.version = ("schema-1", None)
+        self.cache.store("how many orders", self.response)
+        self.assertEqual(self.cache.lookup("how many orders"), (None, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+# tests/test_async_serving.py
+
+import json
+import asyncio
+import threading
+import unittest
+from typing import Any, Optional, TypedDict
+from types import SimpleNamespace
+from unittest.mock import patch
+from flask import Flask, Response
+from langgraph.graph import StateGraph, START, END
+from app import asgi, routes
+from app.asgi import AsgiApp
+from app.utils import llm_utils
+from app.utils.llm_utils import llm_node, ainvoke_llm
+from app.utils.metrics_utils import instrument_node
+
+class FakeChain:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    async def ainvoke(self, inputs):
+        with self._lock:
+            self.threads.add(threading.current_thread().name)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if inputs["query"] == "fail":
+            raise ValueError("LLM error")
+        return f"async:{inputs['query']}"
+
+def make_node(chain):
+    @llm_node
+    async def node(state):
+        try:
+            state["answer"] = await ainvoke_llm(chain, {"query": state["query"]})
+        except ValueError as e:
+            state["answer"] = f"fallback: {e}"
+        return state
+    return node
+
+async def call_asgi(app, method, path, body=b"", headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": method, "path": path, "query_string": b"", "headers": list(headers)}, receive, send)
+    return messages
+
+class TestAsyncServing(unittest.TestCase):
+    def test_llm_node_runs_under_invoke_and_ainvoke(self):
+        chain = FakeChain()
+        node = instrument_node("analyzer", make_node(chain))
+        self.assertEqual(node.invoke({"query": "q"})["answer"], "async:q")
+        self.assertEqual(chain.threads, {"llm-event-loop"})
+        self.assertEqual(asyncio.run(node.ainvoke({"query": "q"}))["answer"], "async:q")
+        self.assertEqual(asyncio.run(node.ainvoke({"query": "fail"}))["answer"], "fallback: LLM error")
+        self.assertIn(threading.main_thread().name, chain.threads)
+
+    def test_http_clients_are_per_event_loop(self):
+        async def client_and_close():
+            client = llm_utils.get_async_http_client()
+            self.assertIs(llm_utils.get_async_http_client(), client)
+            await llm_utils.close_async_http_client()
+            self.assertTrue(client.is_closed)
+            self.assertIsNot(llm_utils.get_async_http_client(), client)
+            await llm_utils.close_async_http_client()
+            return client
+
+        self.assertIsNot(asyncio.run(client_and_close()), asyncio.run(client_and_close()))
+
+    def test_concurrent_llm_calls_are_bounded(self):
+        chain = FakeChain(delay=0.01)
+        node = make_node(chain)
+
+        async def run_all():
+            return await asyncio.gather(*(node.afunc({"query": str(i)}) for i in range(10)))
+
+        with patch.object(llm_utils.Config, "LLM_MAX_CONCURRENCY", 3), patch.object(llm_utils, "_llm_slots", None):
+            results = asyncio.run(run_all())
+        self.assertEqual([state["answer"] for state in results], [f"async:{i}" for i in range(10)])
+        self.assertEqual(chain.peak, 3)
+
+    def test_limit_is_shared_by_both_event_loops(self):
+        chain = FakeChain(delay=0.02)
+        node = make_node(chain)
+
+        async def run_all():
+            return await asyncio.gather(*(node.afunc({"query": str(i)}) for i in range(6)))
+
+        results = {}
+        with patch.object(llm_utils.Config, "LLM_MAX_CONCURRENCY", 3), patch.object(llm_utils, "_llm_slots", None):
+            # A serving loop (graph.ainvoke) and the background loop (graph.invoke) at the same time
+            serving = threading.Thread(target=lambda: results.setdefault("serving", asyncio.run(run_all())))
+            serving.start()
+            results["background"] = llm_utils.run_on_llm_loop(run_all())
+            serving.join()
+        self.assertEqual(len(results["serving"]) + len(results["background"]), 12)
+        self.assertEqual(chain.peak, 3)
+        self.assertIn("llm-event-loop", chain.threads)
+        self.assertEqual(len(chain.threads), 2)
+
+    def test_other_routes_are_bridged_to_wsgi(self):
+        flask_app = Flask(__name__)
+
+        @flask_app.route("/export")
+        def export():
+            return Response((chunk for chunk in ["a", "b"]), content_type="text/plain")
+
+        messages = asyncio.run(call_asgi(AsgiApp(flask_app, worker_threads=2), "GET", "/export"))
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/plain"), messages[0]["headers"])
+        self.assertEqual(b"".join(message.get("body", b"") for message in messages[1:]), b"ab")
+        self.assertFalse(messages[-1]["more_body"])
+
+class State(TypedDict, total=False):
+    user_query: str
+    query_embedding: Optional[Any]
+    session_id: str
+    run_id: str
+    summary: Optional[str]
+    visualization: Optional[Any]
+    execution_result: Optional[Any]
+
+class TestAsyncAnalyze(unittest.TestCase):
+    """POST /analyze through the ASGI app: prepare, graph.ainvoke with an LLM node, complete."""
+
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config.update(SECRET_KEY="test", TESTING=True)
+        self.flask_app.register_blueprint(routes.main_bp)
+        self.flask_app.answer_cache = None
+        self.chain = FakeChain()
+        self.history = []
+        session_service = SimpleNamespace(
+            get_or_create_session=lambda: "session-1",
+            create_run=lambda: "run-1",
+            add_to_session_history=lambda **entry: self.history.append(entry))
+        self.patches = [patch.object(asgi, "SessionService", session_service),
+                        patch.object(routes, "SessionService", session_service),
+                        patch.object(routes, "memory_service", None),
+                        patch.object(asgi, "get_analysis_graph", return_value=self.build_graph())]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+
+    def build_graph(self):
+        chain = self.chain
+
+        @llm_node
+        async def summarize(state):
+            return {"summary": await ainvoke_llm(chain, {"query": state["user_query"]})}
+
+        graph = StateGraph(State)
+        graph.add_node("summarize", instrument_node("summarizer", summarize))
+        graph.add_edge(START, "summarize")
+        graph.add_edge("summarize", END)
+        return graph.compile()
+
+    def post(self, payload, path="/analyze"):
+        body = json.dumps(payload).encode()
+        return asyncio.run(call_asgi(AsgiApp(self.flask_app, worker_threads=2), "POST", path, body,
+                                     headers=[(b"content-type", b"application/json")]))
+
+    def test_analyze_runs_the_graph_on_the_serving_loop(self):
+        messages = self.post({"query": "sales by month"})
+        self.assertEqual(messages[0]["status"], 200)
+        headers = dict(messages[0]["headers"])
+        self.assertIn(b"summarizer;dur=", headers[b"server-timing"])
+        self.assertEqual(json.loads(messages[1]["body"]), {"summary": "async:sales by month", "visualization": None})
+        self.assertEqual(self.chain.threads, {threading.main_thread().name})
+        self.assertEqual(self.history, [{"session_id": "session-1", "run_id": "run-1",
+                                         "query": "sales by month", "response": "async:sales by month"}])
+
+    def test_graph_errors_become_500(self):
+        messages = self.post({"query": "fail"})
+        self.assertEqual(messages[0]["status"], 500)
+        self.assertIn("LLM error", json.loads(messages[1]["body"])["error"])
+
+    def test_stream_runs_astream_on_the_serving_loop(self):
+        messages = self.post({"query": "sales by month"}, path="/stream")
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertEqual(dict(messages[0]["headers"])[b"content-type"], b"text/event-stream")
+        # One body message per SSE frame, sent as the graph runs
+        frames = [message["body"].decode() for message in messages[1:] if message["body"]]
+        events = [dict(line.split(": ", 1) for line in frame.strip().split("\n")) for frame in frames]
+        self.assertEqual([event["event"] for event in events], ["run_started", "node_started", "node_finished", "final"])
+        self.assertEqual(json.loads(events[-1]["data"])["content"]["summary"], "async:sales by month")
+        self.assertFalse(messages[-1]["more_body"])
+        self.assertEqual(self.chain.threads, {threading.main_thread().name})
+        self.assertEqual(len(self.history), 1)
+
+    def test_stream_without_query_is_rejected(self):
+        messages = self.post({}, path="/stream")
+        self.assertEqual(messages[0]["status"], 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# tests/test_batch.py
+
+import json
+import time
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from flask import Flask, current_app
+from app import routes
+from app.utils import trace_utils
+from app.utils.metrics_utils import RequestMetrics, instrument_node
+from app.utils.trace_utils import TraceRecorder
+
+class FakeAnalysis:
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, app, user_query):
+        with self.lock:
+            self.calls.append(user_query)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delays.get(user_query, 0.01))
+        with self.lock:
+            self.in_flight -= 1
+        if user_query == "fail":
+            raise RuntimeError("graph error")
+        return {"summary": f"answer to {user_query}", "visualization": None}, RequestMetrics()
+
+class TestBatchEndpoint(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.config.update(SECRET_KEY="test", TESTING=True)
+        app.register_blueprint(routes.main_bp)
+        self.client = app.test_client()
+        self.patches = [patch.object(routes, 'get_analysis_graph'),
+                        patch.object(routes.DatabaseService, 'get_schema')]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+
+    def post(self, analysis, payload):
+        with patch.object(routes, 'run_analysis', analysis):
+            response = self.client.post('/batch', json=payload)
+            lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        return response, lines
+
+    def test_duplicates_run_once(self):
+        analysis = FakeAnalysis()
+        response, lines = self.post(analysis, {"queries": ["sales by month", "top customers", " sales by month"]})
+        self.assertEqual(response.content_type, "application/x-ndjson")
+        self.assertEqual(sorted(analysis.calls), ["sales by month", "top customers"])
+        results = {line["query"]: line for line in lines if line["type"] == "result"}
+        self.assertEqual(results["sales by month"]["indices"], [0, 2])
+        self.assertEqual(results["top customers"]["content"]["summary"], "answer to top customers")
+        self.assertEqual(lines[-1]["type"], "summary")
+        self.assertEqual((lines[-1]["queries"], lines[-1]["unique"], lines[-1]["failed"]), (3, 2, 0))
+
+    def test_results_stream_in_completion_order(self):
+        analysis = FakeAnalysis(delays={"slow": 0.3, "fast": 0.01})
+        _, lines = self.post(analysis, {"queries": ["slow", "fast"], "concurrency": 2})
+        self.assertEqual([line["query"] for line in lines[:-1]], ["fast", "slow"])
+
+    def test_concurrency_is_bounded(self):
+        analysis = FakeAnalysis()
+        _, lines = self.post(analysis, {"queries": [f"question {i}" for i in range(12)], "concurrency": 3})
+        self.assertEqual(len(lines), 13)
+        self.assertEqual(analysis.peak, 3)
+
+    def test_failures_are_reported_per_question(self):
+        _, lines = self.post(FakeAnalysis(), {"queries": ["fail", "ok"]})
+        errors = [line for line in lines if line["type"] == "error"]
+        self.assertEqual([(line["query"], line["content"]) for line in errors], [("fail", "graph error")])
+        self.assertEqual(lines[-1]["failed"], 1)
+
+    def test_invalid_batches_are_rejected(self):
+        for payload in ({}, {"queries": []}, {"queries": ["ok", ""]}, {"queries": "ok"},
+                        {"queries": ["ok"], "concurrency": "many"}):
+            response, _ = self.post(FakeAnalysis(), payload)
+            self.assertEqual(response.status_code, 400)
+
+class FakeGraph:
+    def __init__(self):
+        self.states = []
+
+    def invoke(self, state):
+        assert current_app.name == "batch-test"  # the worker thread runs inside the app context
+        self.states.append(state)
+        summarizer = instrument_node("summarizer", lambda state: {**state, "summary": f"answer to {state['user_query']}"})
+        return summarizer.invoke(state)
+
+class TestBatchWorker(unittest.TestCase):
+    """The real run_analysis worker: app context, prepare/complete and tracing in batch threads."""
+
+    def setUp(self):
+        app = Flask("batch-test")
+        app.config.update(SECRET_KEY="test", TESTING=True)
+        app.register_blueprint(routes.main_bp)
+        app.answer_cache = None
+        self.client = app.test_client()
+        self.graph = FakeGraph()
+        self.history = []
+        self.recorder = TraceRecorder(max_runs=10, max_spans_per_run=10, sample_rate=1.0)
+        session_service = SimpleNamespace(
+            create_run=routes.SessionService.create_run,
+            add_to_session_history=lambda **entry: self.history.append(entry))
+        self.patches = [patch.object(routes, 'get_analysis_graph', return_value=self.graph),
+                        patch.object(routes.DatabaseService, 'get_schema'),
+                        patch.object(routes, 'SessionService', session_service),
+                        patch.object(routes, 'memory_service', None),
+                        patch.object(trace_utils, 'trace_recorder', self.recorder)]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+
+    def test_each_question_runs_in_its_own_session(self):
+        response = self.client.post('/batch', json={"queries": ["sales by month", "top customers"], "concurrency": 2})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(lines[-1]["failed"], 0)
+        self.assertEqual({line["content"]["summary"] for line in lines[:-1]},
+                         {"answer to sales by month", "answer to top customers"})
+
+        sessions = {state["user_query"]: (state["session_id"], state["run_id"]) for state in self.graph.states}
+        self.assertEqual(len({session_id for session_id, _ in sessions.values()}), 2)
+        for session_id, run_id in sessions.values():
+            self.assertEqual(session_id, f"batch-{run_id}")
+        self.assertEqual({(entry["query"], entry["session_id"]) for entry in self.history},
+                         {(query, session_id) for query, (session_id, _) in sessions.items()})
+
+        # Every line carries the node metrics of its own question; the summary adds them up
+        for line in lines[:-1]:
+            self.assertEqual(line["metrics"]["nodes"]["summarizer"]["runs"], 1)
+        self.assertEqual(lines[-1]["metrics"]["nodes"]["summarizer"]["runs"], 2)
+
+        # Every question is traced under its own run id
+        for query, (_, run_id) in sessions.items():
+            self.assertEqual(self.recorder.get_run(run_id)["attributes"], {"endpoint": "batch", "query": query})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+# tests/test_chart_renderer.py
+
+import time
+import unittest
+from app.models import ColumnarResult
+from app.services.chart_renderer_service import ChartRenderer, _render
+
+class TestChartRenderer(unittest.TestCase):
+    def test_renders_in_worker_process(self):
+        renderer = ChartRenderer(workers=1, timeout=60, memory_limit_mb=512, enabled=True, warm_up=False)
+        try:
+            data = ColumnarResult.from_columns(["customer", "total"], [["Ann", "Bob"], [3.0, 4.0]])
+            visualization = renderer.submit(_render, data, "q", "bar", "customer", "total", image_format="svg", dpi=50).result()
+            self.assertEqual(visualization.format, "svg")
+            self.assertEqual(renderer.get_stats()["renders"], 1)
+        finally:
+            renderer.shutdown()
+
+    def test_timeout_degrades_to_no_chart_and_replaces_the_pool(self):
+        renderer = ChartRenderer(workers=1, timeout=3, memory_limit_mb=0, enabled=True, warm_up=False)
+        try:
+            start_time = time.monotonic()
+            self.assertIsNone(renderer.submit(time.sleep, 30).result(timeout=20))
+            self.assertLess(time.monotonic() - start_time, 20)
+            self.assertEqual((renderer.get_stats()["timeouts"], renderer.get_stats()["restarts"]), (1, 1))
+            # The replacement pool keeps serving
+            renderer.start()
+            self.assertEqual(renderer.submit(max, 1, 2).result(timeout=30), 2)
+        finally:
+            renderer.shutdown()
+
+    def test_failures_degrade_to_no_chart_inline(self):
+        renderer = ChartRenderer(enabled=False)
+        self.assertIsNone(renderer.submit(int, "not a number").result())
+        self.assertEqual(renderer.get_stats()["failures"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# tests/test_database_service.py
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from app import routes
+from app.services.database_service import DatabaseService
+from app.utils.db_utils import dispose_engine
+
+class TestSchemaCache(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.database_url = f"sqlite:///{self.db_path}"
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT)")
+
+    def tearDown(self):
+        DatabaseService._schema_cache.pop(self.database_url, None)
+        dispose_engine(self.database_url)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    def test_schema_is_loaded_once(self):
+        with patch.object(DatabaseService, '_load_schema', wraps=DatabaseService._load_schema) as mock_load:
+            first = DatabaseService.get_schema(self.database_url)
+            second = DatabaseService.get_schema(self.database_url)
+        self.assertEqual(mock_load.call_count, 1)
+        self.assertEqual(list(first), ['customers'])
+        self.assertEqual(first['customers'].table_schema.columns, second['customers'].table_schema.columns)
+
+    def test_schema_change_invalidates_cache(self):
+        fingerprint = DatabaseService.get_schema_fingerprint(self.database_url)
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER)")
+
+        schema = DatabaseService.get_schema(self.database_url)
+        self.assertIn('orders', schema)
+        self.assertNotEqual(DatabaseService.get_schema_fingerprint(self.database_url), fingerprint)
+
+    def test_fingerprint_follows_schema_changes(self):
+        fingerprint = DatabaseService.get_schema_fingerprint(self.database_url)
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("ALTER TABLE customers ADD COLUMN email TEXT")
+        # No get_schema call in between: the fingerprint alone must notice the change
+        self.assertNotEqual(DatabaseService.get_schema_fingerprint(self.database_url), fingerprint)
+
+    def test_refresh_forces_reload(self):
+        DatabaseService.get_schema(self.database_url)
+        with patch.object(DatabaseService, '_load_schema', wraps=DatabaseService._load_schema) as mock_load:
+            stats = DatabaseService.refresh_schema_cache(self.database_url)
+        self.assertEqual(mock_load.call_count, 1)
+        self.assertEqual(stats[self.database_url]['tables'], 1)
+
+class TestSchemaRefreshEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(SECRET_KEY="test", TESTING=True, ADMIN_TOKEN="")
+        self.app.register_blueprint(routes.main_bp)
+        self.client = self.app.test_client()
+
+    def refresh(self, **headers):
+        with patch.object(routes.DatabaseService, 'refresh_schema_cache', return_value={}) as mock_refresh:
+            response = self.client.post('/admin/schema/refresh', headers=headers)
+        return response.status_code, mock_refresh.call_count
+
+    def test_requires_admin_token(self):
+        self.assertEqual(self.refresh(), (403, 0))
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        self.assertEqual(self.refresh(), (403, 0))
+        self.assertEqual(self.refresh(**{"X-Admin-Token": "wrong"}), (403, 0))
+        self.assertEqual(self.refresh(**{"X-Admin-Token": "secret"}), (200, 1))
+
+    def test_open_in_debug_mode_without_token(self):
+        self.app.debug = True
+        self.assertEqual(self.refresh(), (200, 1))
+
+    def test_cache_clear_covers_every_cache(self):
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        self.app.answer_cache = None
+        with patch.object(routes.result_cache, 'clear') as clear_results, \
+                patch.object(routes.chart_cache, 'clear') as clear_charts:
+            self.assertEqual(self.client.post('/admin/cache/clear').status_code, 403)
+            response = self.client.post('/admin/cache/clear', headers={"X-Admin-Token": "secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((clear_results.call_count, clear_charts.call_count), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# tests/test_db_utils.py
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.config import Config
+from app.utils.db_utils import get_engine, dispose_engine, get_pool_metrics
+
+class TestEngineRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database_url = f"sqlite:///{os.path.join(self.directory, 'test.db')}"
+        with get_engine(self.database_url).begin() as connection:
+            connection.execute(text("PRAGMA query_only=OFF"))
+            connection.execute(text("CREATE TABLE orders (order_id INTEGER PRIMARY KEY)"))
+        dispose_engine(self.database_url)
+
+    def tearDown(self):
+        dispose_engine(self.database_url)
+        shutil.rmtree(self.directory)
+
+    def pragma(self, name):
+        with get_engine(self.database_url).connect() as connection:
+            return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+    def test_one_engine_per_url(self):
+        engine = get_engine(self.database_url)
+        self.assertIs(get_engine(self.database_url), engine)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        stats = get_pool_metrics()[self.database_url]
+        self.assertEqual((stats["connections_opened"], stats["checkouts"]), (1, 2))
+
+        dispose_engine(self.database_url)
+        self.assertNotIn(self.database_url, get_pool_metrics())
+        self.assertIsNot(get_engine(self.database_url), engine)
+
+    def test_counters_under_concurrent_checkouts(self):
+        engine = get_engine(self.database_url)
+
+        def checkouts():
+            for _ in range(200):
+                with engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+
+        threads = [threading.Thread(target=checkouts) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(get_pool_metrics()[self.database_url]["checkouts"], 800)
+
+    def test_sqlite_pragmas(self):
+        with patch.object(Config, 'SQLITE_MMAP_SIZE', 1024 * 1024), patch.object(Config, 'SQLITE_CACHE_SIZE', -1024):
+            self.assertEqual((self.pragma("mmap_size"), self.pragma("cache_size")), (1024 * 1024, -1024))
+        # WAL is opt-in, so the database file is left in rollback-journal mode
+        self.assertEqual(self.pragma("journal_mode"), "delete")
+        self.assertEqual(sorted(os.listdir(self.directory)), ["test.db"])
+
+    def test_wal_when_enabled(self):
+        with patch.object(Config, 'SQLITE_WAL', True):
+            self.assertEqual(self.pragma("journal_mode"), "wal")
+
+    def test_read_only_sessions(self):
+        with patch.object(Config, 'DB_READ_ONLY', True):
+            with get_engine(self.database_url).connect() as connection:
+                self.assertEqual(connection.execute(text("SELECT COUNT(*) FROM orders")).scalar(), 0)
+                with self.assertRaises(OperationalError):
+                    connection.execute(text("INSERT INTO orders (order_id) VALUES (1)"))
+
+    def test_writable_when_read_only_is_off(self):
+        with patch.object(Config, 'DB_READ_ONLY', False):
+            with get_engine(self.database_url).begin() as connection:
+                connection.execute(text("INSERT INTO orders (order_id) VALUES (1)"))
+        self.assertEqual(self.pragma("query_only"), 0)
+
+if __name__ == '__main__':
+    unittest.main()
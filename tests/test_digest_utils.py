@@ -0,0 +1,65 @@
+# tests/test_digest_utils.py
+
+import json
+import unittest
+from app.models import ColumnarResult, SQLExecutionResult
+from app.services.result_profiler_service import profile_result
+from app.utils.digest_utils import build_result_digest, main_measure
+from app.utils.llm_utils import count_tokens
+
+class TestResultDigest(unittest.TestCase):
+    def make_result(self, rows, **kwargs):
+        data = ColumnarResult.from_records(rows)
+        return SQLExecutionResult(success=True, data=data, row_count=len(data), **kwargs)
+
+    def test_small_result_is_passed_whole(self):
+        result = self.make_result([{"name": "Alice", "total": 10.5}, {"name": "Bob", "total": None}])
+        digest = json.loads(build_result_digest(result, profile_result(result), token_budget=500))
+        self.assertEqual(digest["rows"][1], {"name": "Bob", "total": None})
+        self.assertEqual(digest["columns"][1]["nulls"], 1)
+        self.assertEqual(digest["columns"][1]["mean"], 10.5)
+        self.assertEqual((digest["total_row_count"], digest["sums"]), (2, {"total": 10.5}))
+        self.assertNotIn("notes", digest)
+
+    def test_large_result_stays_under_budget(self):
+        rows = [{"customer_id": i, "city": f"City {i % 7}", "revenue": float(i * 3 % 1000)} for i in range(5000)]
+        result = self.make_result(rows, truncated=True, total_row_count=12000)
+        text = build_result_digest(result, profile_result(result), token_budget=400, sample_rows=5)
+        self.assertLessEqual(count_tokens(text), 400)
+
+        digest = json.loads(text)
+        self.assertNotIn("rows", digest)
+        self.assertEqual(digest["total_row_count"], 12000)
+        self.assertEqual(digest["top_by"], "revenue")
+        self.assertEqual(digest["top"][0]["revenue"], 999.0)
+        self.assertEqual(digest["columns"][1]["distinct"], 7)
+        self.assertEqual(digest["sums"], {"revenue": sum(row["revenue"] for row in rows)})
+        self.assertTrue(digest["notes"][0].startswith("Only the first 5000 of 12000 rows were fetched"))
+
+    def test_uncounted_truncated_result(self):
+        rows = [{"order_id": i, "quantity": i % 3} for i in range(100)]
+        result = self.make_result(rows, truncated=True)
+        profile = profile_result(result, sample_rows=10)
+        digest = json.loads(build_result_digest(result, profile, token_budget=2000, sample_rows=2))
+        self.assertIsNone(digest["total_row_count"])
+        self.assertEqual(digest["sums"], {"quantity": 99})
+        self.assertEqual(digest["notes"], [
+            "Only the first 100 of an unknown number of rows were fetched; statistics, sums and rows cover the fetched rows only",
+            "Column statistics are computed on a sample of 10 of 100 rows"
+        ])
+
+    def test_tiny_budget_keeps_valid_json(self):
+        rows = [{f"column_{i}": f"value {i}" for i in range(30)} for _ in range(50)]
+        result = self.make_result(rows)
+        profile = profile_result(result)
+        for budget in (200, 60, 1):
+            digest = json.loads(build_result_digest(result, profile, token_budget=budget, sample_rows=3))
+            self.assertEqual((digest["row_count"], digest["truncated"]), (50, True))
+        self.assertNotIn("columns", digest)
+
+    def test_main_measure_skips_identifiers(self):
+        result = self.make_result([{"order_id": 1, "product_id": 2, "quantity": 3}])
+        self.assertEqual(main_measure(result.data.to_frame()), "quantity")
+
+if __name__ == '__main__':
+    unittest.main()
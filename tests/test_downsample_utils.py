@@ -0,0 +1,94 @@
+# tests/test_downsample_utils.py
+
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from app.config import Config
+from app.utils.downsample_utils import lttb, minmax_decimate, top_n_with_other, reduce_for_chart, describe_reduction
+
+class TestDownsampleUtils(unittest.TestCase):
+    def test_lttb_keeps_end_points_and_peaks(self):
+        x = np.arange(10000, dtype=float)
+        y = np.sin(x / 500)
+        y[4321] = 50.0  # a spike LTTB must not drop
+        picked = lttb(x, y, 200)
+        self.assertEqual(len(picked), 200)
+        self.assertEqual((picked[0], picked[-1]), (0, 9999))
+        self.assertIn(4321, picked)
+        self.assertTrue(np.all(np.diff(picked) > 0))
+
+    def test_minmax_keeps_extremes(self):
+        y = np.random.default_rng(0).normal(size=10000)
+        picked = minmax_decimate(y, 100)
+        self.assertLessEqual(len(picked), 102)
+        self.assertIn(int(np.argmax(y)), picked)
+        self.assertIn(int(np.argmin(y)), picked)
+
+    def test_top_n_with_other(self):
+        labels, totals = top_n_with_other(np.array(["a", "b", "c", "a", "d"]), np.array([5, 4, 1, 5, 2]), 2)
+        self.assertEqual(labels, ["a", "b", "Other"])
+        self.assertEqual(totals.tolist(), [10.0, 4.0, 3.0])
+
+    def test_real_other_category_is_not_duplicated(self):
+        labels, totals = top_n_with_other(np.array(["Other", "b", "c", "d"]), np.array([9, 4, 1, 2]), 2)
+        self.assertEqual(labels, ["Other", "b", "Other (2 more)"])
+        self.assertEqual(totals.tolist(), [9.0, 4.0, 3.0])
+
+    def test_small_results_are_untouched(self):
+        df = pd.DataFrame({"x": range(10), "y": range(10)})
+        for chart_type in ("line", "scatter", "bar", "histogram", "heatmap"):
+            frame, reduction = reduce_for_chart(df, chart_type, "x", "y")
+            self.assertIs(frame, df)
+            self.assertIsNone(reduction)
+        self.assertEqual(describe_reduction(None), "")
+
+    def test_line_downsampling_keeps_time_order(self):
+        days = pd.date_range("2020-01-01", periods=5000, freq="h", tz="UTC")
+        df = pd.DataFrame({"day": days[::-1], "revenue": np.arange(5000.0)})
+        frame, reduction = reduce_for_chart(df, "line", "day", "revenue", max_points=500)
+        self.assertEqual(len(frame), 500)
+        self.assertEqual((reduction["rows"], reduction["points"]), (5000, 500))
+        self.assertTrue(frame["day"].is_monotonic_increasing)
+        self.assertEqual(str(frame["day"].dt.tz), "UTC")
+
+    def test_scatter_binning_preserves_row_count(self):
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({"price": rng.normal(size=20000), "quantity": rng.normal(size=20000)})
+        with patch.object(Config, 'CHART_SCATTER_BINS', 20):
+            frame, reduction = reduce_for_chart(df, "scatter", "price", "quantity", max_points=1000)
+        self.assertEqual(reduction["method"], "binned_2d")
+        self.assertLessEqual(len(frame), 400)
+        self.assertEqual(frame[reduction["weights"]].sum(), 20000)
+
+    def test_histogram_is_prebinned(self):
+        df = pd.DataFrame({"amount": np.random.default_rng(2).uniform(0, 100, 5000)})
+        with patch.object(Config, 'CHART_HISTOGRAM_BINS', 10):
+            frame, reduction = reduce_for_chart(df, "histogram", "amount", max_points=1000)
+        self.assertEqual(len(frame), 10)
+        self.assertEqual(list(frame.columns), ["amount", "amount_end", "points"])
+        self.assertEqual(frame["points"].sum(), 5000)
+        self.assertEqual(frame["amount_end"].iloc[-1], df["amount"].max())
+
+    def test_weight_column_does_not_shadow_result_columns(self):
+        rng = np.random.default_rng(3)
+        df = pd.DataFrame({"points": rng.normal(size=5000), "score": rng.normal(size=5000)})
+        frame, reduction = reduce_for_chart(df, "scatter", "points", "score", max_points=1000)
+        self.assertEqual(reduction["weights"], "_points")
+        self.assertEqual(frame["_points"].sum(), 5000)
+        self.assertEqual(list(frame.columns), ["points", "score", "_points"])
+
+        frame, reduction = reduce_for_chart(df, "histogram", "points", max_points=1000)
+        self.assertEqual(reduction["weights"], "_points")
+        self.assertEqual(frame["_points"].sum(), 5000)
+
+    def test_bar_chart_keeps_top_categories(self):
+        df = pd.DataFrame({"product": [f"p{i}" for i in range(100)], "sales": np.arange(100.0)})
+        with patch.object(Config, 'CHART_MAX_CATEGORIES', 5):
+            frame, reduction = reduce_for_chart(df, "bar", "product", "sales")
+        self.assertEqual(frame["product"].tolist(), ["p99", "p98", "p97", "p96", "p95", "Other"])
+        self.assertEqual(frame["sales"].sum(), df["sales"].sum())
+        self.assertEqual(reduction["method"], "top_n_other")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# tests/test_embedding_utils.py
+
+import os
+import shutil
+import tempfile
+import unittest
+from app.utils.embedding_utils import CachedEmbeddings, EmbeddingStore
+
+class FakeBackend:
+    def __init__(self):
+        self.document_batches = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.document_batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 0.5]
+
+class TestCachedEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "embeddings.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, backend, max_entries=100):
+        return CachedEmbeddings(backend, "test-model", EmbeddingStore(self.path), max_entries=max_entries)
+
+    def test_only_misses_reach_the_backend_in_one_batch(self):
+        backend = FakeBackend()
+        cache = self.make_cache(backend)
+        self.assertEqual(cache.embed_documents(["a", "bb"]), [[1.0, 1.0], [2.0, 1.0]])
+        self.assertEqual(cache.embed_documents(["bb", "ccc", "dddd", "ccc"]),
+                         [[2.0, 1.0], [3.0, 1.0], [4.0, 1.0], [3.0, 1.0]])
+        self.assertEqual(backend.document_batches, [["a", "bb"], ["ccc", "dddd"]])
+        self.assertEqual(cache.get_stats()["memory_hits"], 1)
+
+    def test_queries_and_documents_are_cached_separately(self):
+        backend = FakeBackend()
+        cache = self.make_cache(backend)
+        self.assertEqual(cache.embed_query("abc"), [3.0, 0.5])
+        self.assertEqual(cache.embed_query("abc"), [3.0, 0.5])
+        self.assertEqual(cache.embed_documents(["abc"]), [[3.0, 1.0]])
+        self.assertEqual((backend.queries, backend.document_batches), (["abc"], [["abc"]]))
+
+    def test_vectors_survive_restarts_and_lru_eviction(self):
+        first = self.make_cache(FakeBackend(), max_entries=1)
+        first.embed_documents(["a", "bb"])
+        self.assertEqual(first.get_stats()["entries"], 1)
+        first.embed_documents(["a"])
+        self.assertEqual(first.get_stats()["disk_hits"], 1)
+        first.store.close()
+
+        backend = FakeBackend()
+        second = self.make_cache(backend)
+        self.assertEqual(second.embed_documents(["a", "bb"]), [[1.0, 1.0], [2.0, 1.0]])
+        self.assertEqual(backend.document_batches, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# tests/test_graph_service.py
+
+import time
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+from concurrent.futures import Future
+from app.services import graph_service
+
+class TestAnalysisGraph(unittest.TestCase):
+    def build_graph(self, query_relevant=True):
+        self.intervals = {}
+
+        def stub(name, update, delay=0.0):
+            def node(state):
+                start_time = time.perf_counter()
+                time.sleep(delay)
+                self.intervals[name] = (start_time, time.perf_counter())
+                return update
+            return node
+
+        evaluation = SimpleNamespace(requires_visualization=True, explanation="")
+        chart = Future()
+        chart.set_result("chart")
+        search_memory = stub("memory_retrieval", ["memory"], 0.05)
+        memory_service = SimpleNamespace(search_memory=lambda query, embedding=None: search_memory(query))
+        stubs = {
+            "DatabaseService": SimpleNamespace(get_database_info=stub("db_information", {"db_info": {}}, 0.05)),
+            "query_analyzer_table_selector": stub("analyzer", {"is_query_relevant": query_relevant}),
+            "sql_generator_optimizer": stub("generator", {"generated_sql": None}),
+            "sql_validator": stub("validator", {"validation_result": SimpleNamespace(is_sql_valid=True)}),
+            "execute_sql": stub("executor", {"execution_result": None}),
+            "result_profiler": stub("profiler", {"result_profile": None}),
+            "result_evaluator": stub("evaluator", {"is_result_relevant": True, "evaluation_result": evaluation}),
+            "data_visualizer": stub("visualizer", {"visualization_future": chart, "visualization_explanation": "trend"}, 0.05),
+            "summarizer_node": stub("summarizer", {"summary": "summary"}, 0.05),
+        }
+        with patch.multiple(graph_service, **stubs):
+            return graph_service.create_analysis_graph(memory_service)
+
+    def initial_state(self):
+        return {"user_query": "q", "query_embedding": None, "regenerate_list": [], "reanalyze_list": [],
+                "relevant_memories": [], "session_id": "s", "run_id": None}
+
+    def assertOverlap(self, first, second):
+        (start_a, end_a), (start_b, end_b) = self.intervals[first], self.intervals[second]
+        self.assertLess(max(start_a, start_b), min(end_a, end_b), f"{first} and {second} ran sequentially")
+
+    def test_independent_nodes_run_in_parallel(self):
+        graph = self.build_graph()
+        for run in (lambda: graph.invoke(self.initial_state()), lambda: asyncio.run(graph.ainvoke(self.initial_state()))):
+            state = run()
+            self.assertEqual((state["summary"], state["visualization"], state["relevant_memories"]),
+                             ("summary", "chart", ["memory"]))
+            self.assertEqual(state["visualization_explanation"], "trend")
+            self.assertOverlap("visualizer", "summarizer")
+            self.assertOverlap("db_information", "memory_retrieval")
+            self.assertGreaterEqual(self.intervals["analyzer"][0], self.intervals["memory_retrieval"][1])
+
+    def test_irrelevant_query_goes_straight_to_summary(self):
+        graph = self.build_graph(query_relevant=False)
+        state = graph.invoke(self.initial_state())
+        self.assertEqual(state["summary"], "summary")
+        self.assertNotIn("visualizer", self.intervals)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# tests/test_memory_service.py
+
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from app.services.memory_service import MemoryService
+
+class TestMemoryWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.vector_store = MagicMock()
+        with patch.object(MemoryService, '_create_embedding_function', return_value=MagicMock()), \
+                patch.object(MemoryService, '_create_vector_store', return_value=self.vector_store):
+            self.memory_service = MemoryService()
+        self.memory_service.buffer_size = 3
+        self.memory_service.flush_interval = 0.2
+
+    def tearDown(self):
+        self.memory_service.close()
+
+    def written_batches(self):
+        return [call.args[0] for call in self.vector_store.add_texts.call_args_list]
+
+    def wait_for_writes(self, count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while self.memory_service.stats["written"] < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_full_batch_is_written_in_one_call(self):
+        for i in range(3):
+            self.memory_service.add_memory(f"memory {i}", {"run_id": str(i)})
+        self.wait_for_writes(3)
+        self.assertEqual(self.written_batches(), [["memory 0", "memory 1", "memory 2"]])
+        self.assertEqual(self.vector_store.add_texts.call_args.kwargs["metadatas"],
+                         [{"run_id": "0"}, {"run_id": "1"}, {"run_id": "2"}])
+        self.assertEqual(self.memory_service.get_stats()["pending"], 0)
+
+    def test_partial_batch_is_written_after_the_interval(self):
+        self.memory_service.add_memory("memory 0")
+        self.assertEqual(self.memory_service.get_stats()["pending"], 1)
+        self.assertEqual(self.written_batches(), [])
+        self.wait_for_writes(1)
+        self.assertEqual(self.written_batches(), [["memory 0"]])
+
+    def test_close_flushes_pending_memories(self):
+        self.memory_service.flush_interval = 60
+        self.memory_service.add_memory("memory 0")
+        self.memory_service.add_memory("memory 1")
+        self.memory_service.close()
+        self.assertEqual(self.written_batches(), [["memory 0", "memory 1"]])
+        self.assertEqual(self.memory_service.get_stats()["batches"], 1)
+
+    def test_failed_batch_is_requeued(self):
+        self.memory_service.flush_interval = 60
+        self.vector_store.add_texts.side_effect = [RuntimeError("embedding server down"), None]
+        self.memory_service.add_memory("memory 0")
+        self.assertEqual(self.memory_service.flush(), 0)
+        self.assertEqual((self.memory_service.get_stats()["failed"], self.memory_service.get_stats()["pending"]), (1, 1))
+        self.assertEqual(self.memory_service.flush(), 1)
+        self.assertEqual(self.written_batches(), [["memory 0"], ["memory 0"]])
+
+    def test_batch_is_dropped_after_max_retries(self):
+        self.memory_service.flush_interval = 60
+        self.memory_service.max_retries = 1
+        self.vector_store.add_texts.side_effect = RuntimeError("embedding server down")
+        self.memory_service.add_memory("memory 0")
+        self.memory_service.flush()
+        self.memory_service.flush()
+        stats = self.memory_service.get_stats()
+        self.assertEqual((stats["failed"], stats["dropped"], stats["pending"]), (2, 1, 0))
+
+if __name__ == '__main__':
+    unittest.main()
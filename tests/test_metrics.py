@@ -0,0 +1,57 @@
+# tests/test_metrics.py
+
+import uuid
+import unittest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from app.utils.metrics_utils import (Counter, Histogram, REGISTRY, instrument_node, llm_metrics_callback,
+                                     record_sql_time, count_http_request, render_metrics, start_request_metrics,
+                                     get_request_metrics)
+
+def fake_llm_call(prompt_tokens, completion_tokens, http_requests=1):
+    run_id = uuid.uuid4()
+    llm_metrics_callback.on_chat_model_start({}, [[]], run_id=run_id)
+    for _ in range(http_requests):
+        count_http_request(None)
+    llm_metrics_callback.on_llm_end(LLMResult(
+        generations=[[ChatGeneration(message=AIMessage(content="ok"))]],
+        llm_output={"model_name": "gpt-3.5-turbo",
+                    "token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}}
+    ), run_id=run_id)
+
+class TestMetrics(unittest.TestCase):
+    def test_prometheus_rendering(self):
+        histogram = Histogram("test_latency_seconds", "Test latency", ["node"], buckets=(0.1, 1.0))
+        counter = Counter("test_calls_total", "Test calls", ["node"])
+        try:
+            histogram.observe(0.5, node='a"b')
+            counter.inc(node="a")
+            text = render_metrics()
+        finally:
+            REGISTRY.remove(histogram)
+            REGISTRY.remove(counter)
+        self.assertIn('test_latency_seconds_bucket{node="a\\"b",le="0.1"} 0', text)
+        self.assertIn('test_latency_seconds_bucket{node="a\\"b",le="1.0"} 1', text)
+        self.assertIn('test_latency_seconds_count{node="a\\"b"} 1', text)
+        self.assertIn('test_calls_total{node="a"} 1.0', text)
+
+    def test_per_request_breakdown(self):
+        def summarizer(state):
+            fake_llm_call(1000, 200, http_requests=2)
+            record_sql_time(0.25)
+            return state
+
+        with start_request_metrics() as request_metrics:
+            instrument_node("summarizer", summarizer).invoke({})
+        self.assertIsNone(get_request_metrics())
+        summary = request_metrics.summary()
+        node = summary["nodes"]["summarizer"]
+        self.assertEqual((node["runs"], node["llm_calls"], node["retries"]), (1, 1, 1))
+        self.assertEqual((summary["prompt_tokens"], summary["completion_tokens"]), (1000, 200))
+        self.assertAlmostEqual(summary["cost_usd"], 0.0008)
+        self.assertEqual(node["sql_seconds"], 0.25)
+        self.assertTrue(request_metrics.server_timing().startswith('summarizer;dur='))
+        self.assertIn('llm_tokens_total{node="summarizer",model="gpt-3.5-turbo",kind="prompt"}', render_metrics())
+
+if __name__ == '__main__':
+    unittest.main()
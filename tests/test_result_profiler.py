@@ -0,0 +1,40 @@
+# tests/test_result_profiler.py
+
+import unittest
+from app.models import ColumnarResult, SQLExecutionResult
+from app.services.result_profiler_service import profile_result, describe_profile, result_profiler
+
+class TestResultProfiler(unittest.TestCase):
+    def make_result(self, columns, column_values):
+        data = ColumnarResult.from_columns(columns, column_values)
+        return SQLExecutionResult(success=True, data=data, row_count=len(data))
+
+    def test_column_statistics(self):
+        result = self.make_result(["category", "revenue"], [["Books", "Toys", "Books", None], [10.0, None, 30.0, 20.0]])
+        profile = profile_result(result, head_rows=2)
+
+        category, revenue = profile.columns
+        self.assertEqual((category.dtype, category.nulls, category.distinct), ("object", 1, 2))
+        self.assertEqual(category.top_values, {"Books": 2, "Toys": 1})
+        self.assertEqual((revenue.dtype, revenue.nulls, revenue.min, revenue.max, revenue.mean), ("float64", 1, 10.0, 30.0, 20.0))
+        self.assertEqual(profile.head, [{"category": "Books", "revenue": 10.0}, {"category": "Toys", "revenue": None}])
+        self.assertIn("- revenue (float64): nulls=1, distinct=3, min=10.0, max=30.0, mean=20.0", describe_profile(profile))
+
+    def test_nullable_integer_column(self):
+        quantity = profile_result(self.make_result(["quantity"], [[3, None, 5, 3]])).columns[0]
+        self.assertEqual((quantity.dtype, quantity.nulls, quantity.distinct), ("int64", 1, 2))
+        self.assertEqual((quantity.min, quantity.max, quantity.mean), (3, 5, 3.6667))
+
+    def test_large_results_are_sampled(self):
+        result = self.make_result(["order_id"], [list(range(50000))])
+        profile = profile_result(result, sample_rows=1000)
+        self.assertTrue(profile.sampled)
+        self.assertEqual((profile.row_count, profile.profiled_rows), (50000, 1000))
+        self.assertEqual((profile.columns[0].min, profile.columns[0].max), (0, 49999))
+
+    def test_failed_execution_has_no_profile(self):
+        state = {"execution_result": SQLExecutionResult(success=False, error_message="no such table")}
+        self.assertIsNone(result_profiler(state)["result_profile"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# tests/test_schema_index.py
+
+import unittest
+from unittest.mock import MagicMock
+from app.models import TableInfo, TableSchema, TableSample
+from app.services.schema_index_service import SchemaIndex, tokenize_identifier
+
+def make_tables(definitions):
+    return {
+        name: TableInfo(table_schema=TableSchema(name=name, columns={column: "TEXT" for column in columns}),
+                        sample=TableSample(name=name, data=[]))
+        for name, columns in definitions.items()
+    }
+
+class TestSchemaIndex(unittest.TestCase):
+    def setUp(self):
+        self.definitions = {
+            "customers": ["customer_id", "first_name", "email"],
+            "orders": ["order_id", "customer_id", "order_date", "total_amount"],
+            "order_items": ["order_item_id", "order_id", "product_id", "quantity"],
+            "products": ["product_id", "product_name", "category"],
+            "shipments": ["shipment_id", "order_id", "carrier", "shippedAt"],
+            "audit_log": ["log_id", "event", "created_at"]
+        }
+        self.tables = make_tables(self.definitions)
+
+    def test_tokenize_identifier(self):
+        self.assertEqual(tokenize_identifier("orderItems shippedAt categories"), ["order", "item", "shipped", "at", "category"])
+
+    def test_bm25_shortlist(self):
+        index = SchemaIndex()
+        index.update(self.tables, "v1")
+        self.assertEqual(index.shortlist("Which product categories sell the most?", 1), ["products"])
+        self.assertEqual(index.shortlist("which carrier shipped the most orders", 1), ["shipments"])
+        self.assertEqual(len(index.shortlist("anything", 3)), 3)
+
+    def test_incremental_update_only_reembeds_changed_tables(self):
+        embeddings = MagicMock()
+        embeddings.embed_documents.side_effect = lambda documents: [[float(len(document)), 1.0] for document in documents]
+        index = SchemaIndex(embedding_function=embeddings)
+        index.update(self.tables, "v1")
+        self.assertEqual(index.stats["tables_embedded"], 6)
+
+        self.definitions["products"].append("price")
+        del self.definitions["audit_log"]
+        index.update(make_tables(self.definitions), "v2")
+        self.assertEqual(index.stats["tables_embedded"], 7)
+        self.assertEqual(index.stats["tables_reindexed"], 7)
+        self.assertEqual(index.get_stats()["tables"], 5)
+
+        index.update(make_tables(self.definitions), "v2")
+        self.assertEqual(index.stats["rebuilds"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# tests/test_session_service.py
+
+import time
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from sqlalchemy import inspect
+from app.models import db, SessionHistory
+from app.services import session_service
+from app.services.session_service import SessionHistoryStore, SessionService, create_history_indexes
+
+class TestSessionHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.store = SessionHistoryStore(batch_size=3, flush_interval=0.2, max_pending=100, cache_sessions=2,
+                                         cache_turns=3, write_behind=True)
+        self.store.init_app(self.app)
+
+    def tearDown(self):
+        self.store.close()
+        db.drop_all()
+        self.context.pop()
+
+    def stored_rows(self):
+        return db.session.query(SessionHistory).count()
+
+    def wait_for_writes(self, count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while self.store.stats["written"] < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_full_batch_is_committed_once(self):
+        for i in range(3):
+            self.store.add("s1", f"run {i}", f"query {i}", f"response {i}")
+        self.wait_for_writes(3)
+        self.assertEqual(self.stored_rows(), 3)
+        self.assertEqual(self.store.get_stats()["batches"], 1)
+
+    def test_queued_entries_are_visible_before_commit(self):
+        self.store.flush_interval = 60
+        self.store.add("s1", "run 0", "query 0", "response 0")
+        self.store.add("s1", "run 1", "query 1", "response 1")
+        self.assertEqual(self.stored_rows(), 0)
+        self.assertEqual([entry.query for entry in self.store.recent("s1", 2)], ["query 1", "query 0"])
+        self.store.flush()
+        self.assertEqual(self.stored_rows(), 2)
+
+    def test_cache_is_filled_once_and_updated_on_write(self):
+        for i in range(5):
+            self.store.add("s1", f"run {i}", f"query {i}", f"response {i}")
+        self.store.flush()
+        self.assertEqual([entry.query for entry in self.store.recent("s1", 3)], ["query 4", "query 3", "query 2"])
+        self.store.add("s1", "run 5", "query 5", "response 5")
+        with patch.object(db.session, 'query', side_effect=AssertionError("cache miss")):
+            self.assertEqual([entry.query for entry in self.store.recent("s1", 2)], ["query 5", "query 4"])
+        self.assertEqual((self.store.stats["cache_misses"], self.store.stats["cache_hits"]), (1, 1))
+
+    def test_longer_history_reads_the_table(self):
+        for i in range(5):
+            self.store.add("s1", f"run {i}", f"query {i}", f"response {i}")
+        self.store.flush()
+        self.assertEqual(len(self.store.recent("s1", 10)), 5)
+        self.assertEqual(self.store.get_stats()["cached_sessions"], 0)
+
+    def test_cache_keeps_most_recently_used_sessions(self):
+        for session_id in ("s1", "s2", "s3"):
+            self.store.recent(session_id, 3)
+        self.assertEqual(list(self.store._recent), ["s2", "s3"])
+
+    def test_synchronous_writes(self):
+        self.store.write_behind = False
+        self.store.add("s1", "run 0", "query 0", "response 0")
+        self.assertEqual(self.stored_rows(), 1)
+        self.assertEqual(self.store.recent("s1", 1)[0].response, "response 0")
+
+    def test_writes_go_to_the_bound_app(self):
+        other_app = Flask("other")
+        other_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(other_app)
+        with other_app.app_context():
+            db.create_all()
+            self.store.add("s1", "run 0", "query 0", "response 0")  # queued for self.app
+            self.store.init_app(other_app)
+            self.store.add("s1", "run 1", "query 1", "response 1")
+            self.store.flush()
+            self.assertEqual([row.query for row in db.session.query(SessionHistory)], ["query 1"])
+        self.assertEqual([row.query for row in db.session.query(SessionHistory)], ["query 0"])
+
+    def test_unbound_store_rejects_writes(self):
+        with self.assertRaises(RuntimeError):
+            SessionHistoryStore().add("s1", "run 0", "query 0", "response 0")
+
+    def test_failed_write_evicts_cached_turns(self):
+        self.store.write_behind = False
+        self.store.add("s1", "run 0", "query 0", "response 0")
+        self.store.recent("s1", 3)  # cache the session
+        with patch.object(db.session, 'execute', side_effect=RuntimeError("database is locked")):
+            self.store.add("s1", "run 1", "query 1", "response 1")
+        self.assertNotIn("s1", self.store._recent)
+        self.assertEqual([entry.query for entry in self.store.recent("s1", 3)], ["query 0"])
+        self.assertEqual(self.store.stats["failed"], 1)
+
+    def test_index_is_added_to_an_existing_table(self):
+        db.session.execute(db.text("DROP INDEX ix_session_history_session_id_timestamp"))
+        create_history_indexes()
+        indexes = inspect(db.engine).get_indexes("session_history")
+        self.assertEqual([index["column_names"] for index in indexes], [["session_id", "timestamp"]])
+
+    def test_session_service_recent_history(self):
+        with patch.object(session_service, 'session_history', self.store):
+            SessionService.add_to_session_history("s1", "run 0", "query 0", "response 0")
+            history = SessionService.get_recent_history("s1")
+        self.assertEqual(history[0]["query"], "query 0")
+        self.assertIn("T", history[0]["timestamp"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# tests/test_session_utils.py
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask, session
+from app.utils.session_utils import SQLiteCache, init_session
+
+def session_app(session_type, directory):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY="test", SESSION_TYPE=session_type, SESSION_PERMANENT=False, SESSION_USE_SIGNER=True,
+                      SESSION_FILE_DIR=os.path.join(directory, "sessions"),
+                      SESSION_SQLITE_PATH=os.path.join(directory, "sessions.db"))
+    init_session(app)
+
+    @app.route("/user")
+    def user():
+        if "user_id" not in session:
+            session["user_id"] = f"user-{time.monotonic_ns()}"
+        return session["user_id"]
+
+    return app
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SQLiteCache(os.path.join(self.directory, "cache.db"), sweep_interval=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.set("a", {"user_id": "u1"})
+        self.assertEqual(self.cache.get("a"), {"user_id": "u1"})
+        self.assertTrue(self.cache.has("a"))
+        self.cache.delete("a")
+        self.assertFalse(self.cache.has("a"))
+
+    def test_expired_entries_are_ignored_and_swept(self):
+        self.cache.set("old", 1, timeout=10)
+        self.cache.set("forever", 2, timeout=0)
+        with patch("app.utils.session_utils.time.time", return_value=time.time() + 60):
+            self.assertIsNone(self.cache.get("old"))
+            self.assertEqual(self.cache.get("forever"), 2)
+            self.assertTrue(self.cache.add("old", 3, timeout=10))
+            self.cache.set("expiring", 4, timeout=1)
+        with patch("app.utils.session_utils.time.time", return_value=time.time() + 120):
+            self.assertEqual(self.cache.sweep(), 2)
+            self.assertEqual(self.cache.get("forever"), 2)
+
+    def test_add_keeps_live_entries(self):
+        self.assertTrue(self.cache.add("a", 1))
+        self.assertFalse(self.cache.add("a", 2))
+        self.assertEqual(self.cache.get("a"), 1)
+
+    def test_shared_between_instances(self):
+        self.cache.set("a", 1)
+        other = SQLiteCache(self.cache.path)
+        self.assertEqual(other.get("a"), 1)
+
+class TestSessionBackends(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_user_id_survives_requests(self):
+        for session_type in ("sqlite", "filesystem", "cookie"):
+            with self.subTest(session_type=session_type):
+                client = session_app(session_type, os.path.join(self.directory, session_type)).test_client()
+                first = client.get("/user").data
+                self.assertEqual(client.get("/user").data, first)
+
+    def test_sqlite_backend_uses_one_file(self):
+        app = session_app("sqlite", self.directory)
+        for _ in range(5):
+            app.test_client().get("/user")
+        self.assertIsInstance(app.session_interface.cache, SQLiteCache)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "sessions")))
+        self.assertEqual(len(os.listdir(self.directory)), 3)  # the database plus its WAL and shared-memory files
+
+if __name__ == '__main__':
+    unittest.main()
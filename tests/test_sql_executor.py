@@ -0,0 +1,127 @@
+# tests/test_sql_executor.py
+
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import numpy as np
+from app.config import Config
+from app.models import SQLExecutionResult, ColumnarResult
+from app.services.sql_executor_service import ResultCache, run_sql, result_cache
+from app.utils.db_utils import dispose_engine
+
+class TestSQLExecutor(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.database_url = f"sqlite:///{self.db_path}"
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("CREATE TABLE orders (order_id INTEGER PRIMARY KEY, total REAL)")
+            connection.executemany("INSERT INTO orders (total) VALUES (?)", [(i * 1.5,) for i in range(100)])
+        self.config_patch = patch.object(Config, 'DATABASE_URL', self.database_url)
+        self.config_patch.start()
+        result_cache.clear()
+
+    def tearDown(self):
+        self.config_patch.stop()
+        result_cache.clear()
+        dispose_engine(self.database_url)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    def test_result_cache_hit_for_equivalent_sql(self):
+        first = run_sql("SELECT COUNT(*) AS n FROM orders")
+        second = run_sql("select count(*) as n\nfrom orders;")
+        self.assertEqual(first.data.to_records(), [{"n": 100}])
+        self.assertIs(second.data, first.data)
+        self.assertEqual(result_cache.get_stats()["hits"], 1)
+        self.assertGreater(result_cache.get_stats()["bytes"], 0)
+
+    def test_data_change_bypasses_cached_result(self):
+        run_sql("SELECT COUNT(*) AS n FROM orders")
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute("INSERT INTO orders (total) VALUES (1.0)")
+        self.assertEqual(run_sql("SELECT COUNT(*) AS n FROM orders").data.to_records(), [{"n": 101}])
+
+    def test_errors_are_not_cached(self):
+        result = run_sql("SELECT missing_column FROM orders")
+        self.assertFalse(result.success)
+        self.assertEqual(result_cache.get_stats()["entries"], 0)
+
+    def test_row_cap_truncates_and_counts(self):
+        with patch.object(Config, 'SQL_MAX_ROWS', 10), patch.object(Config, 'SQL_FETCH_SIZE', 4), \
+                patch.object(Config, 'SQL_COUNT_TRUNCATED_ROWS', True):
+            result = run_sql("SELECT order_id, total FROM orders")
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.row_count, 10)
+        self.assertEqual(len(result.data), 10)
+        self.assertEqual(result.data.columns, ["order_id", "total"])
+        self.assertEqual(result.total_row_count, 100)
+
+    def test_truncated_rows_are_not_counted_by_default(self):
+        with patch.object(Config, 'SQL_MAX_ROWS', 10):
+            result = run_sql("SELECT order_id, total FROM orders")
+        self.assertTrue(result.truncated)
+        self.assertIsNone(result.total_row_count)
+
+    def test_row_count_gives_up_after_timeout(self):
+        slow_query = "SELECT a.order_id FROM orders a, orders b, orders c, orders d"  # 100 million rows
+        with patch.object(Config, 'SQL_MAX_ROWS', 10), patch.object(Config, 'SQL_COUNT_TRUNCATED_ROWS', True), \
+                patch.object(Config, 'SQL_COUNT_TIMEOUT', 0.2):
+            start_time = time.perf_counter()
+            result = run_sql(slow_query)
+        self.assertLess(time.perf_counter() - start_time, 5)
+        self.assertEqual(result.row_count, 10)
+        self.assertIsNone(result.total_row_count)
+
+    def test_byte_cap_truncates(self):
+        with patch.object(Config, 'SQL_MAX_RESULT_BYTES', 2000):
+            result = run_sql("SELECT order_id, total FROM orders")
+        self.assertTrue(result.truncated)
+        self.assertLess(result.row_count, 100)
+
+        result = run_sql("SELECT order_id FROM orders WHERE order_id <= 5")
+        self.assertFalse(result.truncated)
+        self.assertEqual(result.total_row_count, 5)
+
+    def test_byte_budget_eviction(self):
+        data = ColumnarResult.from_records([{"order_id": i, "total": float(i)} for i in range(10)])
+        cache = ResultCache(max_bytes=data.nbytes * 2)
+        for key in ("a", "b", "c"):
+            cache.put(key, SQLExecutionResult(success=True, data=data))
+        stats = cache.get_stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertLessEqual(stats["bytes"], cache.max_bytes)
+        self.assertIsNone(cache.get("a"))
+
+class TestColumnarResult(unittest.TestCase):
+    def test_typed_columns_and_zero_copy_frame(self):
+        data = ColumnarResult.from_columns(
+            ["id", "amount", "name", "discount"],
+            [[1, 2, 3], [1.5, 2.5, 3.5], ["a", "b", None], [0.1, None, 0.3]]
+        )
+        self.assertEqual([array.dtype.kind for array in data.arrays], ["i", "f", "O", "f"])
+
+        df = data.to_frame()
+        self.assertTrue(np.shares_memory(df["amount"].to_numpy(), data.arrays[1]))
+        self.assertEqual(data.to_records(limit=2)[1], {"id": 2, "amount": 2.5, "name": "b", "discount": None})
+
+    def test_nullable_integers_stay_integers(self):
+        data = ColumnarResult.from_columns(["quantity"], [[3, None, 5]])
+        self.assertEqual(data.arrays[0].dtype.kind, "i")
+        self.assertEqual(data.to_records(), [{"quantity": 3}, {"quantity": None}, {"quantity": 5}])
+        self.assertIsInstance(data.to_records()[0]["quantity"], int)
+        self.assertNotEqual(data.fingerprint(), ColumnarResult.from_columns(["quantity"], [[3, 0, 5]]).fingerprint())
+
+    def test_arrays_are_read_only(self):
+        data = ColumnarResult.from_columns(["id", "quantity"], [[1, 2], [3, None]])
+        for array in data.arrays:
+            with self.assertRaises(ValueError):
+                array[0] = 0
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# tests/test_sql_validator.py
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from app.services.database_service import DatabaseService
+from app.services.sql_validator_service import validate_sql_locally
+from app.utils.db_utils import dispose_engine
+from app.utils.sql_utils import extract_table_references, normalize_sql, split_statements, find_write_keywords
+
+class TestLocalSQLValidator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        fd, cls.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        cls.database_url = f"sqlite:///{cls.db_path}"
+        with sqlite3.connect(cls.db_path) as connection:
+            connection.execute("CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT)")
+            connection.execute("CREATE TABLE orders (order_id INTEGER PRIMARY KEY, customer_id INTEGER, total REAL, order_date TEXT)")
+        cls.db_info = DatabaseService.get_schema(cls.database_url)
+
+    @classmethod
+    def tearDownClass(cls):
+        DatabaseService._schema_cache.pop(cls.database_url, None)
+        dispose_engine(cls.database_url)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(cls.db_path + suffix):
+                os.remove(cls.db_path + suffix)
+
+    def validate(self, sql):
+        return validate_sql_locally(sql, self.db_info, self.database_url)
+
+    def test_valid_query(self):
+        result = self.validate("""
+            WITH totals AS (SELECT customer_id, SUM(total) AS amount FROM orders GROUP BY customer_id)
+            SELECT c.name, t.amount, REPLACE(c.name, 'a', 'b') FROM customers c
+            JOIN totals t ON t.customer_id = c.customer_id
+            WHERE strftime('%Y', (SELECT MAX(order_date) FROM orders)) = '2024'
+            ORDER BY t.amount DESC LIMIT 5;
+        """)
+        self.assertTrue(result.is_sql_valid, result.issues)
+
+    def test_rejects_writes_and_multiple_statements(self):
+        self.assertFalse(self.validate("DELETE FROM orders").is_sql_valid)
+        self.assertFalse(self.validate("SELECT 1; DROP TABLE orders").is_sql_valid)
+        self.assertTrue(self.validate("SELECT 'drop table orders' AS note FROM orders").is_sql_valid)
+
+    def test_keywords_as_names_are_not_writes(self):
+        self.assertTrue(self.validate("SELECT COUNT(*) AS replace FROM orders").is_sql_valid)
+        self.assertTrue(self.validate("SELECT COUNT(*) replace FROM orders").is_sql_valid)
+        self.assertEqual(find_write_keywords("SELECT REPLACE(name, 'a', 'b') AS update FROM orders"), [])
+        self.assertEqual(find_write_keywords("WITH d AS (DELETE FROM orders RETURNING *) SELECT * FROM d"), ["DELETE"])
+        self.assertEqual(find_write_keywords("WITH a AS (SELECT 1), b AS (SELECT 2) INSERT INTO t SELECT * FROM a"),
+                         ["INSERT"])
+
+    def test_unknown_table_and_column(self):
+        result = self.validate("SELECT o.amount FROM orders o JOIN payments p ON p.order_id = o.order_id")
+        self.assertFalse(result.is_sql_valid)
+        self.assertTrue(any("Unknown table 'payments'" in issue for issue in result.issues))
+
+        result = self.validate("SELECT o.amount FROM orders o")
+        self.assertTrue(any("Unknown column 'amount'" in issue for issue in result.issues))
+
+    def test_explain_catches_syntax_errors(self):
+        result = self.validate("SELECT name FROM customers WHERE")
+        self.assertFalse(result.is_sql_valid)
+        self.assertTrue(result.issues[0].startswith("The database rejected the query"))
+
+    def test_extract_table_references(self):
+        sql = "SELECT EXTRACT(YEAR FROM order_date) FROM orders AS o, customers c LEFT JOIN json_each(x) j"
+        self.assertEqual(extract_table_references(sql), [("orders", "o"), ("customers", "c")])
+
+    def test_normalize_sql(self):
+        self.assertEqual(normalize_sql("SELECT  Name\nFROM Customers WHERE name = 'Bob' ;"),
+                         normalize_sql("select name from customers where name='Bob'"))
+
+    def test_comment_markers_inside_literals(self):
+        for literal in ("'--'", "'/*'", "'it''s -- here'"):
+            sql = f"SELECT {literal}; DELETE FROM orders"
+            self.assertEqual(split_statements(sql), ["SELECT ''", "DELETE FROM orders"])
+            self.assertEqual(find_write_keywords(sql), ["DELETE"])
+            self.assertFalse(self.validate(sql).is_sql_valid)
+        self.assertEqual(split_statements("SELECT 'a' -- note; DROP TABLE orders\nFROM orders"), ["SELECT ''  \nFROM orders"])
+
+    def test_normalize_sql_keeps_literals_apart(self):
+        first = normalize_sql("SELECT * FROM orders WHERE note = '--x' AND order_id = 1")
+        second = normalize_sql("SELECT * FROM orders WHERE note = '--x' AND order_id = 2")
+        self.assertNotEqual(first, second)
+        self.assertEqual(first, "select * from orders where note='--x' and order_id=1")
+        self.assertNotEqual(normalize_sql("SELECT 'a , b'"), normalize_sql("SELECT 'a,b'"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# tests/test_stream_events.py
+
+import json
+import unittest
+from typing import Any, Optional, TypedDict
+from unittest.mock import patch
+from flask import Flask
+from langgraph.graph import StateGraph, START, END
+from app import routes
+from app.models import ColumnarResult, SQLExecutionResult, Visualization
+from app.utils.stream_utils import DeltaStream
+
+IMAGE = "A" * 50000
+
+class State(TypedDict, total=False):
+    user_query: str
+    generated_sql: Optional[str]
+    execution_result: Optional[Any]
+    visualization: Optional[Any]
+    summary: Optional[str]
+
+def build_graph():
+    def generate(state):
+        return {**state, "generated_sql": "SELECT 1"}  # full state back, only one key changed
+
+    def execute(state):
+        rows = ColumnarResult.from_columns(["n"], [list(range(1000))])
+        return {"execution_result": SQLExecutionResult(success=True, data=rows, row_count=1000)}
+
+    def visualize(state):
+        return {"visualization": Visualization(image=IMAGE, format="png", description="chart")}
+
+    def summarize(state):
+        return {"summary": "done"}
+
+    graph = StateGraph(State)
+    for name, node in (("generate", generate), ("execute", execute), ("visualize", visualize), ("summarize", summarize)):
+        graph.add_node(name, node)
+    graph.add_edge(START, "generate")
+    graph.add_edge("generate", "execute")
+    graph.add_edge("execute", "visualize")
+    graph.add_edge("execute", "summarize")
+    graph.add_edge(["visualize", "summarize"], END)
+    return graph.compile()
+
+def parse_events(body):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"]), int(fields["id"])))
+    return events
+
+def initial_state():
+    return {"user_query": "q", "generated_sql": None, "execution_result": None, "visualization": None, "summary": None}
+
+class TestDeltaStream(unittest.TestCase):
+    def run_graph(self):
+        stream = DeltaStream(initial_state())
+        frames = [frame for event in build_graph().stream(initial_state(), stream_mode="debug")
+                  for frame in stream.graph_event(event)]
+        return stream, parse_events("".join(frames))
+
+    def test_node_events_carry_changed_keys_only(self):
+        _, events = self.run_graph()
+        finished = {data["node"]: data for name, data, _ in events if name == "node_finished"}
+        self.assertEqual(set(finished), {"generate", "execute", "visualize", "summarize"})
+        self.assertEqual(finished["generate"]["changed"], {"generated_sql": "SELECT 1"})
+        self.assertEqual(finished["summarize"]["changed"], {"summary": "done"})
+        started = [data["node"] for name, data, _ in events if name == "node_started"]
+        self.assertEqual(sorted(started), ["execute", "generate", "summarize", "visualize"])
+
+    def test_result_rows_are_previewed(self):
+        _, events = self.run_graph()
+        execute = next(data for name, data, _ in events if name == "node_finished" and data["node"] == "execute")
+        data = execute["changed"]["execution_result"]["data"]
+        self.assertEqual((data["row_count"], len(data["rows"])), (1000, 20))
+
+    def test_large_values_are_sent_once(self):
+        stream, events = self.run_graph()
+        payloads = [data for name, data, _ in events if name == "payload"]
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(payloads[0]["value"]["image"], IMAGE)
+        visualize = next(data for name, data, _ in events if name == "node_finished" and data["node"] == "visualize")
+        self.assertEqual(visualize["changed"]["visualization"]["$ref"], payloads[0]["ref"])
+
+        # The final response points at the chart already sent
+        final = parse_events("".join(stream.final({"summary": "done", "visualization": {
+            "format": "png", "image": IMAGE, "spec": None, "description": "chart"}})))
+        self.assertEqual([name for name, _, _ in final], ["final"])
+        self.assertEqual(final[0][1]["content"]["visualization"]["$ref"], payloads[0]["ref"])
+        self.assertEqual(stream.state["summary"], "done")
+
+    def test_event_ids_increase(self):
+        _, events = self.run_graph()
+        self.assertEqual([event_id for _, _, event_id in events], list(range(1, len(events) + 1)))
+
+class TestStreamEndpoint(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.config.update(SECRET_KEY="test", TESTING=True)
+        app.register_blueprint(routes.main_bp)
+        self.client = app.test_client()
+
+    def test_sse_stream(self):
+        complete = lambda user_query, session_id, run_id, final_state: {"summary": final_state["summary"],
+                                                                        "visualization": None}
+        with patch.object(routes, 'prepare_analysis', return_value=(None, initial_state())), \
+                patch.object(routes, 'get_analysis_graph', return_value=build_graph()), \
+                patch.object(routes, 'complete_analysis', side_effect=complete):
+            response = self.client.get('/stream?query=q')
+            events = parse_events(response.get_data(as_text=True))
+        self.assertEqual(response.mimetype, "text/event-stream")
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        self.assertEqual(events[0][0], "run_started")
+        self.assertEqual(events[-1][0], "final")
+        self.assertEqual(events[-1][1]["content"]["summary"], "done")
+        self.assertIn("metrics", events[-1][1])
+
+    def test_cached_answer(self):
+        with patch.object(routes, 'prepare_analysis', return_value=({"summary": "cached", "cached": "exact"}, None)):
+            events = parse_events(self.client.post('/stream', json={"query": "q"}).get_data(as_text=True))
+        self.assertEqual([name for name, _, _ in events], ["run_started", "final"])
+        self.assertTrue(events[0][1]["cached"])
+
+    def test_errors_are_events(self):
+        with patch.object(routes, 'prepare_analysis', side_effect=RuntimeError("no database")):
+            events = parse_events(self.client.post('/stream', json={"query": "q"}).get_data(as_text=True))
+        self.assertEqual(events[-1][:2], ("error", {"message": "no database"}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# tests/test_trace.py
+
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from app import routes
+from app.utils import trace_utils
+from app.utils.metrics_utils import instrument_node
+from app.utils.trace_utils import TraceRecorder, span, start_trace
+
+class TestTraceRecorder(unittest.TestCase):
+    def setUp(self):
+        fd, self.jsonl_path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.recorder = TraceRecorder(max_runs=2, max_spans_per_run=10, sample_rate=1.0, jsonl_path=self.jsonl_path)
+        self.recorder_patch = patch.object(trace_utils, 'trace_recorder', self.recorder)
+        self.recorder_patch.start()
+
+    def tearDown(self):
+        self.recorder_patch.stop()
+        if self.recorder._file is not None:
+            self.recorder._file.close()
+        os.remove(self.jsonl_path)
+
+    def test_node_timeline(self):
+        def generator(state):
+            with span("sql", "sql", sql="SELECT 1") as attributes:
+                attributes["rows"] = 1
+            return state
+
+        with start_trace("run-1", endpoint="analyze"):
+            node = instrument_node("generator", generator)
+            node.invoke({})
+            node.invoke({})
+
+        run = self.recorder.get_run("run-1")
+        self.assertEqual(run["node_runs"], {"generator": 2})
+        self.assertEqual([s["name"] for s in run["spans"]], ["generator", "sql", "generator", "sql"])
+        self.assertEqual(run["spans"][1]["parent_id"], run["spans"][0]["span_id"])
+        self.assertEqual(run["spans"][1]["attributes"], {"sql": "SELECT 1", "rows": 1})
+
+        with open(self.jsonl_path) as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 4)
+
+    def test_errors_are_recorded(self):
+        def failing(state):
+            raise ValueError("boom")
+
+        with start_trace("run-1"), self.assertRaises(ValueError):
+            instrument_node("validator", failing).invoke({})
+        spans = self.recorder.get_run("run-1")["spans"]
+        self.assertEqual((spans[0]["status"], spans[0]["error"]), ("error", "boom"))
+
+    def test_ring_buffer_and_sampling(self):
+        for run_id in ("a", "b", "c"):
+            with start_trace(run_id):
+                pass
+        self.assertIsNone(self.recorder.get_run("a"))
+        self.assertEqual([run["run_id"] for run in self.recorder.list_runs()], ["c", "b"])
+
+        self.recorder.sample_rate = 0.0
+        with start_trace("d") as sampled:
+            self.assertFalse(sampled)
+            with span("executor", "node") as attributes:
+                self.assertIsNone(attributes)
+        self.assertIsNone(self.recorder.get_run("d"))
+
+    def test_trace_context_ends_with_the_run(self):
+        with start_trace("run-1"):
+            with span("executor", "node") as attributes:
+                self.assertIsNotNone(attributes)
+        with span("executor", "node") as attributes:
+            self.assertIsNone(attributes)  # a later request on this thread is not attributed to run-1
+        self.assertEqual(self.recorder.get_run("run-1")["span_count"], 1)
+
+class TestDebugRunsEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(SECRET_KEY="test", TESTING=True, ADMIN_TOKEN="secret")
+        self.app.register_blueprint(routes.main_bp)
+        self.client = self.app.test_client()
+        self.recorder = TraceRecorder(sample_rate=1.0, jsonl_path=None)
+        self.recorder.start_run("run-1", query="private question")
+        self.recorder_patch = patch.object(routes, 'trace_recorder', self.recorder)
+        self.recorder_patch.start()
+
+    def tearDown(self):
+        self.recorder_patch.stop()
+
+    def test_requires_admin_token(self):
+        for path in ('/debug/runs', '/debug/runs/run-1'):
+            self.assertEqual(self.client.get(path).status_code, 403)
+            response = self.client.get(path, headers={"X-Admin-Token": "secret"})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("private question", response.get_data(as_text=True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# tests/test_visualizer.py
+
+import matplotlib
+matplotlib.use('Agg')  # Use a non-interactive backend
+
+import base64
+import unittest
+from unittest.mock import patch
+from app.models import ColumnarResult
+from app.services import visualizer_service
+from app.services.chart_renderer_service import chart_renderer
+from app.services.visualizer_service import ChartCache, create_visualization, build_chart_spec
+
+def sample_result():
+    return ColumnarResult.from_columns(["customer", "total"], [["Ann", "Bob", "Cy"], [120.5, 80.0, None]])
+
+class TestVisualizer(unittest.TestCase):
+    def setUp(self):
+        self.cache_patch = patch.object(visualizer_service, 'chart_cache', ChartCache())
+        self.cache_patch.start()
+        # Render in-process; the worker pool is covered by test_chart_renderer
+        self.renderer_patch = patch.object(chart_renderer, 'enabled', False)
+        self.renderer_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        self.renderer_patch.stop()
+
+    def test_vega_lite_spec(self):
+        visualization = build_chart_spec(sample_result(), "top customers", "bar", "customer", "total", "Totals")
+        spec = visualization.spec
+        self.assertEqual((visualization.format, visualization.image), ("vega-lite", None))
+        self.assertEqual(spec["mark"], {"type": "bar"})
+        self.assertEqual(spec["encoding"]["x"], {"field": "customer", "type": "nominal", "sort": None})
+        self.assertEqual(spec["encoding"]["y"], {"field": "total", "type": "quantitative"})
+        self.assertEqual(spec["data"]["values"][2], {"customer": "Cy", "total": None})
+
+    def test_raster_format_and_dpi(self):
+        visualization = create_visualization(sample_result(), "top customers", "bar", "customer", "total",
+                                             output_format="svg", dpi=72)
+        self.assertEqual(visualization.format, "svg")
+        self.assertIn(b"<svg", base64.b64decode(visualization.image))
+        with self.assertRaises(ValueError):
+            create_visualization(sample_result(), "top customers", "bar", "customer", "total", output_format="gif")
+
+    def test_charts_are_cached_by_data_and_parameters(self):
+        with patch.object(visualizer_service, 'build_chart_spec', wraps=build_chart_spec) as build:
+            first = create_visualization(sample_result(), "q", "bar", "customer", "total", output_format="vega-lite")
+            second = create_visualization(sample_result(), "q", "bar", "customer", "total", output_format="vega-lite")
+            create_visualization(sample_result(), "q", "line", "customer", "total", output_format="vega-lite")
+            changed = ColumnarResult.from_columns(["customer", "total"], [["Ann", "Bob", "Cy"], [1.0, 2.0, 3.0]])
+            create_visualization(changed, "q", "bar", "customer", "total", output_format="vega-lite")
+        self.assertIs(first, second)
+        self.assertEqual(build.call_count, 3)
+        self.assertEqual(visualizer_service.chart_cache.get_stats()["hits"], 1)
+
+        visualizer_service.chart_cache.clear()
+        self.assertEqual(visualizer_service.chart_cache.get_stats()["entries"], 0)
+        self.assertIsNot(create_visualization(sample_result(), "q", "bar", "customer", "total",
+                                              output_format="vega-lite"), first)
+
+if __name__ == '__main__':
+    unittest.main()